@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+"""
+    Compares the installed JSON codecs on scripting plan notifications with large
+    scriptingObjects lists, decoded from a buffer view the way the JSON RPC reader does.
+
+    Usage: python benchmarks/json_codec_benchmark.py [--objects N] [--repeat N]
+"""
+
+from __future__ import division, print_function
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), u'..')))
+
+import mssqlscripter.jsonrpc.jsoncodec as jsoncodec
+
+OBJECT_TYPES = [u'Table', u'View', u'StoredProcedure', u'UserDefinedFunction', u'Synonym']
+
+
+def plan_notification(object_count):
+    """
+        Plan notification shaped like the one sent by the tools service.
+    """
+    return {
+        u'jsonrpc': u'2.0',
+        u'method': u'scripting/scriptPlanNotification',
+        u'params': {
+            u'scriptingObjects': [
+                {
+                    u'type': OBJECT_TYPES[index % len(OBJECT_TYPES)],
+                    u'schema': u'Schema{}'.format(index % 50),
+                    u'name': u'Object_{}_Name'.format(index)}
+                for index in range(object_count)],
+            u'count': object_count,
+            u'operationId': u'bf7515c7-2a05-4e96-b44d-8243413be398',
+            u'sequenceNumber': 1}}
+
+
+def main(args):
+    arg_parser = argparse.ArgumentParser(description=u'JSON codec benchmark.')
+    arg_parser.add_argument(u'--objects', type=int, default=50000, help=u'Scripting objects in the plan.')
+    arg_parser.add_argument(u'--repeat', type=int, default=5, help=u'Runs per measurement, best is reported.')
+    arguments = arg_parser.parse_args(args)
+
+    message = plan_notification(arguments.objects)
+    content = jsoncodec.StandardJsonCodec().dumps(message)
+    # The reader decodes from a view into its buffer.
+    content_view = memoryview(bytearray(content))[:]
+    print(u'Plan notification with {} objects ({:.1f} MB)'.format(
+        arguments.objects, len(content) / (1024 * 1024)))
+
+    for codec_type in jsoncodec.CODECS:
+        try:
+            codec = codec_type()
+        except ImportError:
+            print(u'    {:<10} not installed'.format(codec_type.name))
+            continue
+
+        loads = min(timeit.repeat(lambda: codec.loads(content_view), number=1, repeat=arguments.repeat))
+        dumps = min(timeit.repeat(lambda: codec.dumps(message), number=1, repeat=arguments.repeat))
+        print(u'    {:<10} loads {:>8.1f} ms {:>8.1f} MB/s    dumps {:>8.1f} ms'.format(
+            codec.name, loads * 1000, len(content) / (1024 * 1024) / loads, dumps * 1000))
+
+
+if __name__ == u'__main__':
+    main(sys.argv[1:])
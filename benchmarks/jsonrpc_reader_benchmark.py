@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+"""
+    Throughput benchmark of the JSON RPC reader framing against the previous byte-by-byte
+    implementation, over synthetic streams shaped like sql tools service scripting output.
+
+    Usage: python benchmarks/jsonrpc_reader_benchmark.py [--repeat N]
+"""
+
+from __future__ import division, print_function
+
+import argparse
+import io
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), u'..')))
+
+import mssqlscripter.jsonrpc.jsonrpcclient as jsonrpc
+
+# Largest chunk a single read from the tools service pipe returns.
+PIPE_CHUNK_SIZE = 65536
+
+
+class PipeStream(io.BytesIO):
+    """
+        In memory stream that returns at most chunk_size bytes per readinto, like a pipe.
+    """
+
+    def __init__(self, content, chunk_size=PIPE_CHUNK_SIZE):
+        super(PipeStream, self).__init__(content)
+        self.chunk_size = chunk_size
+
+    def readinto(self, buffer):
+        return super(PipeStream, self).readinto(memoryview(buffer)[:self.chunk_size])
+
+
+class LegacyJsonRpcReader(object):
+    """
+        The JSON RPC reader framing before the reusable buffer rewrite, kept as the baseline.
+    """
+    CR = 13
+    LF = 10
+    BUFFER_RESIZE_TRIGGER = 0.25
+    DEFAULT_BUFFER_SIZE = 8192
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = bytearray(self.DEFAULT_BUFFER_SIZE)
+        self.buffer_end_offset = 0
+        self.read_offset = 0
+        self.expected_content_length = 0
+        self.headers = {}
+        self.read_header = True
+        self.needs_more_data = True
+
+    def read_response(self):
+        content = [u'']
+        while (not self.needs_more_data or self.read_next_chunk()):
+            self.needs_more_data = False
+            if self.read_header and not self.try_read_headers():
+                self.needs_more_data = True
+                continue
+            if not self.read_header and not self.try_read_content(content):
+                self.needs_more_data = True
+                continue
+            break
+
+        self.trim_buffer_and_resize(self.read_offset)
+        return json.loads(content[0])
+
+    def read_next_chunk(self):
+        current_buffer_size = len(self.buffer)
+        if ((current_buffer_size - self.buffer_end_offset) /
+                current_buffer_size) < self.BUFFER_RESIZE_TRIGGER:
+            resized_buffer = bytearray(current_buffer_size * 2)
+            resized_buffer[0:current_buffer_size] = self.buffer
+            self.buffer = resized_buffer
+
+        length_read = self.stream.readinto(
+            memoryview(self.buffer)[self.buffer_end_offset:])
+        self.buffer_end_offset += length_read
+        if not length_read:
+            raise EOFError(u'End of stream reached, no output.')
+        return True
+
+    def try_read_headers(self):
+        scan_offset = self.read_offset
+        while (scan_offset + 3 < self.buffer_end_offset and
+                (self.buffer[scan_offset] != self.CR or
+                 self.buffer[scan_offset + 1] != self.LF or
+                 self.buffer[scan_offset + 2] != self.CR or
+                 self.buffer[scan_offset + 3] != self.LF)):
+            scan_offset += 1
+
+        if scan_offset + 3 >= self.buffer_end_offset:
+            return False
+
+        headers_read = self.buffer[self.read_offset:scan_offset].decode(u'ascii')
+        for header in headers_read.split(u'\n'):
+            colon_index = header.find(u':')
+            self.headers[header[:colon_index].lower()] = header[colon_index + 1:]
+
+        self.expected_content_length = int(self.headers[u'content-length'])
+        self.read_offset = scan_offset + 4
+        self.read_header = False
+        return True
+
+    def try_read_content(self, content):
+        if (self.buffer_end_offset - self.read_offset <
+                self.expected_content_length):
+            return False
+
+        content[0] = self.buffer[self.read_offset:self.read_offset +
+                                 self.expected_content_length].decode(u'UTF-8')
+        self.read_offset += self.expected_content_length
+        self.read_header = True
+        return True
+
+    def trim_buffer_and_resize(self, bytes_to_remove):
+        current_buffer_size = len(self.buffer)
+        new_buffer = bytearray(max(current_buffer_size -
+                                   bytes_to_remove, self.DEFAULT_BUFFER_SIZE))
+        if (bytes_to_remove <= current_buffer_size):
+            new_buffer[:self.buffer_end_offset -
+                       bytes_to_remove] = self.buffer[bytes_to_remove:self.buffer_end_offset]
+        self.buffer = new_buffer
+        self.read_offset = 0
+        self.buffer_end_offset -= bytes_to_remove
+
+
+def frame(message):
+    """
+        Frame a message the way the tools service writes it.
+    """
+    content = json.dumps(message, separators=(u',', u':')).encode(u'utf-8')
+    return u'Content-Length: {}\r\n\r\n'.format(len(content)).encode(u'ascii') + content
+
+
+def scripting_object(index):
+    return {u'type': u'StoredProcedure', u'schema': u'dbo', u'name': u'usp_Procedure{}'.format(index)}
+
+
+def progress_stream(object_count):
+    """
+        Many small progress notifications, the bulk of a scripting run.
+    """
+    return b''.join(
+        frame({
+            u'jsonrpc': u'2.0',
+            u'method': u'scripting/scriptProgressNotification',
+            u'params': {
+                u'scriptingObject': scripting_object(index),
+                u'status': u'Completed',
+                u'completedCount': index,
+                u'totalCount': object_count,
+                u'errorDetails': None,
+                u'errorMessage': None,
+                u'operationId': u'bf7515c7-2a05-4e96-b44d-8243413be398',
+                u'sequenceNumber': index}})
+        for index in range(object_count))
+
+
+def plan_stream(object_count, plan_count):
+    """
+        Large plan notifications that span many pipe reads.
+    """
+    return b''.join(
+        frame({
+            u'jsonrpc': u'2.0',
+            u'method': u'scripting/scriptPlanNotification',
+            u'params': {
+                u'scriptingObjects': [scripting_object(index) for index in range(object_count)],
+                u'count': object_count,
+                u'operationId': u'bf7515c7-2a05-4e96-b44d-8243413be398',
+                u'sequenceNumber': sequence}})
+        for sequence in range(plan_count))
+
+
+def read_all(reader_type, content):
+    reader = reader_type(PipeStream(content))
+    count = 0
+    try:
+        while True:
+            reader.read_response()
+            count += 1
+    except EOFError:
+        return count
+
+
+def run(name, content, repeat):
+    print(u'{} ({:.1f} MB)'.format(name, len(content) / (1024 * 1024)))
+    for reader_type in (LegacyJsonRpcReader, jsonrpc.JsonRpcReader):
+        frames = read_all(reader_type, content)
+        elapsed = min(timeit.repeat(lambda: read_all(reader_type, content), number=1, repeat=repeat))
+        print(u'    {:<22} {:>10.1f} MB/s {:>12.0f} frames/s'.format(
+            reader_type.__name__,
+            len(content) / (1024 * 1024) / elapsed,
+            frames / elapsed))
+
+
+def main(args):
+    arg_parser = argparse.ArgumentParser(description=u'JSON RPC reader throughput benchmark.')
+    arg_parser.add_argument(u'--repeat', type=int, default=3, help=u'Runs per measurement, best is reported.')
+    arguments = arg_parser.parse_args(args)
+
+    run(u'Progress notifications', progress_stream(20000), arguments.repeat)
+    run(u'Plan notifications', plan_stream(20000, 5), arguments.repeat)
+
+
+if __name__ == u'__main__':
+    main(sys.argv[1:])
@@ -37,6 +37,7 @@ def build(platform_names):
 
     # convert windows line endings to unix for mssql-cli bash script
     utility.exec_command('python dos2unix.py mssql-scripter mssql-scripter', utility.ROOT_DIR)
+    utility.exec_command('python dos2unix.py mssql-scripter-batch mssql-scripter-batch', utility.ROOT_DIR)
 
     for platform in platform_names:
         utility.clean_up(utility.MSSQLSCRIPTER_BUILD_DIRECTORY)
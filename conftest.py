@@ -0,0 +1,11 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import sys
+
+collect_ignore = []
+if sys.version_info < (3, 5):
+    # The asyncio client uses async and await, which do not parse before Python 3.5.
+    collect_ignore.append(u'mssqlscripter/jsonrpc/tests/test_asyncjsonrpcclient.py')
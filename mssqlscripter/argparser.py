@@ -4,9 +4,14 @@
 # --------------------------------------------------------------------------------------------
 
 import argparse
+import copy
 import getpass
 import mssqlscripter
+import mssqlscripter.jsonrpc.contracts.scriptingservice as scripting
+import mssqlscripter.scripterpipeline as scripterpipeline
 import os
+import re
+import shlex
 import shutil
 import sys
 
@@ -214,6 +219,20 @@ def parse_arguments(args):
         default=False,
         help=u'Continue scripting on error.')
 
+    parser.add_argument(
+        u'--retry-failed',
+        dest=u'RetryCount',
+        metavar=u'',
+        type=int,
+        default=None,
+        help=u'With --continue-on-error, number of follow-up requests scripting only the objects that failed, with exponential backoff. Retried objects are appended to a single file. Default is 2.')
+
+    parser.add_argument(
+        u'--failure-report',
+        dest=u'FailureReport',
+        metavar=u'',
+        help=u'With --continue-on-error, write the objects that failed and the outcome of their retries as JSON to this file.')
+
     parser.add_argument(
         u'--convert-uddts',
         dest=u'ConvertUDDTToBaseType',
@@ -409,12 +428,255 @@ def parse_arguments(args):
         default=False,
         help=u'Enable verbose logging.')
 
+    parser.add_argument(
+        u'--ndjson',
+        dest=u'Ndjson',
+        action=u'store_true',
+        default=False,
+        help=u'Write a JSON line per object with it\'s schema, name, type, script, length in bytes and scripting duration as soon as it is scripted. Written to the file path if given, stdout otherwise.')
+
+    parser.add_argument(
+        u'--list-objects',
+        dest=u'ListObjects',
+        nargs=u'?',
+        const=u'json',
+        choices=[u'json', u'tsv'],
+        default=None,
+        help=u'List the objects that would be scripted as json (default) or tsv instead of scripting them. Written to the file path if given, stdout otherwise.')
+
+    parser.add_argument(
+        u'--inventory-ttl',
+        dest=u'InventoryTtl',
+        metavar=u'',
+        type=float,
+        default=300,
+        help=u'Seconds a object list is reused for the same connection and filters by --list-objects. 0 disables the cache. Default is 300.')
+
+    group_execution_mode = parser.add_mutually_exclusive_group()
+    group_execution_mode.add_argument(
+        u'--daemon',
+        dest=u'Daemon',
+        action=u'store_true',
+        default=False,
+        help=u'Script on a warm tools service kept by a background daemon, starting it if needed. Unix only.')
+    group_execution_mode.add_argument(
+        u'--shards',
+        dest=u'Shards',
+        metavar=u'',
+        type=int,
+        default=1,
+        help=u'Split the objects to script into this many shards scripted in parallel, each by it\'s own tools service. Default is 1.')
+    group_execution_mode.add_argument(
+        u'--cache',
+        dest=u'Cache',
+        action=u'store_true',
+        default=False,
+        help=u'Only script objects modified since they were cached in ~/.mssqlscripter/scripting-cache.sqlite, the rest of the script comes from the cache. Requires pyodbc, a single file and a schema only script.')
+    group_execution_mode.add_argument(
+        u'--checkpoint',
+        dest=u'Checkpoint',
+        action=u'store_true',
+        default=False,
+        help=u'Script in batches of objects and record completed batches in a checkpoint next to the file path, restarting the tools service if it stops. A interrupted run continues with --resume.')
+
+    # Implies --checkpoint, so a interrupted run is continued with it's arguments and --resume.
+    parser.add_argument(
+        u'--resume',
+        dest=u'Resume',
+        action=u'store_true',
+        default=False,
+        help=u'Continue a interrupted --checkpoint run with the same arguments, only scripting the batches that did not complete.')
+
+    parser.add_argument(
+        u'--checkpoint-batch-size',
+        dest=u'CheckpointBatchSize',
+        metavar=u'',
+        type=int,
+        default=200,
+        help=u'Number of objects scripted per checkpointed batch. Default is 200.')
+
+    parser.add_argument(
+        u'--daemon-idle-timeout',
+        dest=u'DaemonIdleTimeout',
+        metavar=u'',
+        type=float,
+        default=600,
+        help=u'Seconds without requests before a daemon started by this invocation exits. Default is 600.')
+
+    parser.add_argument(
+        u'--daemon-pool-size',
+        dest=u'DaemonPoolSize',
+        metavar=u'',
+        type=int,
+        default=1,
+        help=u'Number of warm tools service processes kept by a daemon started by this invocation. Default is 1.')
+
+    parser.add_argument(
+        u'--incremental',
+        dest=u'Incremental',
+        action=u'store_true',
+        default=False,
+        help=u'With --file-per-object, only rewrite files whose script changed and remove files of objects that no longer exist. File hashes, which ignore the script date of descriptive headers, are kept in a manifest in the target directory.')
+
+    parser.add_argument(
+        u'--max-file-size',
+        dest=u'MaxFileSize',
+        metavar=u'',
+        type=parse_size,
+        default=None,
+        help=u'Roll a single file script over into numbered chunk files of about this size, e.g. 512MB. Chunks end on GO batch separators and are listed with their objects in a manifest next to the file path.')
+
+    parser.add_argument(
+        u'--max-rows-per-table',
+        dest=u'MaxRowsPerTable',
+        metavar=u'',
+        type=int,
+        default=None,
+        help=u'Only keep the first rows of every table, e.g. to seed development databases. The server still reads every row, tables with rows dropped are listed when scripting completed.')
+
+    parser.add_argument(
+        u'--bulk-export',
+        dest=u'BulkExport',
+        choices=[u'csv', u'bcp'],
+        default=None,
+        help=u'Export the data of every table to a csv or bcp character format file in the directory given as file path instead of INSERT statements, with a JSON sidecar describing it\'s columns. Requires --data-only.')
+
+    parser.add_argument(
+        u'--merge-inserts',
+        dest=u'MergeInsertRows',
+        metavar=u'ROWS',
+        nargs=u'?',
+        const=1000,
+        type=int,
+        default=None,
+        help=u'Merge consecutive single row INSERT statements of a table into multi row INSERT statements of up to this many rows, 1000 at most and by default. A GO batch separator is added every 10000 rows.')
+
+    parser.add_argument(
+        u'--merge-inserts-max-size',
+        dest=u'MergeInsertMaxSize',
+        metavar=u'',
+        type=parse_size,
+        default=1024 * 1024,
+        help=u'Largest size of the values of a merged INSERT statement, e.g. 512KB. Default is 1MB.')
+
+    parser.add_argument(
+        u'--pipeline-stage',
+        dest=u'PipelineStages',
+        metavar=u'MODULE:ATTRIBUTE',
+        action=u'append',
+        default=[],
+        help=u'Run the GO batches of a single file script through a stage while it is produced, given as MODULE:ATTRIBUTE, or as MODULE:ATTRIBUTE(ARGUMENTS) for a stage factory with literal arguments. The built-in stages are mssqlscripter.scripterpipeline:strip_headers, mssqlscripter.scripterpipeline:rename_schema(OLD, NEW) and mssqlscripter.scripterpipeline:drop_batches(PATTERN), e.g. "mssqlscripter.scripterpipeline:rename_schema(\'dbo\', \'staging\')". Can be given several times, stages run in order.')
+
+    parser.add_argument(
+        u'--index',
+        dest=u'Index',
+        action=u'store_true',
+        default=False,
+        help=u'Index the byte range of every object in a single file script, written to the file path with the .index.json extension, so single objects can be read without scanning the script.')
+
+    parser.add_argument(
+        u'--variant',
+        dest=u'Variants',
+        metavar=u'NAME=OPTIONS',
+        action=u'append',
+        default=[],
+        help=u'Script a variant of the script with other scripting options, e.g. "azure=--target-server-version AzureDB --script-drop". Can be given several times. Every variant is scripted over one tools service from one object inventory, collected with the other arguments, to the file path with the name before the extension, or to a subdirectory with --file-per-object. A variant whose target can not script a object of the inventory, e.g. a AzureDB variant of a database with objects Azure does not support, fails and is named in the error.')
+
+    parser.add_argument(
+        u'--compress',
+        dest=u'Compress',
+        choices=[u'gzip', u'zstd', u'xz'],
+        help=u'Compress the script while it is produced. Single files get the .gz, .zst or .xz extension, as does every file with --file-per-object. zstd requires the zstandard package.')
+
+    parser.add_argument(
+        u'--compress-threads',
+        dest=u'CompressThreads',
+        metavar=u'',
+        type=int,
+        default=None,
+        help=u'Number of threads compressing blocks in parallel. Defaults to the number of CPUs.')
+
     parser.add_argument(
         u'--version',
         action=u'version',
         version='{}'.format(mssqlscripter.__version__))
 
     parameters = parser.parse_args(args)
+    # Variants are parsed over the arguments as given, before they are mapped.
+    raw_parameters = copy.deepcopy(parameters)
+    # Checked as --checkpoint by every combination below.
+    if parameters.Resume:
+        parameters.Checkpoint = True
+    if parameters.MaxFileSize and (parameters.ScriptDestination != u'ToSingleFile' or not parameters.FilePath):
+        parser.error(u'--max-file-size requires a --file-path and a single file')
+    if parameters.MaxFileSize and parameters.Compress:
+        parser.error(u'--max-file-size can not be combined with --compress')
+    if parameters.Index and (parameters.ScriptDestination != u'ToSingleFile' or not parameters.FilePath):
+        parser.error(u'--index requires a --file-path and a single file')
+    if parameters.Index and (parameters.Compress or parameters.MaxFileSize or parameters.Ndjson):
+        parser.error(u'--index can not be combined with --compress, --max-file-size or --ndjson')
+    if parameters.BulkExport and (parameters.TypeOfDataToScript != u'DataOnly' or not parameters.FilePath or
+                                  parameters.ScriptDestination != u'ToSingleFile'):
+        parser.error(u'--bulk-export requires --data-only and a --file-path directory')
+    if parameters.BulkExport and (parameters.Compress or parameters.MaxFileSize or parameters.Ndjson or
+                                  parameters.Index or parameters.PipelineStages or parameters.MergeInsertRows or
+                                  parameters.Checkpoint):
+        parser.error(u'--bulk-export can not be combined with --compress, --max-file-size, --ndjson, --index, --pipeline-stage, --merge-inserts, --checkpoint or --resume')
+    if parameters.MergeInsertRows is not None and not 0 < parameters.MergeInsertRows <= 1000:
+        parser.error(u'--merge-inserts merges 1 to 1000 rows')
+    if parameters.MergeInsertRows and parameters.TypeOfDataToScript == u'SchemaOnly':
+        parser.error(u'--merge-inserts requires --data-only or --schema-and-data')
+    if parameters.MaxRowsPerTable is not None and parameters.MaxRowsPerTable < 0:
+        parser.error(u'--max-rows-per-table can not be negative')
+    if parameters.MaxRowsPerTable is not None and parameters.TypeOfDataToScript == u'SchemaOnly':
+        parser.error(u'--max-rows-per-table requires --data-only or --schema-and-data')
+    # Rows are limited by a pipeline stage, unless they are exported for bulk loading.
+    uses_pipeline = parameters.PipelineStages or parameters.MergeInsertRows or (
+        parameters.MaxRowsPerTable is not None and not parameters.BulkExport)
+    if uses_pipeline and parameters.ScriptDestination != u'ToSingleFile':
+        parser.error(u'--pipeline-stage, --merge-inserts and --max-rows-per-table require a single file')
+    for stage_name in parameters.PipelineStages:
+        # Stages are loaded again once scripting starts, a stage that does not load fails here instead.
+        try:
+            scripterpipeline.load_stage(stage_name)
+        except (ValueError, ImportError, AttributeError) as error:
+            parser.error(u'--pipeline-stage {}: {}'.format(stage_name, error))
+    if uses_pipeline and (parameters.Compress or parameters.MaxFileSize or parameters.Ndjson or parameters.Index or
+                          parameters.Checkpoint):
+        parser.error(u'--pipeline-stage, --merge-inserts and --max-rows-per-table can not be combined with --compress, --max-file-size, --ndjson, --index, --checkpoint or --resume')
+    if parameters.Cache and (parameters.ScriptDestination != u'ToSingleFile' or
+                             parameters.TypeOfDataToScript != u'SchemaOnly'):
+        parser.error(u'--cache requires a single file and a schema only script')
+    if parameters.ListObjects and parameters.ScriptDestination != u'ToSingleFile':
+        parser.error(u'--list-objects writes a single file')
+    if parameters.Ndjson and parameters.ScriptDestination != u'ToSingleFile':
+        parser.error(u'--ndjson writes a single file')
+    if parameters.Checkpoint and (parameters.Daemon or parameters.Shards > 1 or parameters.Cache):
+        parser.error(u'--resume can not be combined with --daemon, --shards or --cache')
+    # Failed objects are only collected and retried when the tools service is started for a single request.
+    if (parameters.RetryCount is not None or parameters.FailureReport) and (
+            parameters.Daemon or parameters.Shards > 1 or parameters.Cache or parameters.Checkpoint or
+            parameters.Variants):
+        parser.error(u'--retry-failed and --failure-report can not be combined with --daemon, --shards, --cache, --checkpoint, --resume or --variant')
+    if parameters.RetryCount is None:
+        parameters.RetryCount = 2
+    if parameters.Ndjson and (parameters.Compress or parameters.MaxFileSize or parameters.Checkpoint):
+        parser.error(u'--ndjson can not be combined with --compress, --max-file-size, --checkpoint or --resume')
+    if parameters.Checkpoint and not parameters.FilePath:
+        parser.error(u'--checkpoint and --resume require a --file-path')
+    if parameters.Checkpoint and (parameters.Compress or parameters.MaxFileSize or parameters.Incremental):
+        parser.error(u'--checkpoint and --resume can not be combined with --compress, --max-file-size or --incremental')
+    if parameters.Incremental and parameters.ScriptDestination != u'ToFilePerObject':
+        parser.error(u'--incremental requires --file-per-object')
+    if parameters.Incremental and parameters.Compress:
+        parser.error(u'--incremental can not be combined with --compress')
+    if parameters.Variants and not parameters.FilePath:
+        parser.error(u'--variant requires a --file-path')
+    if parameters.Variants and (parameters.Daemon or parameters.Shards > 1 or parameters.Cache or
+                                parameters.Checkpoint or parameters.ListObjects or parameters.Compress or
+                                parameters.MaxFileSize or parameters.Ndjson or parameters.Index or uses_pipeline or
+                                parameters.BulkExport or parameters.Incremental):
+        parser.error(u'--variant can not be combined with --daemon, --shards, --cache, --checkpoint, --resume, --list-objects, --compress, --max-file-size, --ndjson, --index, --pipeline-stage, --merge-inserts, --max-rows-per-table, --bulk-export or --incremental')
     verify_directory(parameters)
 
     if parameters.Server:
@@ -426,9 +688,54 @@ def parse_arguments(args):
             sys.exit()
 
     map_server_options(parameters)
+    parameters.Variants = parse_variants(parser, raw_parameters, parameters)
     return parameters
 
 
+def parse_variants(parser, raw_parameters, parameters):
+    """
+        Parse every NAME=OPTIONS variant over the arguments as given, returning a list of (name, options) with
+        the scripting options that differ from parameters. Variants may only change scripting options.
+    """
+    option_names = set(scripting.ScriptingOptions().get_options())
+    # The object inventory is shared, variants can not change what is scripted.
+    option_names.discard(u'GenerateScriptForDependentObjects')
+
+    variants = []
+    for variant in raw_parameters.Variants:
+        name, _, options = variant.partition(u'=')
+        if not re.match(r'^[\w.-]+$', name):
+            parser.error(u'--variant is given as NAME=OPTIONS with a name of letters, digits, ".", "-" or "_", not {}'.format(variant))
+        if name in [variant_name for variant_name, _ in variants]:
+            parser.error(u'--variant {} is given more than once'.format(name))
+
+        variant_parameters = parser.parse_args(shlex.split(options), namespace=copy.deepcopy(raw_parameters))
+        changed_names = [
+            option for option, value in vars(variant_parameters).items()
+            if option not in option_names and value != getattr(raw_parameters, option, None)]
+        if changed_names:
+            parser.error(u'--variant {} can only change scripting options, not {}'.format(
+                name, u', '.join(sorted(changed_names))))
+
+        map_server_options(variant_parameters)
+        variants.append((name, dict(
+            (option, getattr(variant_parameters, option)) for option in option_names
+            if hasattr(variant_parameters, option) and
+            getattr(variant_parameters, option) != getattr(parameters, option, None))))
+
+    return variants
+
+
+def parse_size(value):
+    """
+        Parse a size in bytes with a optional KB, MB or GB suffix.
+    """
+    match = re.match(r'^\s*(\d+)\s*([KMG]?)B?\s*$', value, re.IGNORECASE)
+    if not match or not int(match.group(1)):
+        raise argparse.ArgumentTypeError(u'invalid size: {}'.format(value))
+    return int(match.group(1)) * 1024 ** u' KMG'.index(match.group(2).upper() or u' ')
+
+
 def verify_directory(parameters):
     """
         If creating a file per object, create the directory if it does not exist.
@@ -438,8 +745,8 @@ def verify_directory(parameters):
     if parameters.ScriptDestination == 'ToFilePerObject':
         if not os.path.exists(target_directory):
             os.makedirs(target_directory)
-        # Give warning to user that target directory was not empty.
-        if os.listdir(target_directory):
+        # Give warning to user that target directory was not empty, unless it is updated incrementally.
+        if os.listdir(target_directory) and not parameters.Incremental:
             sys.stdout.write(u'warning: Target directory {} was not empty.'.format(target_directory))
 
 
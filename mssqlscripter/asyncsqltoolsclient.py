@@ -0,0 +1,81 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+# Requires Python 3.5 or later.
+
+import asyncio
+import logging
+
+import mssqlscripter.jsonrpc.asyncjsonrpcclient as async_json_rpc_client
+import mssqlscripter.jsonrpc.contracts.asyncscriptingservice as async_scripting
+import mssqlscripter.mssqltoolsservice as mssqltoolsservice
+import mssqlscripter.scripterlogging as scripterlogging
+
+logger = logging.getLogger(u'mssqlscripter.asyncsqltoolsclient')
+
+
+class AsyncSqlToolsClient(object):
+    """
+        Create sql tools service requests on a asyncio event loop. Many clients, each owning a
+        tools service process, can be driven by a single event loop without threads.
+
+        Usage:
+            async with AsyncSqlToolsClient() as tools_client:
+                request = tools_client.create_request(u'scripting_request', parameters)
+                await request.execute()
+                async for response in request:
+                    ...
+    """
+
+    def __init__(self, enable_logging=False):
+        self.enable_logging = enable_logging
+        self.tools_service_process = None
+        self.json_rpc_client = None
+
+    async def start(self):
+        """
+            Start the tools service process and the json rpc client over it's stdio streams.
+        """
+        sqltoolsservice_args = [mssqltoolsservice.get_executable_path()]
+        if self.enable_logging:
+            sqltoolsservice_args.extend([u'--enable-logging', u'--log-dir', scripterlogging.get_config_log_dir()])
+
+        logger.debug(u'Loading mssqltoolsservice with arguments {}'.format(sqltoolsservice_args))
+        self.tools_service_process = await asyncio.create_subprocess_exec(
+            *sqltoolsservice_args,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE)
+
+        self.json_rpc_client = async_json_rpc_client.AsyncJsonRpcClient(
+            self.tools_service_process.stdout, self.tools_service_process.stdin)
+        self.json_rpc_client.start()
+
+        logger.info(u'Async Sql Tools Client Initialized')
+        return self
+
+    def create_request(self, request_type, parameters):
+        """
+            Create request of request type passed in.
+        """
+        if request_type == u'scripting_request':
+            return async_scripting.AsyncScriptingRequest(self.json_rpc_client, parameters)
+
+    async def shutdown(self):
+        """
+            Stop the json rpc client and the tools service process.
+        """
+        logger.info(u'Shutting down Async Sql Tools Client')
+        if self.json_rpc_client:
+            await self.json_rpc_client.shutdown()
+
+        if self.tools_service_process and self.tools_service_process.returncode is None:
+            self.tools_service_process.kill()
+            await self.tools_service_process.wait()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.shutdown()
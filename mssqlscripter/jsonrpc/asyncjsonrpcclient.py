@@ -0,0 +1,199 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+# Requires Python 3.5 or later.
+
+import asyncio
+import logging
+
+import mssqlscripter.jsonrpc.jsoncodec as jsoncodec
+from mssqlscripter.jsonrpc.jsonrpcclient import JsonRpcMessage, JsonRpcWriter, parse_headers
+
+logger = logging.getLogger(u'mssqlscripter.jsonrpc.asyncjsonrpcclient')
+
+
+class AsyncJsonRpcClient(object):
+    """
+        Handle request submission and response handling on a asyncio event loop without threads.
+    """
+    HEADER_DELIMITER = b'\r\n\r\n'
+
+    def __init__(self, stream_reader, stream_writer, codec=None):
+        """
+            Create a client over a asyncio.StreamReader and asyncio.StreamWriter pair.
+        """
+        self.codec = codec or jsoncodec.get_codec()
+        self.stream_reader = stream_reader
+        self.stream_writer = stream_writer
+
+        self.current_id = 1
+        # Futures of requests waiting for their response.
+        self.pending_requests = {}
+        # Notifications routed by operation id, everything else goes to the event queue.
+        self.operation_queues = {}
+        # Notifications of operations whose response did not arrive yet, by operation id.
+        self.unrouted_notifications = {}
+        self.event_queue = asyncio.Queue()
+
+        self.ignored_notifications = set()
+        self.ignored_notification_counts = {}
+
+        self.exception = None
+        self.response_task = None
+
+    def start(self):
+        """
+            Starts the task that listens for responses on the underlying stream.
+        """
+        logger.debug(u'Async Json Rpc client started.')
+        self.response_task = asyncio.ensure_future(self._listen_for_response())
+
+    def ignore_notifications(self, methods):
+        """
+            Count notifications of the given methods instead of queuing them.
+        """
+        self.ignored_notifications.update(methods)
+
+    async def submit_request(self, method, params, id=None):
+        """
+            Submit json rpc request to input stream.
+        """
+        if (method is None or params is None):
+            raise ValueError(u'Method or Parameter was not found in request')
+
+        content_body = {
+            u'jsonrpc': u'2.0',
+            u'method': method,
+            u'params': params,
+            u'id': id
+        }
+        json_content = self.codec.dumps(content_body)
+        header = JsonRpcWriter.HEADER.format(len(json_content))
+
+        self.stream_writer.write(header.encode(u'ascii') + json_content)
+        await self.stream_writer.drain()
+
+    async def request(self, method, params):
+        """
+            Submit a request with the next id and wait for it's decoded response.
+        """
+        if self.exception:
+            raise self.exception
+
+        request_id = self.current_id
+        self.current_id += 1
+
+        response = asyncio.get_event_loop().create_future()
+        self.pending_requests[request_id] = response
+        try:
+            await self.submit_request(method, params, request_id)
+            return await response
+        finally:
+            self.pending_requests.pop(request_id, None)
+
+    def get_operation_queue(self, operation_id):
+        """
+            Get the queue that notifications of the operation are routed to. Notifications that arrived
+            before the queue was created are moved to it.
+        """
+        if operation_id not in self.operation_queues:
+            queue = asyncio.Queue()
+            for message in self.unrouted_notifications.pop(operation_id, []):
+                queue.put_nowait(message)
+            self.operation_queues[operation_id] = queue
+        return self.operation_queues[operation_id]
+
+    def operation_finished(self, operation_id):
+        """
+            Remove the operation notification queue.
+        """
+        self.operation_queues.pop(operation_id, None)
+        self.unrouted_notifications.pop(operation_id, None)
+
+    async def read_message(self):
+        """
+            Read the next undecoded message from the stream.
+        Exceptions raised:
+            EOFError
+                The stream ended.
+            LookupError
+                No valid header with content-length was found.
+        """
+        try:
+            headers_read = await self.stream_reader.readuntil(self.HEADER_DELIMITER)
+            headers = parse_headers(headers_read[:-len(self.HEADER_DELIMITER)])
+            content = await self.stream_reader.readexactly(int(headers[u'content-length']))
+        except asyncio.IncompleteReadError:
+            logger.debug(u'Async JSON RPC client reached end of stream')
+            raise EOFError(u'End of stream reached, no output.')
+
+        return JsonRpcMessage(content, self.codec)
+
+    async def _listen_for_response(self):
+        """
+            Read messages and hand them to the waiting request or notification queue.
+        """
+        try:
+            while True:
+                self._dispatch_message(await self.read_message())
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            self._record_exception(error)
+
+    def _dispatch_message(self, message):
+        """
+            Route a message to it's pending request, operation queue or the event queue. Notifications of
+            a operation that is not registered yet are held until it is.
+        """
+        if message.id:
+            response = self.pending_requests.get(message.id)
+            if response and not response.done():
+                # Create the operation queue before the requester resumes, so notifications
+                # that follow in the stream are routed to it.
+                if message.operation_id:
+                    self.get_operation_queue(message.operation_id)
+                response.set_result(message.decode())
+                return
+
+        if message.method in self.ignored_notifications:
+            self.ignored_notification_counts[message.method] = \
+                self.ignored_notification_counts.get(message.method, 0) + 1
+            return
+
+        operation_id = message.operation_id
+        if operation_id in self.operation_queues:
+            self.operation_queues[operation_id].put_nowait(message)
+        elif operation_id:
+            # The tools service starts the operation before it sends the response registering it.
+            self.unrouted_notifications.setdefault(operation_id, []).append(message)
+        else:
+            self.event_queue.put_nowait(message)
+
+    def _record_exception(self, ex):
+        """
+            Fail every waiting request and queue with the exception.
+        """
+        logger.debug(u'Async Json Rpc client encountered exception {}'.format(ex))
+        self.exception = ex
+        for response in self.pending_requests.values():
+            if not response.done():
+                response.set_exception(ex)
+        for queue in list(self.operation_queues.values()) + [self.event_queue]:
+            queue.put_nowait(ex)
+
+    async def shutdown(self):
+        """
+            Stop listening for responses and close the writer.
+        """
+        if self.response_task:
+            self.response_task.cancel()
+            try:
+                await self.response_task
+            except asyncio.CancelledError:
+                pass
+
+        self.stream_writer.close()
+        logger.info(u'Shutting down async Json rpc client.')
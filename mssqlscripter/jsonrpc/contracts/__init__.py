@@ -19,9 +19,9 @@ class Request(ABC):
         pass
 
     @abc.abstractmethod
-    def get_response(self):
+    def get_response(self, timeout=None):
         """
-            Retrieves expected response.
+            Retrieves expected response, waiting up to timeout seconds if given.
         """
         pass
 
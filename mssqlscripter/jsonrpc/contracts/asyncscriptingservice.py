@@ -0,0 +1,111 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+# Requires Python 3.5 or later.
+
+import copy
+import logging
+
+from mssqlscripter.jsonrpc.contracts.scriptingservice import (
+    ScriptCompleteEvent, ScriptingParams, ScriptingRequest, ScriptingResponseDecoder)
+
+logger = logging.getLogger(u'mssqlscripter.jsonrpc.contracts.asyncscriptingservice')
+
+
+class AsyncScriptingRequest(object):
+    """
+        SqlTools Service scripting request driven by a AsyncJsonRpcClient.
+
+        Iterate the request with async for to receive the ScriptResponse, plan and progress
+        notifications and finally the ScriptCompleteEvent.
+    """
+
+    def __init__(self, json_rpc_client, parameters):
+        """
+            Create a scripting request command.
+        """
+        self.json_rpc_client = json_rpc_client
+        self.params = ScriptingParams(parameters)
+        self.decoder = ScriptingResponseDecoder()
+        self.operation_id = None
+        self.finished = False
+        self.pending_response = None
+
+    def ignore_progress_notifications(self):
+        """
+            Plan and progress notifications will be counted by the client but never decoded.
+        """
+        self.json_rpc_client.ignore_notifications(ScriptingRequest.PROGRESS_NOTIFICATION_METHODS)
+
+    async def execute(self):
+        """
+            Submit scripting request to sql tools service and wait for it to be accepted.
+        """
+        logger.info(
+            u'Submitting async scripting request with targetfile: {}'.format(self.params.file_path))
+
+        scrubbed_parameters = copy.deepcopy(self.params)
+        scrubbed_parameters.connection_string = '*********'
+        logger.debug(scrubbed_parameters.format())
+
+        try:
+            response = self.decoder.decode_response(
+                await self.json_rpc_client.request(ScriptingRequest.METHOD_NAME, self.params.format()))
+        except Exception as error:
+            self.pending_response = self._error_event(error)
+            return self.pending_response
+
+        self.operation_id = response.operation_id
+        self.pending_response = response
+        return response
+
+    async def get_response(self):
+        """
+            Wait for the next response or event. Exceptions are returned as a failed ScriptCompleteEvent.
+        """
+        if self.pending_response:
+            response, self.pending_response = self.pending_response, None
+        else:
+            message = await self.json_rpc_client.get_operation_queue(self.operation_id).get()
+            try:
+                if isinstance(message, Exception):
+                    raise message
+                response = self.decoder.decode_response(message.decode())
+            except Exception as error:
+                response = self._error_event(error)
+
+        if isinstance(response, ScriptCompleteEvent):
+            self.finished = True
+            self.json_rpc_client.operation_finished(self.operation_id)
+
+        return response
+
+    def completed(self):
+        """
+            Get current request state.
+        """
+        return self.finished
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.finished:
+            raise StopAsyncIteration
+        return await self.get_response()
+
+    def _error_event(self, error):
+        """
+            Represent a exception as a failed ScriptCompleteEvent.
+        """
+        logger.debug(u'Async scripting request received exception: {}'.format(str(error)))
+        return ScriptCompleteEvent({
+            u'operationId': self.operation_id,
+            u'sequenceNumber': None,
+            u'success': False,
+            u'canceled': False,
+            u'hasError': True,
+            u'errorMessage': u'Scripting request encountered a exception',
+            u'errorDetails': error.args})
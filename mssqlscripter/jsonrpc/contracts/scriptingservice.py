@@ -8,6 +8,7 @@ from mssqlscripter.jsonrpc.contracts import Request
 
 import copy
 import logging
+import time
 
 logger = logging.getLogger(u'mssqlscripter.jsonrpc.contracts.scriptingservice')
 
@@ -17,6 +18,12 @@ class ScriptingRequest(Request):
         SqlTools Service scripting service scripting request.
     """
     METHOD_NAME = u'scripting/script'
+    CANCEL_METHOD_NAME = u'scripting/scriptCancel'
+    PROGRESS_NOTIFICATION_METHODS = [
+        u'scripting/scriptPlanNotification',
+        u'scripting/scriptProgressNotification']
+    # Longest single wait for a response, so waiting stays responsive to interrupts.
+    RESPONSE_WAIT_TIMEOUT = 1
 
     def __init__(self, id, json_rpc_client, parameters):
         """
@@ -25,6 +32,8 @@ class ScriptingRequest(Request):
         assert id != 0
         self.id = id
         self.finished = False
+        self.complete_event = None
+        self.operation_id = None
         self.json_rpc_client = json_rpc_client
         self.params = ScriptingParams(parameters)
         self.decoder = ScriptingResponseDecoder()
@@ -43,24 +52,46 @@ class ScriptingRequest(Request):
         self.json_rpc_client.submit_request(
             self.METHOD_NAME, self.params.format(), self.id)
 
-    def get_response(self):
+    def ignore_progress_notifications(self, keep_plan=False):
+        """
+            Plan and progress notifications will be counted by the client but never decoded.
+            With keep_plan, only progress notifications are ignored.
+        """
+        methods = self.PROGRESS_NOTIFICATION_METHODS[1:] if keep_plan else self.PROGRESS_NOTIFICATION_METHODS
+        self.json_rpc_client.ignore_notifications(methods, self.id)
+
+    def cancel(self):
+        """
+            Ask sql tools service to cancel the scripting operation once the ScriptResponse was received.
+            The request still completes with a canceled ScriptCompleteEvent.
+        """
+        logger.info(u'Cancelling scripting request id: {}'.format(self.id))
+        # The cancel result is routed to this request and decoded to a plain dictionary.
+        self.json_rpc_client.submit_request(
+            self.CANCEL_METHOD_NAME, {u'OperationId': self.operation_id}, self.id)
+
+    def get_response(self, timeout=None):
         """
             Get latest response, event or exception if it occured.
+            If timeout is given, block for up to timeout seconds until one arrives.
         """
         try:
-            response = self.json_rpc_client.get_response(self.id)
+            response = self.json_rpc_client.get_response(self.id, timeout)
             decoded_response = None
 
             if response:
-                logger.debug(response)
                 # Decode response to either response or event type.
                 decoded_response = self.decoder.decode_response(response)
 
                 logger.debug(
                     u'Scripting request received response: {}'.format(decoded_response))
-                if (isinstance(decoded_response, ScriptCompleteEvent)):
+                if isinstance(decoded_response, ScriptResponse):
+                    self.operation_id = decoded_response.operation_id
+                elif isinstance(decoded_response, ScriptCompleteEvent):
                     self.finished = True
                     self.json_rpc_client.request_finished(self.id)
+                    logger.info(u'Ignored notifications: {}'.format(
+                        self.json_rpc_client.ignored_notification_counts))
 
             return decoded_response
 
@@ -87,6 +118,26 @@ class ScriptingRequest(Request):
         """
         return self.finished
 
+    def result(self, timeout=None, callback=None):
+        """
+            Wait for the request to complete and return the ScriptCompleteEvent, or None if timeout
+            seconds pass first. Every response received while waiting is passed to callback.
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        while not self.finished:
+            remaining = deadline - time.time() if deadline is not None else self.RESPONSE_WAIT_TIMEOUT
+            if remaining <= 0:
+                return None
+
+            response = self.get_response(timeout=min(remaining, self.RESPONSE_WAIT_TIMEOUT))
+            if response:
+                if callback:
+                    callback(response)
+                if isinstance(response, ScriptCompleteEvent):
+                    self.complete_event = response
+
+        return self.complete_event
+
 
 class ScriptingParams(object):
     """
@@ -300,6 +351,9 @@ class ScriptProgressNotificationEvent(object):
         self.status = params[u'status']
         self.completed_count = params[u'completedCount']
         self.total_count = params[u'totalCount']
+        # Set with the Error status.
+        self.error_message = params.get(u'errorMessage')
+        self.error_details = params.get(u'errorDetails')
 
 
 class ScriptResponse(object):
@@ -330,7 +384,7 @@ class ScriptingResponseDecoder(object):
                 # Handle event received.
                 return self.response_dispatcher[response_name](obj[u'params'])
 
-        if u'id' in obj and u'result' in obj:
+        if u'id' in obj and isinstance(obj.get(u'result'), dict) and u'operationId' in obj[u'result']:
             # Handle response received.
             return self.response_dispatcher[u'id'](obj[u'result'])
 
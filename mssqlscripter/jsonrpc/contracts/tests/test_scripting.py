@@ -4,6 +4,7 @@
 # --------------------------------------------------------------------------------------------
 
 import io
+import json
 import os
 import time
 import unittest
@@ -49,6 +50,81 @@ class ScriptingRequestTests(unittest.TestCase):
 
             rpc_client.shutdown()
 
+    def test_concurrent_scripting_requests(self):
+        """
+            Verify interleaved events of two requests on one client are routed by operation id.
+        """
+        def frame(message):
+            content = json.dumps(message).encode(u'utf-8')
+            return u'Content-Length: {}\r\n\r\n'.format(len(content)).encode(u'ascii') + content
+
+        def progress(operation_id, name):
+            return frame({
+                u'jsonrpc': u'2.0',
+                u'method': u'scripting/scriptProgressNotification',
+                u'params': {
+                    u'scriptingObject': {u'type': u'Table', u'schema': u'dbo', u'name': name},
+                    u'status': u'Completed',
+                    u'completedCount': 1,
+                    u'totalCount': 1,
+                    u'operationId': operation_id,
+                    u'sequenceNumber': 1}})
+
+        def complete(operation_id):
+            return frame({
+                u'jsonrpc': u'2.0',
+                u'method': u'scripting/scriptComplete',
+                u'params': {
+                    u'errorDetails': None,
+                    u'errorMessage': None,
+                    u'hasError': False,
+                    u'canceled': False,
+                    u'success': True,
+                    u'operationId': operation_id,
+                    u'sequenceNumber': 2}})
+
+        def response(request_id, operation_id):
+            return frame({u'jsonrpc': u'2.0', u'id': request_id, u'result': {u'operationId': operation_id}})
+
+        # Notifications may arrive before the response of their operation.
+        for response_stream in (
+                io.BytesIO(
+                    response(u'1', u'first') + response(u'2', u'second') + progress(u'second', u'table2') +
+                    progress(u'first', u'table1') + complete(u'second') + complete(u'first')),
+                io.BytesIO(
+                    progress(u'second', u'table2') + progress(u'first', u'table1') + complete(u'second') +
+                    response(u'1', u'first') + complete(u'first') + response(u'2', u'second'))):
+            self.verify_concurrent_scripting_requests(response_stream)
+
+    def verify_concurrent_scripting_requests(self, response_stream):
+        rpc_client = json_rpc_client.JsonRpcClient(io.BytesIO(), response_stream)
+
+        parameters = {
+            u'FilePath': u'Sample_File_Path',
+            u'ConnectionString': u'Sample_connection_string',
+            u'ScriptDestination': u'ToSingleFile'}
+        first_request = scripting.ScriptingRequest(1, rpc_client, parameters)
+        second_request = scripting.ScriptingRequest(2, rpc_client, parameters)
+        second_request.ignore_progress_notifications()
+        rpc_client.start()
+
+        first_responses = []
+        second_responses = []
+        self.assertTrue(second_request.result(timeout=5, callback=second_responses.append).success)
+        self.assertTrue(first_request.result(timeout=5, callback=first_responses.append).success)
+
+        self.assertEqual(
+            [type(response) for response in first_responses],
+            [scripting.ScriptResponse, scripting.ScriptProgressNotificationEvent, scripting.ScriptCompleteEvent])
+        self.assertEqual(first_responses[1].scripting_object[u'name'], u'table1')
+        # Progress was ignored for the second request only.
+        self.assertEqual(
+            [type(response) for response in second_responses],
+            [scripting.ScriptResponse, scripting.ScriptCompleteEvent])
+        self.assertEqual(rpc_client.unrouted_notifications, {})
+
+        rpc_client.shutdown()
+
     def test_scripting_criteria_parameters(self):
         """
             Verify scripting objects are properly parsed.
@@ -136,6 +212,41 @@ class ScriptingRequestTests(unittest.TestCase):
         # events should remain untouched.
         self.assertTrue(isinstance(complete_decoded, dict))
 
+    def test_scripting_progress_error_decoded(self):
+        """
+            Verify the error of a object that failed to script is decoded.
+        """
+        decoder = scripting.ScriptingResponseDecoder()
+
+        progress_decoded = decoder.decode_response({
+            u'jsonrpc': u'2.0',
+            u'method': u'scripting/scriptProgressNotification',
+            u'params': {
+                u'operationId': u'e18b9538',
+                u'sequenceNumber': 2,
+                u'status': u'Error',
+                u'completedCount': 1,
+                u'totalCount': 2,
+                u'scriptingObject': {u'type': u'Table', u'schema': u'dbo', u'name': u'T1'},
+                u'errorMessage': u'Lock request time out period exceeded.',
+                u'errorDetails': u'lock timeout'}})
+
+        self.assertEqual(progress_decoded.error_message, u'Lock request time out period exceeded.')
+        self.assertEqual(progress_decoded.error_details, u'lock timeout')
+
+    def test_scripting_cancel_result_decoded_to_dict(self):
+        """
+            Verify the result of a cancel request is not decoded as a ScriptResponse.
+        """
+        decoder = scripting.ScriptingResponseDecoder()
+
+        cancel_decoded = decoder.decode_response({u'jsonrpc': u'2.0', u'id': u'1', u'result': {}})
+        response_decoded = decoder.decode_response(
+            {u'jsonrpc': u'2.0', u'id': u'1', u'result': {u'operationId': u'e18b9538'}})
+
+        self.assertTrue(isinstance(cancel_decoded, dict))
+        self.assertTrue(isinstance(response_decoded, scripting.ScriptResponse))
+
     def test_default_script_options(self):
         """
             Verify default scripting options created.
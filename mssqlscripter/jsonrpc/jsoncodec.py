@@ -0,0 +1,126 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import json
+import logging
+import os
+
+logger = logging.getLogger(u'mssqlscripter.jsonrpc.jsoncodec')
+
+# Overrides the codec selection, e.g. MSSQLSCRIPTER_JSON_CODEC=json forces the standard library.
+MSSQLSCRIPTER_JSON_CODEC = u'MSSQLSCRIPTER_JSON_CODEC'
+
+
+def to_bytes(content):
+    """
+        Copy a bytes-like object into bytes. On Python 2 bytes(memoryview) is it's repr, not it's content.
+    """
+    if isinstance(content, bytes):
+        return content
+    if isinstance(content, memoryview):
+        return content.tobytes()
+    return bytes(content)
+
+
+class StandardJsonCodec(object):
+    """
+        JSON codec backed by the standard library, always available.
+    """
+    name = u'json'
+
+    def dumps(self, obj):
+        """
+            Serialize obj to UTF-8 encoded JSON with sorted keys.
+        """
+        return json.dumps(obj, sort_keys=True).encode(u'utf-8')
+
+    def loads(self, content):
+        """
+            Deserialize UTF-8 encoded JSON from a bytes-like object.
+        """
+        # json.loads does not accept a memoryview, and only accepts bytes from Python 3.6.
+        return json.loads(to_bytes(content).decode(u'utf-8'))
+
+
+class OrjsonCodec(object):
+    """
+        JSON codec backed by orjson, decodes directly from the bytes-like object.
+    """
+    name = u'orjson'
+
+    def __init__(self):
+        import orjson
+        self.orjson = orjson
+
+    def dumps(self, obj):
+        return self.orjson.dumps(obj, option=self.orjson.OPT_SORT_KEYS)
+
+    def loads(self, content):
+        return self.orjson.loads(content)
+
+
+class UjsonCodec(object):
+    """
+        JSON codec backed by ujson.
+    """
+    name = u'ujson'
+
+    def __init__(self):
+        import ujson
+        self.ujson = ujson
+
+    def dumps(self, obj):
+        return self.ujson.dumps(obj, sort_keys=True, ensure_ascii=False).encode(u'utf-8')
+
+    def loads(self, content):
+        # ujson accepts bytes but not a memoryview.
+        return self.ujson.loads(to_bytes(content))
+
+
+class RapidjsonCodec(object):
+    """
+        JSON codec backed by python-rapidjson.
+    """
+    name = u'rapidjson'
+
+    def __init__(self):
+        import rapidjson
+        self.rapidjson = rapidjson
+
+    def dumps(self, obj):
+        return self.rapidjson.dumps(obj, sort_keys=True, ensure_ascii=False).encode(u'utf-8')
+
+    def loads(self, content):
+        # rapidjson accepts bytes but not a memoryview.
+        return self.rapidjson.loads(to_bytes(content))
+
+
+# Codecs in order of preference.
+CODECS = [OrjsonCodec, UjsonCodec, RapidjsonCodec, StandardJsonCodec]
+
+
+def get_codec(name=None):
+    """
+        Create the fastest available codec, or the codec with the given name.
+    Exceptions raised:
+        ValueError
+            The named codec does not exist.
+        ImportError
+            The named codec's package is not installed.
+    """
+    name = name or os.environ.get(MSSQLSCRIPTER_JSON_CODEC)
+    if name:
+        for codec_type in CODECS:
+            if codec_type.name == name:
+                return codec_type()
+        raise ValueError(u'Unknown JSON codec: {}'.format(name))
+
+    for codec_type in CODECS:
+        try:
+            codec = codec_type()
+            logger.debug(u'Using JSON codec: {}'.format(codec.name))
+            return codec
+        except ImportError:
+            pass
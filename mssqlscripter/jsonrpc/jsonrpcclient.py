@@ -3,12 +3,16 @@
 # Licensed under the MIT License. See License.txt in the project root for license information.
 # --------------------------------------------------------------------------------------------
 from __future__ import division
+from collections import deque
 from queue import Queue
 
 import enum
-import json
 import logging
+import re
 import threading
+import time
+
+import mssqlscripter.jsonrpc.jsoncodec as jsoncodec
 
 logger = logging.getLogger(u'mssqlscripter.jsonrpc.jsonrpcclient')
 
@@ -21,14 +25,27 @@ class JsonRpcClient(object):
     REQUEST_THREAD_NAME = u'Json_Rpc_Request_Thread'
     RESPONSE_THREAD_NAME = u'Json_Rpc_Response_Thread'
 
-    def __init__(self, in_stream, out_stream):
-        self.writer = JsonRpcWriter(in_stream)
-        self.reader = JsonRpcReader(out_stream)
+    def __init__(self, in_stream, out_stream, codec=None):
+        codec = codec or jsoncodec.get_codec()
+        self.writer = JsonRpcWriter(in_stream, codec=codec)
+        self.reader = JsonRpcReader(out_stream, codec=codec)
 
         self.request_queue = Queue()
-        # Response map intialized with event queue.
-        self.response_map = {0: Queue()}
-        self.exception_queue = Queue()
+        # Response map intialized with event queue. Only the response thread appends,
+        # so plain deques are enough.
+        self.response_map = {0: deque()}
+        # Notifications carrying a operation id are routed to the request that started the operation.
+        self.operation_map = {}
+        # Notifications of operations whose response did not arrive yet, by operation id.
+        self.unrouted_notifications = {}
+        # First exception a background thread encountered, raised to every consumer.
+        self.exception = None
+        # Notified whenever responses or a exception are enqueued.
+        self.response_available = threading.Condition()
+
+        # Notifications nobody consumes are counted but never decoded.
+        self.ignored_notifications = {}
+        self.ignored_notification_counts = {}
 
         self.cancel = False
 
@@ -60,6 +77,13 @@ class JsonRpcClient(object):
         request = {u'method': method, u'params': params, u'id': id}
         self.request_queue.put(request)
 
+    def ignore_notifications(self, methods, id=0):
+        """
+            Count notifications of the given methods routed to request id instead of queuing them.
+            Id 0 ignores them for every request.
+        """
+        self.ignored_notifications.setdefault(id, set()).update(methods)
+
     def request_finished(self, id):
         """
             Remove request id response entry.
@@ -68,22 +92,44 @@ class JsonRpcClient(object):
             logger.debug('Request with id: {} has completed.'.format(id))
             del self.response_map[id]
 
-    def get_response(self, id=0):
+        self.ignored_notifications.pop(id, None)
+        for operation_id, request_id in list(self.operation_map.items()):
+            if request_id == id:
+                del self.operation_map[operation_id]
+                self.unrouted_notifications.pop(operation_id, None)
+
+    def get_response(self, id=0, timeout=None):
         """
             Get latest response. Priority order: Response, Event, Exception.
-        """
-        if id in self.response_map:
-            if not self.response_map[id].empty():
-                return self.response_map[id].get()
-
-        if not self.response_map[0].empty():
-            return self.response_map[0].get()
+            If timeout is given, block for up to timeout seconds until one is available.
+        """
+        if timeout:
+            deadline = time.time() + timeout
+            with self.response_available:
+                while not self._has_response(id):
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self.response_available.wait(remaining)
+
+        # Requests may be consumed from different threads, so a queue can empty between check and pop.
+        for response_id in (id, 0):
+            try:
+                return self.response_map[response_id].popleft().decode()
+            except (KeyError, IndexError):
+                pass
 
-        if not self.exception_queue.empty():
-            raise self.exception_queue.get()
+        if self.exception:
+            raise self.exception
 
         return None
 
+    def _has_response(self, id):
+        """
+            Check if a response, event or exception is queued for id.
+        """
+        return bool(self.response_map.get(id) or self.response_map[0] or self.exception)
+
     def _listen_for_request(self):
         """
             Submit request if available.
@@ -120,20 +166,15 @@ class JsonRpcClient(object):
                     The stream may not contain any bytes yet, so retry.
         """
         while not self.cancel:
+            messages = []
             try:
-                response = self.reader.read_response()
-                response_id_str = response.get(u'id')
-                if response_id_str:
-                    response_id = int(response_id_str)
-                    # we have a id, map it with a new queue if it doesn't
-                    # exist.
-                    if response_id not in self.response_map:
-                        self.response_map[response_id] = Queue()
-                    # Enqueue the response.
-                    self.response_map[response_id].put(response)
-                else:
-                    # Event was returned.
-                    self.response_map[0].put(response)
+                try:
+                    # Drain every message framed by the last read.
+                    for message in self.reader.read_messages():
+                        messages.append(message)
+                finally:
+                    # Messages read before a exception are still delivered.
+                    self._enqueue_messages(messages)
 
             except EOFError as error:
                 # Thread fails once we reach EOF.
@@ -149,9 +190,65 @@ class JsonRpcClient(object):
                 break
             except Exception as error:
                 # Catch generic exceptions.
-                self.record_exception(error, self.RESPONSE_THREAD_NAME)
+                self._record_exception(error, self.RESPONSE_THREAD_NAME)
                 break
 
+    def _enqueue_messages(self, messages):
+        """
+            Hand a batch of undecoded messages to the response and event queues with one extend per
+            queue. Ignored notifications are only counted. Notifications of a operation that is not
+            registered yet are held until it's response arrives.
+        """
+        batches = {}
+        for message in messages:
+            response_id = message.id
+            held_notifications = []
+            if response_id:
+                # A response that starts a operation, route the operation's notifications to it's id.
+                if message.operation_id:
+                    self.operation_map[message.operation_id] = response_id
+                    held_notifications = self.unrouted_notifications.pop(message.operation_id, [])
+            else:
+                # Events do not have a id.
+                if message.method in self.ignored_notifications.get(0, ()):
+                    self._count_ignored_notification(message)
+                    continue
+
+                operation_id = message.operation_id
+                if operation_id and operation_id not in self.operation_map:
+                    # The tools service starts the operation before it sends the response registering it.
+                    self.unrouted_notifications.setdefault(operation_id, []).append(message)
+                    continue
+
+                response_id = self.operation_map.get(operation_id, 0)
+                if message.method in self.ignored_notifications.get(response_id, ()):
+                    self._count_ignored_notification(message)
+                    continue
+
+            if response_id not in batches:
+                batches[response_id] = []
+            batches[response_id].append(message)
+            for notification in held_notifications:
+                if notification.method in self.ignored_notifications.get(response_id, ()):
+                    self._count_ignored_notification(notification)
+                else:
+                    batches[response_id].append(notification)
+
+        if not batches:
+            return
+
+        with self.response_available:
+            for response_id, batch in batches.items():
+                # Map the id with a new queue if it doesn't exist.
+                if response_id not in self.response_map:
+                    self.response_map[response_id] = deque()
+                self.response_map[response_id].extend(batch)
+            self.response_available.notify_all()
+
+    def _count_ignored_notification(self, message):
+        self.ignored_notification_counts[message.method] = \
+            self.ignored_notification_counts.get(message.method, 0) + 1
+
     def _record_exception(self, ex, thread_name):
         """
             Record exception to allow main thread to access.
@@ -159,7 +256,10 @@ class JsonRpcClient(object):
         logger.debug(
             u'Thread: {} encountered exception {}'.format(
                 thread_name, ex))
-        self.exception_queue.put(ex)
+        with self.response_available:
+            if not self.exception:
+                self.exception = ex
+            self.response_available.notify_all()
 
     def shutdown(self):
         """
@@ -178,6 +278,111 @@ class JsonRpcClient(object):
         logger.info('Shutting down Json rpc client.')
 
 
+def parse_headers(headers_read):
+    """
+        Parse the headers of a message, excluding the trailing '\r\n\r\n', into a dictionary keyed by lower case name.
+    Exceptions:
+        KeyError
+            A header is missing the colon.
+        LookupError
+            The content-length header was not found.
+    """
+    headers = {}
+    # Split the headers by new line
+    for header in headers_read.decode(u'ascii').split(u'\n'):
+        colon_index = header.find(u':')
+
+        if colon_index == -1:
+            logger.debug(
+                u'JSON RPC Reader encountered missing colons in try_read_headers()')
+            raise KeyError(
+                u'Colon missing from Header: {}.'.format(header))
+
+        # Case insensitive.
+        header_key = header[:colon_index].lower()
+        header_value = header[colon_index + 1:]
+
+        headers[header_key] = header_value
+
+    # Was content-length header found?
+    if not ('content-length' in headers):
+        logger.debug(
+            u'JSON RPC Reader did not find Content-Length in the headers')
+        raise LookupError(
+            u'Content-Length was not found in headers received.')
+
+    return headers
+
+
+class JsonRpcMessage(object):
+    """
+        Undecoded JSON RPC message tagged with the method name and id sniffed from its content.
+    """
+    # The keys are quoted, so they do not match inside escaped strings or keys like operationId.
+    KEY_PATTERN = re.compile(br'"(method|id)"\s*:')
+    METHOD_PATTERN = re.compile(br'"method"\s*:\s*"([^"]*)"')
+    ID_PATTERN = re.compile(br'"id"\s*:\s*"?(\d+)')
+    OPERATION_ID_PATTERN = re.compile(br'"operationId"\s*:\s*"([^"]*)"')
+
+    def __init__(self, content, codec):
+        self.content = content
+        self.codec = codec
+        self.method = None
+        self.id = None
+        self._operation_id = None
+
+        keys = self.KEY_PATTERN.findall(content)
+        if keys.count(b'method') > 1 or keys.count(b'id') > 1:
+            # A key is nested in the params or result, only the top level keys identify the message.
+            self._decode_method_and_id()
+            return
+
+        method = self.METHOD_PATTERN.search(content) if b'method' in keys else None
+        self.method = method.group(1).decode(u'utf-8') if method else None
+        # Notifications have a method and no id, whatever their params contain.
+        message_id = self.ID_PATTERN.search(content) if b'id' in keys and not self.method else None
+        self.id = int(message_id.group(1)) if message_id else None
+
+    def _decode_method_and_id(self):
+        try:
+            message = self.codec.loads(self.content)
+        except ValueError:
+            # The message is queued as a event and fails when it is decoded.
+            return
+        if not isinstance(message, dict):
+            return
+
+        self.method = message.get(u'method')
+        message_id = message.get(u'id')
+        if not self.method and u'{}'.format(message_id).isdigit():
+            self.id = int(message_id)
+
+    @property
+    def operation_id(self):
+        """
+            Operation id sniffed from the content, only searched for when asked.
+        """
+        if self._operation_id is None:
+            operation_id = self.OPERATION_ID_PATTERN.search(self.content)
+            self._operation_id = operation_id.group(1).decode(u'utf-8') if operation_id else u''
+
+        return self._operation_id or None
+
+    def decode(self):
+        """
+            Decode the message content.
+        Exceptions raised:
+            ValueError
+                if the body-content can not be serialized to a JSON object.
+        """
+        try:
+            return self.codec.loads(self.content)
+        except ValueError as ex:
+            logger.debug(
+                u'JSON RPC message with method: {} failed to decode: {}'.format(self.method, ex))
+            raise
+
+
 class ReadState(enum.Enum):
     Header = 1
     Content = 2
@@ -189,9 +394,11 @@ class JsonRpcWriter(object):
     """
     HEADER = u'Content-Length: {0}\r\n\r\n'
 
-    def __init__(self, stream, encoding=None):
+    def __init__(self, stream, encoding=None, codec=None):
         self.stream = stream
         self.encoding = encoding or u'UTF-8'
+        # The codec serializes straight to UTF-8 bytes.
+        self.codec = codec or jsoncodec.get_codec()
 
     def send_request(self, method, params, id=None):
         """
@@ -208,11 +415,11 @@ class JsonRpcWriter(object):
             u'id': id
         }
 
-        json_content = json.dumps(content_body, sort_keys=True)
+        json_content = self.codec.dumps(content_body)
         header = self.HEADER.format(str(len(json_content)))
         try:
             self.stream.write(header.encode(u'ascii'))
-            self.stream.write(json_content.encode(self.encoding))
+            self.stream.write(json_content)
             self.stream.flush()
 
         except ValueError as ex:
@@ -232,15 +439,20 @@ class JsonRpcWriter(object):
 class JsonRpcReader(object):
     """
         Read JSON RPC message from output stream.
+
+        Messages are framed out of a single reusable buffer. The header scan resumes where the
+        previous attempt stopped, and unread bytes are only moved when the free space at the tail
+        of the buffer runs low, so a message is relocated at most once before it is decoded.
     """
-    # \r\n
-    CR = 13
-    LF = 10
+    # \r\n\r\n
+    HEADER_DELIMITER = b'\r\n\r\n'
     BUFFER_RESIZE_TRIGGER = 0.25
     DEFAULT_BUFFER_SIZE = 8192
 
-    def __init__(self, stream, encoding=None):
+    def __init__(self, stream, encoding=None, codec=None):
         self.encoding = encoding or u'UTF-8'
+        # The codec decodes straight from the UTF-8 bytes in the buffer.
+        self.codec = codec or jsoncodec.get_codec()
 
         self.stream = stream
         self.buffer = bytearray(self.DEFAULT_BUFFER_SIZE)
@@ -248,10 +460,11 @@ class JsonRpcReader(object):
         self.buffer_end_offset = 0
         # Pointer to where we have read up to.
         self.read_offset = 0
+        # Pointer to where the last header scan stopped.
+        self.scan_offset = 0
         self.expected_content_length = 0
         self.headers = {}
         self.read_state = ReadState.Header
-        self.needs_more_data = True
 
     def read_response(self):
         """
@@ -260,37 +473,68 @@ class JsonRpcReader(object):
             ValueError
                 if the body-content can not be serialized to a JSON object.
         """
-        # Using a mutable list to hold the value since a immutable string
-        # passed by reference won't change the value.
-        content = ['']
-        try:
-            while (not self.needs_more_data or self.read_next_chunk()):
-                # We should have all the data we need to form a message in the buffer.
-                # If we need more data to form the next message, this flag will
-                # be reset by a attempt to form a header or content.
-                self.needs_more_data = False
-                # If we can't read a header, read the next chunk.
-                if self.read_state is ReadState.Header and not self.try_read_headers():
-                    self.needs_more_data = True
-                    continue
-                # If we read the header, try the content. If that fails, read
-                # the next chunk.
-                if self.read_state is ReadState.Content and not self.try_read_content(
-                        content):
-                    self.needs_more_data = True
-                    continue
-                # We have the  content
-                break
+        return self.decode_content(self.read_content())
 
-            # Resize buffer and remove bytes we have read
-            self.trim_buffer_and_resize(self.read_offset)
-            return json.loads(content[0])
+    def read_responses(self):
+        """
+            Read every JSON RPC message available. Blocks until one message is formed, then yields
+            the rest of the messages already buffered without reading from the stream again.
+        """
+        yield self.read_response()
+
+        content = self.try_read_message()
+        while content is not None:
+            yield self.decode_content(content)
+            content = self.try_read_message()
+
+    def read_messages(self):
+        """
+            Like read_responses(), but yields undecoded messages that own a copy of their content.
+        """
+        yield JsonRpcMessage(self.read_content().tobytes(), self.codec)
+
+        content = self.try_read_message()
+        while content is not None:
+            yield JsonRpcMessage(content.tobytes(), self.codec)
+            content = self.try_read_message()
+
+    def read_content(self):
+        """
+            Read the content body of the next message, reading from the stream until one is formed.
+        """
+        content = self.try_read_message()
+        while content is None:
+            # We need more data to form the next message.
+            self.read_next_chunk()
+            content = self.try_read_message()
+
+        return content
+
+    def decode_content(self, content):
+        """
+            Decode a message content body.
+        Exceptions raised:
+            ValueError
+                if the body-content can not be serialized to a JSON object.
+        """
+        try:
+            return self.codec.loads(content)
         except ValueError as ex:
             # response has invalid json object.
             logger.debug(
                 u'JSON RPC Reader on read_response() encountered exception: {}'.format(ex))
             raise
 
+    def try_read_message(self):
+        """
+            Try to form the next message from the bytes already buffered without reading the stream.
+            Returns the content body or None if the buffer does not hold a complete message yet.
+        """
+        if self.read_state is ReadState.Header and not self.try_read_headers():
+            return None
+
+        return self.try_read_content()
+
     def read_next_chunk(self):
         """
         Read a chunk from the output stream into buffer.
@@ -300,27 +544,19 @@ class JsonRpcReader(object):
             ValueError
                 Stream was closed externally.
         """
-        # Check if we need to resize.
-        current_buffer_size = len(self.buffer)
-        if ((current_buffer_size - self.buffer_end_offset) /
-                current_buffer_size) < self.BUFFER_RESIZE_TRIGGER:
-            resized_buffer = bytearray(current_buffer_size * 2)
-            # copy current buffer content to new buffer.
-            resized_buffer[0:current_buffer_size] = self.buffer
-            # point to new buffer.
-            self.buffer = resized_buffer
+        self.reserve_buffer_space()
 
         # Memory view is required in order to read into a subset of a byte
         # array
         try:
             length_read = self.stream.readinto(
                 memoryview(self.buffer)[self.buffer_end_offset:])
-            self.buffer_end_offset += length_read
 
             if not length_read:
                 logger.debug(u'JSON RPC Reader reached end of stream')
                 raise EOFError(u'End of stream reached, no output.')
 
+            self.buffer_end_offset += length_read
             return True
         except ValueError as ex:
             logger.debug(
@@ -337,96 +573,95 @@ class JsonRpcReader(object):
             ValueError
                 The content-length contained a invalid literal for int.
         """
-        # Scan the buffer up until right before the CRLFCRLF.
-        scan_offset = self.read_offset
-        while (scan_offset + 3 < self.buffer_end_offset and
-                (self.buffer[scan_offset] != self.CR or
-                 self.buffer[scan_offset + 1] != self.LF or
-                 self.buffer[scan_offset + 2] != self.CR or
-                 self.buffer[scan_offset + 3] != self.LF)):
-            scan_offset += 1
-
-        # if we reached the end
-        if scan_offset + 3 >= self.buffer_end_offset:
+        # Resume the scan where the previous attempt stopped.
+        scan_offset = self.buffer.find(
+            self.HEADER_DELIMITER,
+            max(self.scan_offset, self.read_offset),
+            self.buffer_end_offset)
+
+        if scan_offset == -1:
+            # A partial delimiter may sit at the end of the buffer, rescan only those bytes.
+            self.scan_offset = max(
+                self.read_offset,
+                self.buffer_end_offset - len(self.HEADER_DELIMITER) + 1)
             return False
 
-        # Split the headers by new line
-        try:
-            headers_read = self.buffer[self.read_offset:scan_offset].decode(
-                u'ascii')
-            for header in headers_read.split(u'\n'):
-                colon_index = header.find(u':')
-
-                if colon_index == -1:
-                    logger.debug(
-                        u'JSON RPC Reader encountered missing colons in try_read_headers()')
-                    raise KeyError(
-                        u'Colon missing from Header: {}.'.format(header))
-
-                # Case insensitive.
-                header_key = header[:colon_index].lower()
-                header_value = header[colon_index + 1:]
-
-                self.headers[header_key] = header_value
-
-            # Was content-length header found?
-            if not ('content-length' in self.headers):
-                logger.debug(
-                    u'JSON RPC Reader did not find Content-Length in the headers')
-                raise LookupError(
-                    u'Content-Length was not found in headers received.')
+        header_end_offset = scan_offset + len(self.HEADER_DELIMITER)
 
+        try:
+            self.headers = parse_headers(self.buffer[self.read_offset:scan_offset])
             self.expected_content_length = int(self.headers[u'content-length'])
 
         except ValueError:
-            # Content-length contained invalid literal for int.
-            self.trim_buffer_and_resize(scan_offset + 4)
+            # Content-length contained invalid literal for int, skip the headers.
+            self.consume(header_end_offset)
             raise
 
         # Pushing read pointer past the newline characters.
-        self.read_offset = scan_offset + 4
+        self.read_offset = header_end_offset
+        self.scan_offset = header_end_offset
         self.read_state = ReadState.Content
 
         return True
 
-    def try_read_content(self, content):
+    def try_read_content(self):
         """
-            Try to read content from internal buffer.
+            Try to read content from internal buffer. The content is a view into the buffer that is
+            only valid until the next read from the stream.
         """
         if (self.buffer_end_offset - self.read_offset <
                 self.expected_content_length):
             # We buffered less than the expected content length.
-            return False
+            return None
 
-        content[0] = self.buffer[self.read_offset:self.read_offset +
-                                 self.expected_content_length].decode(self.encoding)
-        self.read_offset += self.expected_content_length
+        content_end_offset = self.read_offset + self.expected_content_length
+        content = memoryview(self.buffer)[self.read_offset:content_end_offset]
+        self.consume(content_end_offset)
 
         self.read_state = ReadState.Header
 
-        return True
+        return content
+
+    def consume(self, offset):
+        """
+            Mark the buffer as read up to offset. Pointers are rewound for free once every
+            buffered byte has been read.
+        """
+        if offset >= self.buffer_end_offset:
+            self.buffer_end_offset = 0
+            offset = 0
+
+        self.read_offset = offset
+        self.scan_offset = offset
 
-    def trim_buffer_and_resize(self, bytes_to_remove):
+    def reserve_buffer_space(self):
         """
-        Trim the buffer by the passed in bytes_to_remove by creating a new buffer that is at a minimum the default max size.
+            Ensure the tail of the buffer has room for the next read. When it runs low, the unread
+            bytes are copied once to the front of a buffer large enough to hold the whole message
+            being assembled, growing by doubling from the default size.
         """
         current_buffer_size = len(self.buffer)
-        # Create a new buffer with either minumum size or leftover size.
-        new_buffer = bytearray(max(current_buffer_size -
-                                   bytes_to_remove, self.DEFAULT_BUFFER_SIZE))
+        if ((current_buffer_size - self.buffer_end_offset) /
+                current_buffer_size) >= self.BUFFER_RESIZE_TRIGGER:
+            return
 
-        # if we have content we did not read, copy that portion to the new
-        # buffer.
-        if (bytes_to_remove <= current_buffer_size):
-            new_buffer[:self.buffer_end_offset -
-                       bytes_to_remove] = self.buffer[bytes_to_remove:self.buffer_end_offset]
+        unread_length = self.buffer_end_offset - self.read_offset
+        required_length = unread_length
+        if self.read_state is ReadState.Content:
+            required_length = max(required_length, self.expected_content_length)
 
-        # Point to the new buffer.
-        self.buffer = new_buffer
+        new_buffer_size = self.DEFAULT_BUFFER_SIZE
+        while required_length > new_buffer_size * (1 - self.BUFFER_RESIZE_TRIGGER):
+            new_buffer_size *= 2
+
+        new_buffer = bytearray(new_buffer_size)
+        new_buffer[:unread_length] = memoryview(self.buffer)[self.read_offset:self.buffer_end_offset]
 
-        # reset pointers after the shift.
+        # Point to the new buffer and shift the pointers.
+        self.buffer = new_buffer
+        self.scan_offset = max(self.scan_offset - self.read_offset, 0)
         self.read_offset = 0
-        self.buffer_end_offset -= bytes_to_remove
+        self.buffer_end_offset = unread_length
 
     def close(self):
         """
@@ -0,0 +1,204 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import asyncio
+import json
+import unittest
+
+import mssqlscripter.jsonrpc.asyncjsonrpcclient as async_json_rpc_client
+import mssqlscripter.jsonrpc.contracts.asyncscriptingservice as async_scripting
+import mssqlscripter.jsonrpc.contracts.scriptingservice as scripting
+
+
+class FakeStreamWriter(object):
+    """
+        Records written requests and answers each with the messages the test provides.
+    """
+
+    def __init__(self, stream_reader, respond):
+        self.stream_reader = stream_reader
+        self.respond = respond
+        self.requests = []
+        self.closed = False
+
+    def write(self, data):
+        content = json.loads(data[data.index(b'\r\n\r\n') + 4:].decode(u'utf-8'))
+        self.requests.append(content)
+        for message in self.respond(content):
+            self.stream_reader.feed_data(frame(message))
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def frame(message):
+    content = json.dumps(message).encode(u'utf-8')
+    return u'Content-Length: {}\r\n\r\n'.format(len(content)).encode(u'ascii') + content
+
+
+def scripting_events(request):
+    """
+        Respond to a scripting request with a response, a progress notification and completion.
+    """
+    operation_id = u'operation-{}'.format(request[u'id'])
+    progress = {
+        u'scriptingObject': {u'type': u'Table', u'schema': u'dbo', u'name': request[u'params'][u'FilePath']},
+        u'status': u'Completed',
+        u'completedCount': 1,
+        u'totalCount': 1,
+        u'operationId': operation_id,
+        u'sequenceNumber': 1}
+    complete = {
+        u'errorDetails': None,
+        u'errorMessage': None,
+        u'hasError': False,
+        u'canceled': False,
+        u'success': True,
+        u'operationId': operation_id,
+        u'sequenceNumber': 2}
+    return [
+        {u'jsonrpc': u'2.0', u'id': str(request[u'id']), u'result': {u'operationId': operation_id}},
+        {u'jsonrpc': u'2.0', u'method': u'scripting/scriptProgressNotification', u'params': progress},
+        {u'jsonrpc': u'2.0', u'method': u'scripting/scriptComplete', u'params': complete}]
+
+
+def notifications_first(request):
+    """
+        Respond to a scripting request with it's notifications before the response, as a tools service
+        that started the operation before answering.
+    """
+    events = scripting_events(request)
+    return events[1:] + events[:1]
+
+
+async def collect_responses(request):
+    """
+        Iterate a scripting request until it completes.
+    """
+    responses = []
+    async for response in request:
+        responses.append(response)
+    return responses
+
+
+def scripting_parameters(file_path):
+    return {
+        u'FilePath': file_path,
+        u'ConnectionString': u'Sample_connection_string',
+        u'ScriptDestination': u'ToSingleFile'}
+
+
+class AsyncJsonRpcClientTests(unittest.TestCase):
+    """
+        Async Json Rpc client tests.
+    """
+
+    def run_async(self, coroutine):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            loop.close()
+
+    def test_request_response(self):
+        """
+            Verify a request is written and it's response awaited.
+        """
+        async def run():
+            stream_reader = asyncio.StreamReader()
+            stream_writer = FakeStreamWriter(
+                stream_reader, lambda request: [{u'id': request[u'id'], u'result': {u'key': u'value'}}])
+            client = async_json_rpc_client.AsyncJsonRpcClient(stream_reader, stream_writer)
+            client.start()
+
+            response = await client.request(u'testMethod/DoThis', {u'Key': u'Value'})
+            self.assertEqual(response, {u'id': 1, u'result': {u'key': u'value'}})
+            self.assertEqual(stream_writer.requests[0][u'method'], u'testMethod/DoThis')
+
+            await client.shutdown()
+            self.assertTrue(stream_writer.closed)
+
+        self.run_async(run())
+
+    def test_end_of_stream_fails_pending_request(self):
+        """
+            Verify the end of the stream is raised to waiting requests.
+        """
+        async def run():
+            stream_reader = asyncio.StreamReader()
+            stream_writer = FakeStreamWriter(stream_reader, lambda request: [])
+            client = async_json_rpc_client.AsyncJsonRpcClient(stream_reader, stream_writer)
+            client.start()
+
+            stream_reader.feed_eof()
+            with self.assertRaises(EOFError):
+                await client.request(u'testMethod/DoThis', {u'Key': u'Value'})
+            await client.shutdown()
+
+        self.run_async(run())
+
+    def test_concurrent_scripting_requests(self):
+        """
+            Verify concurrent scripting requests on one client receive their own events, also when they arrive
+            before the response.
+        """
+        for respond in (scripting_events, notifications_first):
+            self.verify_concurrent_scripting_requests(respond)
+
+    def verify_concurrent_scripting_requests(self, respond):
+        async def run_request(client, file_path):
+            request = async_scripting.AsyncScriptingRequest(client, scripting_parameters(file_path))
+            await request.execute()
+            return await collect_responses(request)
+
+        async def run():
+            stream_reader = asyncio.StreamReader()
+            stream_writer = FakeStreamWriter(stream_reader, respond)
+            client = async_json_rpc_client.AsyncJsonRpcClient(stream_reader, stream_writer)
+            client.start()
+
+            results = await asyncio.gather(
+                run_request(client, u'first.sql'), run_request(client, u'second.sql'))
+            await client.shutdown()
+            return client, results
+
+        client, results = self.run_async(run())
+        for file_path, responses in zip([u'first.sql', u'second.sql'], results):
+            self.assertEqual(
+                [type(response) for response in responses],
+                [scripting.ScriptResponse, scripting.ScriptProgressNotificationEvent, scripting.ScriptCompleteEvent])
+            self.assertEqual(responses[1].scripting_object[u'name'], file_path)
+            self.assertTrue(responses[2].success)
+        self.assertEqual(client.unrouted_notifications, {})
+
+    def test_ignored_progress_notifications(self):
+        """
+            Verify ignored notifications are counted and not delivered.
+        """
+        async def run():
+            stream_reader = asyncio.StreamReader()
+            stream_writer = FakeStreamWriter(stream_reader, scripting_events)
+            client = async_json_rpc_client.AsyncJsonRpcClient(stream_reader, stream_writer)
+            client.start()
+
+            request = async_scripting.AsyncScriptingRequest(client, scripting_parameters(u'file.sql'))
+            request.ignore_progress_notifications()
+            await request.execute()
+            responses = await collect_responses(request)
+            await client.shutdown()
+            return client, responses
+
+        client, responses = self.run_async(run())
+        self.assertEqual(
+            [type(response) for response in responses],
+            [scripting.ScriptResponse, scripting.ScriptCompleteEvent])
+        self.assertEqual(client.ignored_notification_counts, {u'scripting/scriptProgressNotification': 1})
+
+
+if __name__ == u'__main__':
+    unittest.main()
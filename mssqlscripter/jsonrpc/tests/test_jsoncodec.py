@@ -0,0 +1,81 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import os
+import unittest
+
+import mssqlscripter.jsonrpc.jsoncodec as jsoncodec
+
+
+class JsonCodecTests(unittest.TestCase):
+    """
+        JSON codec tests.
+    """
+
+    def get_available_codecs(self):
+        """
+            Helper to create every codec whose backend is installed.
+        """
+        codecs = []
+        for codec_type in jsoncodec.CODECS:
+            try:
+                codecs.append(codec_type())
+            except ImportError:
+                pass
+        return codecs
+
+    def test_codecs_round_trip(self):
+        """
+            Verify every installed codec round trips a message from bytes and memoryview.
+        """
+        message = {
+            u'jsonrpc': u'2.0',
+            u'method': u'scripting/scriptPlanNotification',
+            u'params': {
+                u'scriptingObjects': [{u'type': u'Table', u'schema': u'dbo', u'name': u'T\xe4ble'}],
+                u'count': 1}}
+
+        for codec in self.get_available_codecs():
+            content = codec.dumps(message)
+            self.assertTrue(isinstance(content, bytes))
+            self.assertEqual(codec.loads(content), message)
+            self.assertEqual(codec.loads(memoryview(bytearray(content))[:]), message)
+
+    def test_codecs_sort_keys(self):
+        """
+            Verify every installed codec serializes keys in a stable order.
+        """
+        for codec in self.get_available_codecs():
+            content = codec.dumps({u'params': 1, u'id': 2, u'jsonrpc': u'2.0'})
+            self.assertTrue(content.index(b'"id"') < content.index(b'"jsonrpc"') < content.index(b'"params"'))
+
+    def test_invalid_json_raises_value_error(self):
+        """
+            Verify every installed codec raises ValueError on invalid JSON.
+        """
+        for codec in self.get_available_codecs():
+            with self.assertRaises(ValueError):
+                codec.loads(b'{"key":"value"')
+
+    def test_get_codec_by_name(self):
+        """
+            Verify codec selection by name and environment variable.
+        """
+        self.assertTrue(isinstance(jsoncodec.get_codec(u'json'), jsoncodec.StandardJsonCodec))
+        with self.assertRaises(ValueError):
+            jsoncodec.get_codec(u'notacodec')
+
+        os.environ[jsoncodec.MSSQLSCRIPTER_JSON_CODEC] = u'json'
+        try:
+            self.assertTrue(isinstance(jsoncodec.get_codec(), jsoncodec.StandardJsonCodec))
+        finally:
+            del os.environ[jsoncodec.MSSQLSCRIPTER_JSON_CODEC]
+
+        # The fastest installed codec is picked by default.
+        self.assertEqual(jsoncodec.get_codec().name, self.get_available_codecs()[0].name)
+
+
+if __name__ == u'__main__':
+    unittest.main()
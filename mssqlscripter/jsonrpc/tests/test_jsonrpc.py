@@ -5,6 +5,7 @@
 
 import io
 import unittest
+import mssqlscripter.jsonrpc.jsoncodec as jsoncodec
 import mssqlscripter.jsonrpc.jsonrpcclient as jsonrpc
 
 
@@ -195,19 +196,122 @@ class JsonRpcTest(unittest.TestCase):
 
     def test_max_buffer_resize(self):
         """
-            Verify max buffer resize.
+            Verify a drained buffer is reused instead of reallocated.
         """
         test_stream = io.BytesIO(b'Content-Length: 15\r\n\r\n{"key":"value"}')
         json_rpc_reader = jsonrpc.JsonRpcReader(test_stream)
-        # Double buffer size to max to verify resize takes leftover size.
+        # Double buffer size to max.
         json_rpc_reader.buffer = bytearray(16384)
+        message_buffer = json_rpc_reader.buffer
         # Verify initial buffer size was set.
         self.assertEqual(len(json_rpc_reader.buffer), 16384)
         response = json_rpc_reader.read_response()
         baseline = {u'key': u'value'}
         self.assertEqual(response, baseline)
-        # Verify buffer size decreased by bytes_read.
-        self.assertEqual(len(json_rpc_reader.buffer), 16347)
+        # Verify the same buffer is kept and the pointers were rewound.
+        self.assertIs(json_rpc_reader.buffer, message_buffer)
+        self.assertEqual(json_rpc_reader.read_offset, 0)
+        self.assertEqual(json_rpc_reader.buffer_end_offset, 0)
+
+    def test_multiple_responses_in_small_chunks(self):
+        """
+            Verify messages split across many small reads are framed correctly.
+        """
+        messages = b''.join(
+            b'Content-Length: 13\r\n\r\n{"id": ' + str(i).encode(u'ascii') * 5 + b'}'
+            for i in range(1, 10))
+        # Read two bytes at a time so headers and contents are split at every position.
+        test_stream = ChunkedStream(messages, 2)
+        json_rpc_reader = jsonrpc.JsonRpcReader(test_stream)
+        for i in range(1, 10):
+            response = json_rpc_reader.read_response()
+            self.assertEqual(response, {u'id': int(str(i) * 5)})
+
+        with self.assertRaises(EOFError):
+            json_rpc_reader.read_response()
+
+    def test_read_responses_drains_buffer(self):
+        """
+            Verify every buffered message is yielded without reading the stream again.
+        """
+        messages = b'Content-Length: 10\r\n\r\n{"id": 11}' * 3 + b'Content-Length: 10\r\n\r\n{"id"'
+        test_stream = io.BytesIO(messages)
+        json_rpc_reader = jsonrpc.JsonRpcReader(test_stream)
+
+        responses = list(json_rpc_reader.read_responses())
+        self.assertEqual(responses, [{u'id': 11}] * 3)
+        # The partial message stays buffered for the next batch.
+        self.assertEqual(json_rpc_reader.read_state, jsonrpc.ReadState.Content)
+
+        with self.assertRaises(EOFError):
+            list(json_rpc_reader.read_responses())
+
+    def test_read_messages_sniffs_method_and_id(self):
+        """
+            Verify undecoded messages are tagged with their method and id.
+        """
+        test_stream = io.BytesIO(
+            b'Content-Length: 61\r\n\r\n{"method": "scripting/scriptComplete", "params": {"id": "x"}}'
+            b'Content-Length: 42\r\n\r\n{"id": "12", "result": {"operationId": 3}}')
+        json_rpc_reader = jsonrpc.JsonRpcReader(test_stream)
+
+        messages = list(json_rpc_reader.read_messages())
+        self.assertEqual(messages[0].method, u'scripting/scriptComplete')
+        self.assertEqual(messages[0].id, None)
+        self.assertEqual(messages[0].decode(), {u'method': u'scripting/scriptComplete', u'params': {u'id': u'x'}})
+        self.assertEqual(messages[1].method, None)
+        self.assertEqual(messages[1].id, 12)
+        self.assertEqual(messages[1].decode(), {u'id': u'12', u'result': {u'operationId': 3}})
+
+    def test_sniff_ignores_nested_id(self):
+        """
+            Verify only the top level method and id keys identify a message.
+        """
+        codec = jsoncodec.get_codec()
+        notification = jsonrpc.JsonRpcMessage(
+            b'{"params": {"scriptingObject": {"id": "7"}}, "method": "scripting/scriptProgressNotification"}', codec)
+        self.assertEqual((notification.method, notification.id), (u'scripting/scriptProgressNotification', None))
+
+        response = jsonrpc.JsonRpcMessage(b'{"result": {"id": "7", "method": "x"}, "id": "12"}', codec)
+        self.assertEqual((response.method, response.id), (None, 12))
+
+        request = jsonrpc.JsonRpcMessage(b'{"id": 3, "params": {"id": 4}, "method": "window/showMessage"}', codec)
+        self.assertEqual((request.method, request.id), (u'window/showMessage', None))
+
+    def test_header_scan_resumes(self):
+        """
+            Verify a partial header is not rescanned from the start.
+        """
+        test_stream = io.BytesIO(b'Content-Length: 15\r\n')
+        json_rpc_reader = jsonrpc.JsonRpcReader(test_stream)
+        json_rpc_reader.read_next_chunk()
+
+        self.assertFalse(json_rpc_reader.try_read_headers())
+        # Only the trailing bytes that may start a delimiter are left to rescan.
+        self.assertEqual(json_rpc_reader.scan_offset, 17)
+
+    def test_large_response_grows_buffer_once(self):
+        """
+            Verify a message larger than the buffer is assembled with a single growth.
+        """
+        content = b'{"key": "' + b'x' * 100000 + b'"}'
+        header = u'Content-Length: {}\r\n\r\n'.format(len(content)).encode(u'ascii')
+        test_stream = ChunkedStream(header + content, 4096)
+        json_rpc_reader = jsonrpc.JsonRpcReader(test_stream)
+
+        buffer_sizes = set()
+        original_reserve = json_rpc_reader.reserve_buffer_space
+
+        def track_reserve():
+            original_reserve()
+            buffer_sizes.add(len(json_rpc_reader.buffer))
+
+        json_rpc_reader.reserve_buffer_space = track_reserve
+        response = json_rpc_reader.read_response()
+
+        self.assertEqual(len(response[u'key']), 100000)
+        # Default size before the header was read, then one buffer sized for the whole message.
+        self.assertEqual(len(buffer_sizes), 2)
 
     def test_read_state(self):
         """
@@ -240,5 +344,19 @@ class JsonRpcTest(unittest.TestCase):
         self.assertEqual(response, baseline)
 
 
+class ChunkedStream(io.BytesIO):
+    """
+        Stream that returns at most chunk_size bytes per read, like a pipe.
+    """
+
+    def __init__(self, content, chunk_size):
+        super(ChunkedStream, self).__init__(content)
+        self.chunk_size = chunk_size
+
+    def readinto(self, buffer):
+        return super(ChunkedStream, self).readinto(
+            memoryview(buffer)[:self.chunk_size])
+
+
 if __name__ == u'__main__':
     unittest.main()
@@ -4,9 +4,12 @@
 # --------------------------------------------------------------------------------------------
 
 import unittest
+import threading
 import time
 import io
+import os
 
+import mssqlscripter.jsonrpc.jsoncodec as jsoncodec
 import mssqlscripter.jsonrpc.jsonrpcclient as json_rpc_client
 
 
@@ -70,8 +73,9 @@ class JsonRpcClientTests(unittest.TestCase):
         output_stream = io.BytesIO(
             b'Content-Length: 15\r\n\r\n{"key":"value"}')
 
+        # Compare against the standard library serialization.
         test_client = json_rpc_client.JsonRpcClient(
-            input_stream, output_stream)
+            input_stream, output_stream, codec=jsoncodec.StandardJsonCodec())
         test_client.start()
         time.sleep(.5)
         # Verify threads are alive and running.
@@ -99,8 +103,9 @@ class JsonRpcClientTests(unittest.TestCase):
         output_stream = io.BytesIO(
             b'Content-Length: 15\r\n\r\n{"key":"value"}')
 
+        # Compare against the standard library serialization.
         test_client = json_rpc_client.JsonRpcClient(
-            input_stream, output_stream)
+            input_stream, output_stream, codec=jsoncodec.StandardJsonCodec())
         test_client.start()
         time.sleep(.5)
         # request thread is alive.
@@ -291,6 +296,86 @@ class JsonRpcClientTests(unittest.TestCase):
         self.assertEqual(response, baseline)
         test_client.shutdown()
 
+    def test_batched_responses_dequeued_in_order(self):
+        """
+            Verify responses framed by a single read are delivered in order to their queues.
+        """
+        input_stream = io.BytesIO()
+        output_stream = io.BytesIO(
+            b'Content-Length: 32\r\n\r\n{"method": "event", "params": 1}'
+            b'Content-Length: 22\r\n\r\n{"id": 1, "result": 1}'
+            b'Content-Length: 32\r\n\r\n{"method": "event", "params": 2}'
+            b'Content-Length: 22\r\n\r\n{"id": 1, "result": 2}')
+
+        test_client = json_rpc_client.JsonRpcClient(
+            input_stream, output_stream)
+        test_client.start()
+        # Response thread exits once it reaches the end of the stream.
+        test_client.response_thread.join()
+
+        self.assertEqual(test_client.get_response(id=1), {u'id': 1, u'result': 1})
+        self.assertEqual(test_client.get_response(id=1), {u'id': 1, u'result': 2})
+        self.assertEqual(test_client.get_response(id=1), {u'method': u'event', u'params': 1})
+        self.assertEqual(test_client.get_response(id=1), {u'method': u'event', u'params': 2})
+        with self.assertRaises(EOFError):
+            test_client.get_response(id=1)
+        test_client.shutdown()
+
+    def test_ignored_notifications_counted(self):
+        """
+            Verify ignored notifications are counted and never queued.
+        """
+        input_stream = io.BytesIO()
+        output_stream = io.BytesIO(
+            b'Content-Length: 32\r\n\r\n{"method": "event", "params": 1}'
+            b'Content-Length: 22\r\n\r\n{"id": 1, "result": 1}'
+            b'Content-Length: 32\r\n\r\n{"method": "event", "params": 2}'
+            b'Content-Length: 33\r\n\r\n{"method": "other", "params": 3 }')
+
+        test_client = json_rpc_client.JsonRpcClient(
+            input_stream, output_stream)
+        test_client.ignore_notifications([u'event'])
+        test_client.start()
+        test_client.response_thread.join()
+
+        self.assertEqual(test_client.ignored_notification_counts, {u'event': 2})
+        self.assertEqual(test_client.get_response(id=1), {u'id': 1, u'result': 1})
+        self.assertEqual(test_client.get_response(id=1), {u'method': u'other', u'params': 3})
+        with self.assertRaises(EOFError):
+            test_client.get_response(id=1)
+        test_client.shutdown()
+
+    def test_get_response_waits_for_response(self):
+        """
+            Verify get_response with a timeout wakes up when a response arrives.
+        """
+        read_fd, write_fd = os.pipe()
+        input_stream = io.BytesIO()
+        output_stream = io.open(read_fd, u'rb', buffering=0)
+
+        test_client = json_rpc_client.JsonRpcClient(
+            input_stream, output_stream)
+        test_client.start()
+
+        # Nothing was written yet, so the wait times out.
+        self.assertIsNone(test_client.get_response(id=1, timeout=.1))
+
+        writer = threading.Timer(.2, os.write, [write_fd, b'Content-Length: 22\r\n\r\n{"id": 1, "result": 1}'])
+        writer.start()
+        start_time = time.time()
+        response = test_client.get_response(id=1, timeout=10)
+        self.assertEqual(response, {u'id': 1, u'result': 1})
+        self.assertLess(time.time() - start_time, 5)
+
+        # Closing the pipe wakes the waiter with the end of stream exception.
+        os.close(write_fd)
+        with self.assertRaises(EOFError):
+            test_client.get_response(id=1, timeout=10)
+
+        writer.join()
+        test_client.shutdown()
+        output_stream.close()
+
     def shutdown_background_threads(self, test_client):
         """
             Stops background leaves streams open for testing
@@ -8,17 +8,29 @@ import io
 import logging
 import os
 import platform
-import subprocess
 import sys
 import tempfile
-import time
 
 
 import mssqlscripter.scripterlogging as scripterlogging
 import mssqlscripter.argparser as parser
+import mssqlscripter.scripterbulk as scripterbulk
+import mssqlscripter.scriptercache as scriptercache
 import mssqlscripter.scriptercallbacks as scriptercallbacks
+import mssqlscripter.scriptercheckpoint as scriptercheckpoint
+import mssqlscripter.scriptercompression as scriptercompression
+import mssqlscripter.scripterinserts as scripterinserts
+import mssqlscripter.scripterndjson as scripterndjson
+import mssqlscripter.scripterincremental as scripterincremental
+import mssqlscripter.scripterindex as scripterindex
+import mssqlscripter.scripterinventory as scripterinventory
+import mssqlscripter.scripteroutput as scripteroutput
+import mssqlscripter.scripterpipeline as scripterpipeline
+import mssqlscripter.scripterdaemon as scripterdaemon
+import mssqlscripter.scripterretry as scripterretry
+import mssqlscripter.scriptersharding as scriptersharding
+import mssqlscripter.scriptervariants as scriptervariants
 import mssqlscripter.sqltoolsclient as sqltoolsclient
-import mssqlscripter.mssqltoolsservice as mssqltoolsservice
 
 logger = logging.getLogger(u'mssqlscripter.main')
 
@@ -43,6 +55,61 @@ def main(args):
 
     logger.info(scrubbed_parameters)
 
+    if parameters.ListObjects:
+        list_objects(parameters)
+        return
+
+    script_compressor = None
+    if parameters.Compress:
+        # The tools service writes to a spool file or staging directory that is compressed as it grows.
+        script_compressor = scriptercompression.ScriptCompressor(parameters, concurrent_writers=parameters.Shards)
+
+    script_rotator = None
+    if parameters.MaxFileSize:
+        # The tools service writes to a spool file that is split into chunks as it grows.
+        script_rotator = scripteroutput.ScriptRotator(parameters)
+
+    incremental_writer = None
+    if parameters.Incremental:
+        # The tools service writes to a staging directory that is applied to the target directory.
+        incremental_writer = scripterincremental.IncrementalWriter(parameters)
+
+    ndjson_scripter = None
+    if parameters.Ndjson:
+        # The tools service writes to a spool file whose objects are written as JSON lines.
+        ndjson_scripter = scripterndjson.NdjsonScripter(parameters)
+
+    script_pipeline = None
+    insert_stage = None
+    row_limit_stage = None
+    if parameters.PipelineStages or parameters.MergeInsertRows or (
+            parameters.MaxRowsPerTable is not None and not parameters.BulkExport):
+        # The tools service writes to a spool file that is run through the stages as it grows.
+        stages = [scripterpipeline.load_stage(stage_name) for stage_name in parameters.PipelineStages]
+        if parameters.MaxRowsPerTable is not None:
+            # Rows are dropped before stages see them, the server has no row limit.
+            row_limit_stage = scripterinserts.limit_rows(parameters.MaxRowsPerTable)
+            stages.insert(0, row_limit_stage)
+        if parameters.MergeInsertRows:
+            insert_stage = scripterinserts.merge_inserts(parameters.MergeInsertRows, parameters.MergeInsertMaxSize)
+            stages.append(insert_stage)
+        script_pipeline = scripterpipeline.ScriptPipeline(parameters, stages)
+
+    bulk_exporter = None
+    if parameters.BulkExport:
+        # The tools service writes to a spool file whose rows are exported to a file per table.
+        bulk_exporter = scripterbulk.BulkExporter(parameters)
+
+    script_indexer = None
+    if parameters.Index:
+        # The file is indexed while the tools service writes it.
+        script_indexer = scripterindex.ScriptIndexer(parameters)
+
+    def handle_response(response):
+        scriptercallbacks.handle_response(response, parameters.DisplayProgress)
+        if ndjson_scripter:
+            ndjson_scripter.handle_response(response)
+
     temp_file_path = None
 
     if not parameters.FilePath and parameters.ScriptDestination == 'ToSingleFile':
@@ -51,79 +118,149 @@ def main(args):
             prefix=u'mssqlscripter_', delete=False).name
         parameters.FilePath = temp_file_path
 
-    sqltoolsservice_args = [mssqltoolsservice.get_executable_path()]
+    script_follower = None
+    complete_event = None
+    try:
+        if script_compressor:
+            script_compressor.start()
+        if script_rotator:
+            script_rotator.start()
+        if ndjson_scripter:
+            ndjson_scripter.start()
+        if script_indexer:
+            script_indexer.start()
+        if script_pipeline:
+            script_pipeline.start()
+        if bulk_exporter:
+            bulk_exporter.start()
+
+        if temp_file_path:
+            # Only write to stdout if user did not provide a file path, streaming the script as it is written.
+            logger.info('stdout current encoding: {}'.format(sys.stdout.encoding))
+            script_follower = scripteroutput.ScriptFileFollower(temp_file_path, scripteroutput.get_binary_stdout())
+            script_follower.start()
+
+        if parameters.Shards > 1:
+            sharded_scripter = scriptersharding.ShardedScripter(
+                vars(parameters), parameters.Shards, parameters.EnableLogging)
+            complete_event = sharded_scripter.run(
+                callback=handle_response)
+        elif parameters.Cache:
+            # Only objects modified since they were cached are scripted by the tools service.
+            cached_scripter = scriptercache.CachedScripter(vars(parameters), parameters.EnableLogging)
+            complete_event = cached_scripter.run(
+                callback=handle_response)
+        elif parameters.Checkpoint:
+            # Completed batches are journaled, so a interrupted run resumes where it stopped.
+            checkpointed_scripter = scriptercheckpoint.CheckpointedScripter(
+                vars(parameters), parameters.CheckpointBatchSize, parameters.Resume, parameters.EnableLogging)
+            complete_event = checkpointed_scripter.run(
+                callback=handle_response)
+        elif parameters.Variants:
+            # Every variant is scripted from one object inventory over one tools service.
+            variant_scripter = scriptervariants.VariantScripter(
+                vars(parameters), parameters.Variants, parameters.EnableLogging)
+            complete_event = variant_scripter.run(
+                callback=handle_response)
+        elif parameters.Daemon:
+            # Forward the request to the warm tools service owned by the scripter daemon.
+            complete_event = scripterdaemon.submit(
+                parameters,
+                callback=handle_response)
+        else:
+            complete_event = run_scripting_request(parameters, handle_response)
+
+    finally:
+        try:
+            if script_follower:
+                script_follower.finish()
+            if script_compressor:
+                script_compressor.finish()
+            if script_rotator:
+                script_rotator.finish()
+            if ndjson_scripter:
+                ndjson_scripter.finish()
+            if script_indexer:
+                script_indexer.finish()
+            if script_pipeline:
+                script_pipeline.finish()
+            if bulk_exporter:
+                bulk_exporter.finish(report=sys.stderr)
+            if row_limit_stage:
+                sys.stderr.write(row_limit_stage.limiter.format_report())
+            if insert_stage:
+                logger.info(u'Merged {} rows into {} INSERT statements'.format(
+                    insert_stage.merger.rows_merged, insert_stage.merger.statements_written))
+            if incremental_writer:
+                incremental_writer.finish(complete_event)
+        finally:
+            try:
+                # Remove the temp file if we generated one.
+                if temp_file_path:
+                    os.remove(temp_file_path)
+            except Exception:
+                # Suppress exceptions.
+                pass
+
+
+def list_objects(parameters):
+    """
+        Write the objects of the plan instead of scripting them.
+    """
+    scripting_objects = scripterinventory.list_objects(
+        vars(parameters), parameters.InventoryTtl, parameters.EnableLogging)
+    if scripting_objects is None:
+        sys.stdout.write(u'Unable to collect the object inventory\n')
+        return
+
+    if parameters.FilePath:
+        with io.open(parameters.FilePath, u'w', encoding=u'utf-8') as inventory_file:
+            scripterinventory.write_inventory(scripting_objects, parameters.ListObjects, inventory_file)
+    else:
+        scripterinventory.write_inventory(scripting_objects, parameters.ListObjects, sys.stdout)
 
-    if parameters.EnableLogging:
-        sqltoolsservice_args.append('--enable-logging')
-        sqltoolsservice_args.append('--log-dir')
-        sqltoolsservice_args.append(scripterlogging.get_config_log_dir())
 
-    logger.debug('Loading mssqltoolsservice with arguments {}'.format(sqltoolsservice_args))
+def run_scripting_request(parameters, callback):
+    """
+        Script with a tools service process started for this invocation and return the ScriptCompleteEvent.
+        Plan and progress events are passed to callback.
+    """
+    sql_tools_client = None
     try:
-        # Start mssqltoolsservice program.
-        tools_service_process = subprocess.Popen(
-            sqltoolsservice_args,
-            bufsize=0,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE)
-
-        # Python 2.7 uses the built-in File type when referencing the subprocess.PIPE.
-        # This built-in type for that version blocks on readinto() because it attempts to fill buffer.
-        # Wrap a FileIO around it to use a different implementation that does not attempt to fill the buffer
-        # on readinto().
-        std_out_wrapped = io.open(
-            tools_service_process.stdout.fileno(),
-            u'rb',
-            buffering=0,
-            closefd=False)
-
-        sql_tools_client = sqltoolsclient.SqlToolsClient(
-            tools_service_process.stdin,
-            std_out_wrapped)
+        sql_tools_client = sqltoolsclient.start_tools_service(parameters.EnableLogging)
 
         scripting_request = sql_tools_client.create_request(
             u'scripting_request', vars(parameters))
+        if not parameters.DisplayProgress and not parameters.ContinueScriptingOnError and not parameters.Ndjson:
+            # Progress is only displayed, skip decoding it.
+            scripting_request.ignore_progress_notifications()
         scripting_request.execute()
 
-        while not scripting_request.completed():
-            response = scripting_request.get_response()
-            if response:
-                scriptercallbacks.handle_response(response, parameters.DisplayProgress)
-            else:
-                # The sleep prevents burning up the CPU and lets other threads get scheduled.
-                time.sleep(0.1)
+        if not parameters.ContinueScriptingOnError:
+            # Wakes up as soon as a response for the request arrives.
+            return scripting_request.result(callback=callback)
 
-        # Only write to stdout if user did not provide a file path.
-        logger.info('stdout current encoding: {}'.format(sys.stdout.encoding))
-        if temp_file_path:
-            with io.open(parameters.FilePath, encoding=u'utf-8') as script_file:
-                for line in script_file.readlines():
-                    sys.stdout.write(line)
+        # Objects failing with --continue-on-error are reported in progress notifications.
+        collector = scripterretry.FailedObjectCollector(callback)
+        complete_event = scripting_request.result(callback=collector)
+
+        failed_objects = []
+        if collector.failed_objects:
+            failed_objects = scripterretry.retry_failed_objects(
+                sql_tools_client,
+                vars(parameters),
+                collector.failed_objects,
+                parameters.RetryCount,
+                callback=callback)
+        if failed_objects or parameters.FailureReport:
+            scripterretry.report_failed_objects(failed_objects, parameters.FailureReport)
+
+        return complete_event
 
     finally:
         if sql_tools_client:
             sql_tools_client.shutdown()
 
-        if tools_service_process:
-            tools_service_process.kill()
-            # 1 second time out, allow tools service process to be killed.
-            time.sleep(.1)
-            # Close the stdout file handle or else we would get a resource warning (found via pytest).
-            # This must be closed after the process is killed, otherwise we would block because the process is using
-            # it's stdout.
-            tools_service_process.stdout.close()
-            # None value indicates process has not terminated.
-            if not tools_service_process.poll():
-                sys.stderr.write(
-                    u'Sql Tools Service process was not shut down properly.')
-        try:
-            # Remove the temp file if we generated one.
-            if temp_file_path:
-                os.remove(temp_file_path)
-        except Exception:
-            # Suppress exceptions.
-            pass
-
 
 if __name__ == u'__main__':
     main(sys.argv[1:])
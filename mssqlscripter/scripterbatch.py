@@ -0,0 +1,365 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from queue import Queue
+
+import mssqlscripter
+import mssqlscripter.argparser as parser
+import mssqlscripter.jsonrpc.contracts.scriptingservice as scripting
+import mssqlscripter.scripterlogging as scripterlogging
+import mssqlscripter.sqltoolsclient as sqltoolsclient
+
+logger = logging.getLogger(u'mssqlscripter.scripterbatch')
+
+# Manifest options taking a space separated list of values in CSV manifests.
+LIST_OPTIONS = [
+    u'include-objects', u'exclude-objects', u'include-schemas', u'exclude-schemas',
+    u'include-types', u'exclude-types']
+
+
+def load_manifest(manifest_path):
+    """
+        Load the targets of a JSON, YAML or CSV manifest. JSON and YAML manifests are either a list of targets
+        or a dictionary with a list of targets and defaults applied to every target.
+    Exceptions raised:
+        ValueError
+            The manifest format is not supported or the manifest is malformed.
+        ImportError
+            A YAML manifest was given and PyYAML is not installed.
+    """
+    extension = os.path.splitext(manifest_path)[1].lower()
+    with io.open(manifest_path, encoding=u'utf-8') as manifest_file:
+        if extension == u'.csv':
+            return [read_csv_target(row) for row in csv.DictReader(manifest_file)]
+
+        if extension in (u'.yaml', u'.yml'):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError(u'Reading YAML manifests requires PyYAML, install it with: pip install pyyaml')
+            manifest = yaml.safe_load(manifest_file)
+        elif extension == u'.json':
+            manifest = json.load(manifest_file)
+        else:
+            raise ValueError(u'Unsupported manifest format: {}'.format(extension))
+
+    if isinstance(manifest, list):
+        manifest = {u'targets': manifest}
+    if not isinstance(manifest, dict) or not isinstance(manifest.get(u'targets'), list):
+        raise ValueError(u'Manifest must contain a list of targets')
+
+    defaults = manifest.get(u'defaults') or {}
+    targets = []
+    for target in manifest[u'targets']:
+        merged_target = dict(defaults)
+        merged_target.update(target)
+        targets.append(merged_target)
+    return targets
+
+
+def read_csv_target(row):
+    """
+        Convert a CSV row to a target. Empty cells are omitted and true or false toggle flags.
+    """
+    target = {}
+    for option, value in row.items():
+        value = (value or u'').strip()
+        if not option or not value:
+            continue
+        if value.lower() in (u'true', u'false'):
+            target[option] = value.lower() == u'true'
+        elif option in LIST_OPTIONS:
+            target[option] = value.split()
+        else:
+            target[option] = value
+    return target
+
+
+def get_target_arguments(target):
+    """
+        Convert a target to mssql-scripter command line arguments. Options are long option names, or short
+        option names of one letter.
+    """
+    arguments = []
+    for option in sorted(target):
+        if option == u'name':
+            continue
+        value = target[option]
+        if option.startswith(u'-'):
+            flag = option
+        else:
+            flag = (u'-' if len(option) == 1 else u'--') + option
+        if value is True:
+            arguments.append(flag)
+        elif value is False or value is None:
+            continue
+        elif isinstance(value, list):
+            arguments.append(flag)
+            arguments.extend(u'{}'.format(item) for item in value)
+        else:
+            arguments.extend([flag, u'{}'.format(value)])
+    return arguments
+
+
+def get_unsupported_options(parameters):
+    """
+        Return the options of the parsed target that only mssql-scripter implements. A target is scripted by a
+        single request on the worker's tools service, without the output processing or execution modes of
+        mssql-scripter.
+    """
+    options = [
+        (u'--list-objects', parameters.ListObjects),
+        (u'--daemon', parameters.Daemon),
+        (u'--shards', parameters.Shards > 1),
+        (u'--cache', parameters.Cache),
+        (u'--checkpoint', parameters.Checkpoint),
+        (u'--variant', parameters.Variants),
+        (u'--incremental', parameters.Incremental),
+        (u'--compress', parameters.Compress),
+        (u'--max-file-size', parameters.MaxFileSize),
+        (u'--ndjson', parameters.Ndjson),
+        (u'--index', parameters.Index),
+        (u'--pipeline-stage', parameters.PipelineStages),
+        (u'--merge-inserts', parameters.MergeInsertRows),
+        (u'--max-rows-per-table', parameters.MaxRowsPerTable is not None),
+        (u'--bulk-export', parameters.BulkExport),
+        (u'--failure-report', parameters.FailureReport)]
+    return [option for option, given in options if given]
+
+
+def get_target_name(target, index):
+    """
+        Name a target by it's name, or server and database. Only characters safe in file names are kept.
+    """
+    name = target.get(u'name') or u'_'.join(
+        u'{}'.format(target[option]) for option in (u'server', u'database') if target.get(option)) \
+        or u'target{}'.format(index)
+    return re.sub(r'[^\w.-]+', u'_', name)
+
+
+class BatchTarget(object):
+    """
+        A scripting target of the manifest and it's outcome.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.parameters = None
+        self.duration = None
+        self.object_count = None
+        self.success = False
+        self.error = None
+
+    def format(self):
+        """
+            Format the outcome into a dictionary.
+        """
+        return {
+            u'name': self.name,
+            u'file_path': self.parameters.FilePath if self.parameters else None,
+            u'duration': self.duration,
+            u'object_count': self.object_count,
+            u'success': self.success,
+            u'error': self.error}
+
+
+def parse_targets(targets, output_dir):
+    """
+        Parse the targets with the mssql-scripter argument parser. Targets without a file path are scripted to
+        the output directory. Runs before the workers start, so password prompts happen one at a time.
+    """
+    batch_targets = []
+    for index, target in enumerate(targets):
+        batch_target = BatchTarget(get_target_name(target, index))
+        batch_targets.append(batch_target)
+
+        arguments = get_target_arguments(target)
+        if not any(option in target for option in (u'file-path', u'f', u'-f')):
+            file_name = batch_target.name if target.get(u'file-per-object') else batch_target.name + u'.sql'
+            arguments.extend([u'--file-path', os.path.join(output_dir, file_name)])
+
+        try:
+            parameters = parser.parse_arguments(arguments)
+        except SystemExit:
+            # The parser exits on invalid arguments and missing connection information.
+            batch_target.error = u'Invalid target arguments'
+            continue
+        except Exception as error:
+            batch_target.error = u'Invalid target arguments: {}'.format(error)
+            continue
+
+        unsupported_options = get_unsupported_options(parameters)
+        if unsupported_options:
+            batch_target.error = u'Invalid target arguments: {} can not be used with mssql-scripter-batch'.format(
+                u', '.join(unsupported_options))
+        else:
+            batch_target.parameters = parameters
+
+    return batch_targets
+
+
+class BatchScripter(object):
+    """
+        Script many targets with a bounded pool of workers, each reusing one tools service process.
+    """
+
+    def __init__(self, batch_targets, worker_count=4, enable_logging=False):
+        self.batch_targets = batch_targets
+        self.worker_count = worker_count
+        self.enable_logging = enable_logging
+        self.output_lock = threading.Lock()
+
+    def run(self):
+        """
+            Script every valid target and return the targets with their outcome.
+        """
+        target_queue = Queue()
+        for batch_target in self.batch_targets:
+            if batch_target.parameters:
+                target_queue.put(batch_target)
+
+        workers = []
+        for _ in range(min(self.worker_count, target_queue.qsize())):
+            target_queue.put(None)
+            worker = threading.Thread(target=self._work, args=(target_queue,))
+            worker.start()
+            workers.append(worker)
+
+        for worker in workers:
+            worker.join()
+
+        return self.batch_targets
+
+    def _work(self, target_queue):
+        sql_tools_client = None
+        try:
+            while True:
+                batch_target = target_queue.get()
+                if batch_target is None:
+                    break
+
+                if sql_tools_client and not sql_tools_client.is_healthy():
+                    sql_tools_client.shutdown()
+                    sql_tools_client = None
+
+                start_time = time.time()
+                try:
+                    if not sql_tools_client:
+                        sql_tools_client = sqltoolsclient.start_tools_service(self.enable_logging)
+                    self.script_target(sql_tools_client, batch_target)
+                except Exception as error:
+                    batch_target.error = u'{}'.format(error)
+                batch_target.duration = time.time() - start_time
+
+                with self.output_lock:
+                    sys.stderr.write(u'{}: {} in {:.1f} seconds\n'.format(
+                        batch_target.name, u'completed' if batch_target.success else u'failed', batch_target.duration))
+        finally:
+            if sql_tools_client:
+                sql_tools_client.shutdown()
+
+    def script_target(self, sql_tools_client, batch_target):
+        """
+            Script a target on the worker's tools service and record it's outcome.
+        """
+        scripting_request = sql_tools_client.create_request(u'scripting_request', vars(batch_target.parameters))
+        # The plan notification carries the object count, progress is not reported per target.
+        scripting_request.ignore_progress_notifications(keep_plan=True)
+        scripting_request.execute()
+
+        def handle_response(response):
+            if isinstance(response, scripting.ScriptPlanNotificationEvent):
+                batch_target.object_count = response.count
+
+        complete_event = scripting_request.result(callback=handle_response)
+        batch_target.success = complete_event.success and not complete_event.has_error
+        if complete_event.has_error:
+            batch_target.error = u'{} {}'.format(complete_event.error_message, complete_event.error_details or u'')
+
+
+def write_summary(batch_targets, summary_path=None, output=sys.stdout):
+    """
+        Write a line per target to output, and the summary as JSON to summary_path.
+    """
+    for batch_target in batch_targets:
+        output.write(u'{}\t{}\t{}\t{}\t{}\n'.format(
+            batch_target.name,
+            u'succeeded' if batch_target.success else u'failed',
+            u'{:.1f}s'.format(batch_target.duration) if batch_target.duration is not None else u'-',
+            batch_target.object_count if batch_target.object_count is not None else u'-',
+            batch_target.error or u''))
+
+    if summary_path:
+        summary = {
+            u'succeeded': sum(1 for batch_target in batch_targets if batch_target.success),
+            u'failed': sum(1 for batch_target in batch_targets if not batch_target.success),
+            u'targets': [batch_target.format() for batch_target in batch_targets]}
+        with io.open(summary_path, u'w', encoding=u'utf-8') as summary_file:
+            summary_file.write(json.dumps(summary, indent=2, ensure_ascii=False))
+
+
+def main(args):
+    """
+        Entry point of mssql-scripter-batch.
+    """
+    batch_parser = argparse.ArgumentParser(
+        prog=u'mssql-scripter-batch',
+        description=u'Script many databases listed in a JSON, YAML or CSV manifest. Version {}'.format(
+            mssqlscripter.__version__))
+    batch_parser.add_argument(
+        u'manifest',
+        help=u'Manifest of targets. Each target maps mssql-scripter option names to their values.')
+    batch_parser.add_argument(
+        u'-o', u'--output-dir',
+        dest=u'OutputDir',
+        metavar=u'',
+        default=os.getcwd(),
+        help=u'Directory of targets without a file-path. Default is the current directory.')
+    batch_parser.add_argument(
+        u'-w', u'--workers',
+        dest=u'Workers',
+        metavar=u'',
+        type=int,
+        default=4,
+        help=u'Number of targets scripted in parallel, each worker runs one tools service. Default is 4.')
+    batch_parser.add_argument(
+        u'--summary',
+        dest=u'Summary',
+        metavar=u'',
+        help=u'Write the per target summary as JSON to this file.')
+    batch_parser.add_argument(
+        u'--enable-toolsservice-logging',
+        dest=u'EnableLogging',
+        action=u'store_true',
+        default=False,
+        help=u'Enable verbose logging.')
+    parameters = batch_parser.parse_args(args)
+
+    scripterlogging.initialize_logger()
+    # The tools service resolves relative paths against it's own working directory.
+    output_dir = os.path.abspath(parameters.OutputDir)
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    batch_targets = parse_targets(load_manifest(parameters.manifest), output_dir)
+    logger.info(u'Scripting {} targets with {} workers'.format(len(batch_targets), parameters.Workers))
+    BatchScripter(batch_targets, parameters.Workers, parameters.EnableLogging).run()
+    write_summary(batch_targets, parameters.Summary)
+
+    return 0 if all(batch_target.success for batch_target in batch_targets) else 1
+
+
+if __name__ == u'__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,381 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+from collections import deque
+
+import io
+import json
+import logging
+import multiprocessing
+import os
+import re
+import tempfile
+
+import mssqlscripter.scripterinserts as scripterinserts
+import mssqlscripter.scripteroutput as scripteroutput
+
+logger = logging.getLogger(u'mssqlscripter.scripterbulk')
+
+BULK_FORMATS = [u'csv', u'bcp']
+# Complete statements converted per task.
+CHUNK_SIZE = 1024 * 1024
+# Character format terminators, control characters do not occur in text data.
+BCP_FIELD_TERMINATOR = u'\x1f'
+BCP_ROW_TERMINATOR = u'\x1e\n'
+# bcp character format marks a empty string with a NUL character, a empty field is NULL.
+BCP_EMPTY_STRING = u'\x00'
+FILE_EXTENSIONS = {u'csv': u'.csv', u'bcp': u'.dat'}
+
+INSERT_TARGET_PATTERN = re.compile(
+    br'^INSERT\s+(?:INTO\s+)?(' + scripterinserts.NAME + br')\s*(?:\(((?:\[(?:[^\]]|\]\])*\]|[^)\[])*)\))?',
+    re.IGNORECASE)
+IDENTIFIER_PATTERN = re.compile(r'\[((?:[^\]]|\]\])*)\]|([^.,\s\[\]]+)')
+CAST_START_PATTERN = re.compile(r'\s*CAST\(\s*', re.IGNORECASE)
+CAST_END_PATTERN = re.compile(r'\s+AS\s+(\w+(?:\s*\([^)]*\))?)\s*\)', re.IGNORECASE)
+LITERAL_PATTERN = re.compile(
+    r"\s*(?:(NULL)|(N)?'((?:[^']|'')*)'|0x([0-9A-Fa-f]*)|([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?))",
+    re.IGNORECASE)
+SEPARATOR_PATTERN = re.compile(r'\s*([,)])')
+
+
+def split_identifiers(text):
+    return [bracketed.replace(u']]', u']') if bracketed else plain
+            for bracketed, plain in IDENTIFIER_PATTERN.findall(text)]
+
+
+def parse_values(text):
+    """
+        Parse the row of a INSERT statement, e.g. (1, N'Contoso', CAST(N'2017-01-01' AS Date), NULL), into
+        a list of (value, type). Strings are unescaped, binary values are hexadecimal and NULL is None.
+    Exceptions raised:
+        ValueError
+            The row contains a expression other than a literal or a CAST of a literal.
+    """
+    row = []
+    position = 1
+    while True:
+        cast_match = CAST_START_PATTERN.match(text, position)
+        if cast_match:
+            position = cast_match.end()
+
+        match = LITERAL_PATTERN.match(text, position)
+        if not match:
+            raise ValueError(u'Unsupported value in {}'.format(text[position:position + 100]))
+        position = match.end()
+        null, unicode_prefix, string, binary, number = match.groups()
+        if null:
+            value, value_type = None, None
+        elif string is not None:
+            value, value_type = string.replace(u"''", u"'"), u'nvarchar' if unicode_prefix else u'varchar'
+        elif binary is not None:
+            value, value_type = binary.upper(), u'varbinary'
+        else:
+            value, value_type = number, u'int' if number.lstrip(u'+-').isdigit() else u'decimal'
+
+        if cast_match:
+            cast_end_match = CAST_END_PATTERN.match(text, position)
+            if not cast_end_match:
+                raise ValueError(u'Unsupported value in {}'.format(text[position:position + 100]))
+            position = cast_end_match.end()
+            value_type = cast_end_match.group(1)
+
+        separator_match = SEPARATOR_PATTERN.match(text, position)
+        if not separator_match:
+            raise ValueError(u'Unsupported value in {}'.format(text[position:position + 100]))
+        position = separator_match.end()
+        row.append((value, value_type))
+        if separator_match.group(1) == u')':
+            return row
+
+
+def format_csv_row(values):
+    """
+        Format a row as RFC 4180 comma separated values. NULL is a empty field, a empty string is quoted.
+    """
+    fields = []
+    for value in values:
+        if value is None:
+            fields.append(u'')
+        elif value == u'' or any(character in value for character in u',"\r\n'):
+            fields.append(u'"{}"'.format(value.replace(u'"', u'""')))
+        else:
+            fields.append(value)
+    return u','.join(fields) + u'\r\n'
+
+
+def format_bcp_row(values):
+    """
+        Format a row for bcp character format with the BCP terminators.
+    Exceptions raised:
+        ValueError
+            A value contains a terminator.
+    """
+    fields = []
+    for value in values:
+        if value is None:
+            fields.append(u'')
+        elif BCP_FIELD_TERMINATOR in value or BCP_ROW_TERMINATOR in value:
+            raise ValueError(u'Value contains a bcp terminator: {}'.format(value[:100]))
+        else:
+            fields.append(value or BCP_EMPTY_STRING)
+    return BCP_FIELD_TERMINATOR.join(fields) + BCP_ROW_TERMINATOR
+
+
+class TableRows(object):
+    """
+        Rows of a table converted from consecutive INSERT statements.
+    """
+
+    def __init__(self, table, columns):
+        self.table = table
+        self.columns = columns
+        self.types = [None] * len(columns) if columns else []
+        self.data = []
+        # End offset of every row in data.
+        self.row_ends = []
+        self.row_count = 0
+        # The first row that could not be converted, the rows after it are skipped.
+        self.error = None
+
+
+def convert_statements(data, output_format):
+    """
+        Convert the INSERT statements of a piece of script made of complete statements into a list of
+        TableRows. Every other statement is skipped. A row that can not be converted sets the error of it's
+        TableRows instead of raising, so the other tables are still exported.
+    """
+    format_row = format_csv_row if output_format == u'csv' else format_bcp_row
+    converted = []
+    current = None
+    for line, _ in scripterinserts.split_lines(data):
+        insert_match = scripterinserts.INSERT_VALUES_PATTERN.match(line)
+        if not insert_match:
+            continue
+
+        target_match = INSERT_TARGET_PATTERN.match(insert_match.group(1))
+        if not target_match:
+            logger.warning(u'Skipping INSERT statement into {}'.format(insert_match.group(1)[:100]))
+            continue
+        table = tuple(split_identifiers(target_match.group(1).decode(u'utf-8')))
+        columns = split_identifiers(target_match.group(2).decode(u'utf-8')) if target_match.group(2) else None
+        if not current or current.table != table or current.columns != columns:
+            current = TableRows(table, columns)
+            converted.append(current)
+
+        if current.error:
+            continue
+        try:
+            row = parse_values(insert_match.group(2).decode(u'utf-8'))
+            formatted_row = format_row([value for value, _ in row])
+        except ValueError as error:
+            current.error = u'{}'.format(error)
+            continue
+
+        if not current.types:
+            current.types = [None] * len(row)
+        for index, (_, value_type) in enumerate(row):
+            if value_type and index < len(current.types) and not current.types[index]:
+                current.types[index] = value_type
+        current.data.append(formatted_row)
+        current.row_count += 1
+
+    for table_rows in converted:
+        rows = [row.encode(u'utf-8') for row in table_rows.data]
+        row_end = 0
+        for row in rows:
+            row_end += len(row)
+            table_rows.row_ends.append(row_end)
+        table_rows.data = b''.join(rows)
+    return converted
+
+
+class BulkTableWriter(object):
+    """
+        Write converted rows to a data file per table in a directory, with a JSON sidecar describing the
+        columns and format of each file. bcp files also get a bcp format file. With max_rows, only the first
+        max_rows rows of every table are written. A table with a row that could not be converted is failed,
+        it's data file is removed and it gets no sidecar.
+    """
+
+    def __init__(self, directory, output_format, max_rows=None):
+        self.directory = directory
+        self.output_format = output_format
+        self.max_rows = max_rows
+        self.tables = {}
+        self.current_table = None
+        self.current_file = None
+
+    def write(self, table_rows):
+        table = self.tables.get(table_rows.table)
+        if table is None:
+            table = {u'columns': table_rows.columns, u'types': list(table_rows.types), u'rows': 0,
+                     u'scripted_rows': 0, u'error': None,
+                     u'path': os.path.join(self.directory, self.get_file_name(table_rows.table))}
+            self.tables[table_rows.table] = table
+        elif not all(table[u'types']):
+            table[u'types'] = [known or found for known, found in zip(table[u'types'], table_rows.types)]
+
+        if table[u'error']:
+            return
+        if table_rows.error:
+            logger.warning(u'Unable to export {}: {}'.format(u'.'.join(table_rows.table), table_rows.error))
+            table[u'error'] = table_rows.error
+            if self.current_table == table_rows.table:
+                self._close_current()
+            return
+
+        if self.current_table != table_rows.table:
+            self._close_current()
+            # Tables are scripted one after the other, a table seen before is appended to.
+            self.current_file = io.open(table[u'path'], u'ab' if table[u'rows'] else u'wb')
+            self.current_table = table_rows.table
+        table[u'scripted_rows'] += table_rows.row_count
+        row_count = table_rows.row_count
+        if self.max_rows is not None and table[u'rows'] + row_count > self.max_rows:
+            row_count = max(self.max_rows - table[u'rows'], 0)
+        if row_count:
+            self.current_file.write(table_rows.data[:table_rows.row_ends[row_count - 1]])
+        table[u'rows'] += row_count
+
+    def close(self):
+        self._close_current()
+        for table_name, table in self.tables.items():
+            if not table[u'error']:
+                self._write_sidecar(table_name, table)
+            elif os.path.exists(table[u'path']):
+                os.remove(table[u'path'])
+
+    def get_file_name(self, table_name):
+        return u'.'.join(table_name) + FILE_EXTENSIONS[self.output_format]
+
+    def _close_current(self):
+        if self.current_file:
+            self.current_file.close()
+        self.current_file = None
+        self.current_table = None
+
+    def _write_sidecar(self, table_name, table):
+        column_count = len(table[u'types'])
+        columns = table[u'columns'] or [u'Column{}'.format(index + 1) for index in range(column_count)]
+        sidecar = {
+            u'table': table_name[-1],
+            u'schema': table_name[-2] if len(table_name) > 1 else None,
+            u'file': os.path.basename(table[u'path']),
+            u'format': self.output_format,
+            u'encoding': u'utf-8',
+            u'rows': table[u'rows'],
+            u'truncated': table[u'scripted_rows'] > table[u'rows'],
+            u'columns': [{u'name': name, u'type': column_type} for name, column_type in zip(columns, table[u'types'])]}
+        if self.output_format == u'csv':
+            sidecar.update({u'delimiter': u',', u'quote': u'"', u'row_terminator': u'\r\n', u'null': u'',
+                            u'header': False})
+        else:
+            sidecar.update({u'field_terminator': BCP_FIELD_TERMINATOR, u'row_terminator': BCP_ROW_TERMINATOR,
+                            u'null': u'', u'empty_string': BCP_EMPTY_STRING,
+                            u'format_file': os.path.basename(table[u'path'])[:-4] + u'.fmt'})
+            self._write_format_file(table[u'path'][:-4] + u'.fmt', columns)
+
+        with io.open(table[u'path'][:-4] + u'.json', u'w', encoding=u'utf-8') as sidecar_file:
+            sidecar_file.write(json.dumps(sidecar, indent=2, ensure_ascii=False))
+
+    def _write_format_file(self, format_path, columns):
+        """
+            Write a non-XML bcp format file mapping every field to it's column in order.
+        """
+        lines = [u'14.0', u'{}'.format(len(columns))]
+        for index, column in enumerate(columns):
+            terminator = BCP_ROW_TERMINATOR if index == len(columns) - 1 else BCP_FIELD_TERMINATOR
+            lines.append(u'{0}\tSQLCHAR\t0\t0\t"{1}"\t{0}\t{2}\t""'.format(
+                index + 1, terminator.replace(u'\n', u'\\n'), column))
+        with io.open(format_path, u'w', encoding=u'utf-8', newline=u'\n') as format_file:
+            format_file.write(u'\n'.join(lines) + u'\n')
+
+
+class BulkExporter(object):
+    """
+        Follow the data script the tools service writes to a spool file and export every table to a data file
+        in the directory given as file path. Pieces of complete statements are converted on a pool of
+        processes, so tables are converted in parallel while each file is written in script order.
+
+        Usage:
+            bulk_exporter = BulkExporter(parameters)    # Redirects parameters.FilePath.
+            bulk_exporter.start()
+            ... script ...
+            bulk_exporter.finish()
+    """
+
+    def __init__(self, parameters, processes=None):
+        self.output_format = parameters.BulkExport
+        self.directory = parameters.FilePath
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        self.table_writer = BulkTableWriter(self.directory, self.output_format, parameters.MaxRowsPerTable)
+        self.processes = processes or multiprocessing.cpu_count()
+        self.pool = None
+        self.pending_results = deque()
+        self.buffer = bytearray()
+        self.spool_path = tempfile.NamedTemporaryFile(prefix=u'mssqlscripter_', delete=False).name
+        parameters.FilePath = self.spool_path
+        parameters.AppendToFile = False
+        self.follower = scripteroutput.ScriptFileFollower(self.spool_path, self, line_separator=None)
+
+    def start(self):
+        self.pool = multiprocessing.Pool(self.processes)
+        self.follower.start()
+
+    def write(self, data):
+        self.buffer.extend(data)
+        if len(self.buffer) >= CHUNK_SIZE:
+            # Only complete statements are converted, a string literal may span lines.
+            complete_end = 0
+            for line, complete in scripterinserts.split_lines(self.buffer):
+                if not complete:
+                    break
+                complete_end += len(line)
+            if complete_end:
+                self._submit(bytes(self.buffer[:complete_end]))
+                del self.buffer[:complete_end]
+
+    def flush(self):
+        pass
+
+    def finish(self, report=None):
+        """
+            Convert the rest of the script, write the sidecars and remove the spool file.
+        """
+        try:
+            self.follower.finish()
+            self._submit(bytes(self.buffer))
+            self.buffer = bytearray()
+            while self.pending_results:
+                self._write_result()
+            self.table_writer.close()
+            logger.info(u'Exported {} tables to {}'.format(len(self.table_writer.tables), self.directory))
+            if report:
+                for table_name, table in sorted(self.table_writer.tables.items()):
+                    if table[u'error']:
+                        report.write(u'Unable to export {}: {}\n'.format(u'.'.join(table_name), table[u'error']))
+                    elif table[u'scripted_rows'] > table[u'rows']:
+                        report.write(u'Exported the first {} of {} rows of {} to {}\n'.format(
+                            table[u'rows'], table[u'scripted_rows'], u'.'.join(table_name), table[u'path']))
+                    else:
+                        report.write(u'Exported {} rows of {} to {}\n'.format(
+                            table[u'rows'], u'.'.join(table_name), table[u'path']))
+        finally:
+            if self.pool:
+                self.pool.terminate()
+                self.pool.join()
+            os.remove(self.spool_path)
+
+    def _submit(self, data):
+        if not data:
+            return
+        self.pending_results.append(self.pool.apply_async(convert_statements, (data, self.output_format)))
+        if len(self.pending_results) >= self.processes * 2:
+            self._write_result()
+
+    def _write_result(self):
+        for table_rows in self.pending_results.popleft().get():
+            self.table_writer.write(table_rows)
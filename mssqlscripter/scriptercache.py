@@ -0,0 +1,311 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+
+import mssqlscripter.jsonrpc.contracts.scriptingservice as scripting
+import mssqlscripter.scripterlogging as scripterlogging
+import mssqlscripter.scriptersharding as scriptersharding
+import mssqlscripter.scriptersplitter as scriptersplitter
+import mssqlscripter.sqltoolsclient as sqltoolsclient
+
+logger = logging.getLogger(u'mssqlscripter.scriptercache')
+
+CACHE_FILE_NAME = u'scripting-cache.sqlite'
+# Cache key of the script preceding the first object, e.g. USE [database].
+PREAMBLE_KEY = u''
+PREAMBLE_MARKER = u''
+
+ODBC_DRIVER_ENVIRONMENT = u'MSSQL_SCRIPTER_ODBC_DRIVER'
+DEFAULT_ODBC_DRIVER = u'ODBC Driver 17 for SQL Server'
+
+# Scripting object types of sys.objects type codes with a modification date.
+OBJECT_TYPES = {
+    u'U': u'Table',
+    u'V': u'View',
+    u'P': u'StoredProcedure',
+    u'PC': u'StoredProcedure',
+    u'FN': u'UserDefinedFunction',
+    u'IF': u'UserDefinedFunction',
+    u'TF': u'UserDefinedFunction',
+    u'FS': u'UserDefinedFunction',
+    u'FT': u'UserDefinedFunction',
+    u'SO': u'Sequence',
+    u'SN': u'Synonym',
+}
+# Indexes do not have a row in sys.objects but update the modification date of their table. Constraints and
+# triggers do, so the marker of a object is the latest modification date of it and it's child objects.
+MARKER_QUERY = u'''
+SELECT s.name, o.name, RTRIM(o.type),
+    CONVERT(varchar(30), MAX(CASE WHEN c.modify_date > o.modify_date THEN c.modify_date ELSE o.modify_date END), 126)
+FROM sys.objects o
+JOIN sys.schemas s ON s.schema_id = o.schema_id
+LEFT JOIN sys.objects c ON c.parent_object_id = o.object_id
+WHERE o.parent_object_id = 0 AND o.is_ms_shipped = 0
+GROUP BY s.name, o.name, o.type'''
+
+
+def parse_connection_string(connection_string):
+    """
+        Split a connection string into it's keywords, lower cased, and values.
+    """
+    keywords = {}
+    for part in connection_string.split(u';'):
+        keyword, separator, value = part.partition(u'=')
+        if separator:
+            keywords[keyword.strip().lower()] = value.strip()
+    return keywords
+
+
+def get_odbc_connection_string(connection_string):
+    """
+        Convert a connection string of the tools service to a ODBC connection string.
+    """
+    keywords = parse_connection_string(connection_string)
+    odbc_keywords = [(u'DRIVER', u'{{{}}}'.format(os.environ.get(ODBC_DRIVER_ENVIRONMENT, DEFAULT_ODBC_DRIVER)))]
+    for odbc_keyword, names in [
+            (u'SERVER', (u'server', u'data source', u'address', u'addr')),
+            (u'DATABASE', (u'database', u'initial catalog')),
+            (u'UID', (u'user id', u'uid', u'user')),
+            (u'PWD', (u'password', u'pwd'))]:
+        value = next((keywords[name] for name in names if name in keywords), None)
+        if value:
+            odbc_keywords.append((odbc_keyword, u'{{{}}}'.format(value.replace(u'}', u'}}'))))
+    if keywords.get(u'integrated security', u'').lower() in (u'true', u'sspi', u'yes'):
+        odbc_keywords.append((u'Trusted_Connection', u'yes'))
+    return u';'.join(u'{}={}'.format(keyword, value) for keyword, value in odbc_keywords)
+
+
+class OdbcMarkerSource(object):
+    """
+        Read the modification marker of every object from the catalog views with the optional pyodbc package.
+    """
+
+    def get_markers(self, connection_string):
+        """
+            Return the marker of every user object by it's object key.
+        Exceptions raised:
+            ImportError
+                pyodbc is not installed.
+        """
+        try:
+            import pyodbc
+        except ImportError:
+            raise ImportError(u'Caching object scripts requires pyodbc, install it with: pip install pyodbc')
+
+        connection = pyodbc.connect(get_odbc_connection_string(connection_string))
+        try:
+            markers = {}
+            for schema, name, type_code, modify_date in connection.cursor().execute(MARKER_QUERY):
+                if type_code in OBJECT_TYPES:
+                    markers[scriptersharding.get_object_key(
+                        {u'type': OBJECT_TYPES[type_code], u'schema': schema, u'name': name})] = modify_date
+            return markers
+        finally:
+            connection.close()
+
+
+def split_object_scripts(data, scripting_objects):
+    """
+        Split a script with descriptive headers into the script before the first object and the script of
+        every object by it's object key. Headers of objects that are not scripting objects, e.g. indexes,
+        stay with the object before them.
+    """
+    matcher = scriptersplitter.HeaderObjectMatcher(scripting_objects)
+    boundaries = []
+    for match in scriptersplitter.HEADER_PATTERN.finditer(data):
+        scripting_object = matcher.match(match)
+        if scripting_object:
+            boundaries.append((match.start(), scriptersharding.get_object_key(scripting_object)))
+
+    preamble = data[:boundaries[0][0]] if boundaries else data
+    object_scripts = {}
+    for index, (start, object_key) in enumerate(boundaries):
+        end = boundaries[index + 1][0] if index + 1 < len(boundaries) else len(data)
+        object_scripts[object_key] = object_scripts.get(object_key, b'') + data[start:end]
+    return preamble, object_scripts
+
+
+class ScriptCache(object):
+    """
+        Object scripts of earlier runs in a SQLite database, keyed by server, database and scripting options
+        and valid while the modification marker of the object is unchanged.
+    """
+
+    def __init__(self, parameters, cache_path=None):
+        self.cache_path = cache_path or os.path.join(scripterlogging.get_config_log_dir(), CACHE_FILE_NAME)
+        keywords = parse_connection_string(parameters[u'ConnectionString'])
+        options = dict(scripting.ScriptingOptions(parameters).get_options())
+        # Scripts are cached with headers and without dependencies, whatever the run asked for.
+        options.update(IncludeDescriptiveHeaders=True, GenerateScriptForDependentObjects=False)
+        del options[u'AppendToFile']
+        # Connection strings carry credentials, only the server and database are part of the key.
+        identity = u'{}|{}|{}'.format(
+            keywords.get(u'server', keywords.get(u'data source', u'')).lower(),
+            keywords.get(u'database', keywords.get(u'initial catalog', u'')).lower(),
+            json.dumps(options, sort_keys=True))
+        self.scope = hashlib.sha256(identity.encode(u'utf-8')).hexdigest()
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.cache_path, check_same_thread=False)
+        self.connection.execute(
+            u'CREATE TABLE IF NOT EXISTS object_scripts ('
+            u'scope TEXT NOT NULL, object_key TEXT NOT NULL, marker TEXT NOT NULL, script BLOB NOT NULL, '
+            u'PRIMARY KEY (scope, object_key))')
+
+    def get(self, object_key, marker):
+        """
+            Return the cached script of a object, or None if it is not cached for this marker.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                u'SELECT script FROM object_scripts WHERE scope = ? AND object_key = ? AND marker = ?',
+                (self.scope, object_key, marker)).fetchone()
+        return bytes(row[0]) if row else None
+
+    def put(self, object_key, marker, script):
+        with self.lock:
+            self.connection.execute(
+                u'INSERT OR REPLACE INTO object_scripts (scope, object_key, marker, script) VALUES (?, ?, ?, ?)',
+                (self.scope, object_key, marker, sqlite3.Binary(script)))
+
+    def remove_except(self, object_keys):
+        """
+            Remove the scripts of objects that no longer exist.
+        """
+        object_keys = set(object_keys)
+        with self.lock:
+            cached_keys = [row[0] for row in self.connection.execute(
+                u'SELECT object_key FROM object_scripts WHERE scope = ?', (self.scope,))]
+            self.connection.executemany(
+                u'DELETE FROM object_scripts WHERE scope = ? AND object_key = ?',
+                [(self.scope, object_key) for object_key in cached_keys if object_key not in object_keys])
+
+    def close(self):
+        with self.lock:
+            self.connection.commit()
+            self.connection.close()
+
+
+class CachedScripter(object):
+    """
+        Script a database to a single file, only asking the tools service to script objects whose
+        modification marker changed since they were cached. The rest of the script is assembled from the cache
+        in plan order.
+
+        Objects are split out of the script by their descriptive headers, so headers are always requested and
+        removed again if they were excluded. Objects without a marker, e.g. schemas and users, are scripted
+        every run.
+    """
+
+    def __init__(self, parameters, enable_logging=False, cache_path=None, marker_source=None):
+        self.parameters = parameters
+        self.enable_logging = enable_logging
+        self.cache_path = cache_path
+        self.marker_source = marker_source or OdbcMarkerSource()
+        self.hit_count = 0
+        self.miss_count = 0
+
+    def run(self, callback=None):
+        """
+            Script the database and return a ScriptCompleteEvent. Plan and progress events of the request
+            scripting changed objects are passed to callback.
+        """
+        sql_tools_client = None
+        script_cache = None
+        temp_dir = tempfile.mkdtemp(prefix=u'mssqlscripter_cache_')
+        try:
+            sql_tools_client = sqltoolsclient.start_tools_service(self.enable_logging)
+            script_cache = ScriptCache(self.parameters, self.cache_path)
+
+            scripting_objects = scriptersharding.collect_inventory(sql_tools_client, self.parameters, temp_dir)
+            if scripting_objects is None:
+                return scriptersharding.create_complete_event(
+                    callback, error_message=u'Unable to collect the object inventory')
+            markers = self.marker_source.get_markers(self.parameters[u'ConnectionString'])
+
+            object_scripts = {}
+            changed_objects = []
+            for scripting_object in scripting_objects:
+                object_key = scriptersharding.get_object_key(scripting_object)
+                marker = markers.get(object_key)
+                object_script = script_cache.get(object_key, marker) if marker else None
+                if object_script is None:
+                    changed_objects.append(scripting_object)
+                else:
+                    object_scripts[object_key] = object_script
+            self.hit_count = len(object_scripts)
+            self.miss_count = len(changed_objects)
+            logger.info(u'Scripting {} changed objects, {} objects are cached'.format(
+                self.miss_count, self.hit_count))
+
+            preamble = script_cache.get(PREAMBLE_KEY, PREAMBLE_MARKER)
+            if changed_objects:
+                file_path = os.path.join(temp_dir, u'changed.sql')
+                complete_event = self._script_objects(sql_tools_client, changed_objects, file_path, callback)
+                if not complete_event or complete_event.has_error or not complete_event.success:
+                    return scriptersharding.create_complete_event(
+                        callback,
+                        error_message=complete_event.error_message if complete_event else u'Scripting failed',
+                        error_details=complete_event.error_details if complete_event else None)
+
+                with io.open(file_path, u'rb') as script_file:
+                    preamble, changed_scripts = split_object_scripts(script_file.read(), changed_objects)
+                script_cache.put(PREAMBLE_KEY, PREAMBLE_MARKER, preamble)
+                for scripting_object in changed_objects:
+                    object_key = scriptersharding.get_object_key(scripting_object)
+                    object_scripts[object_key] = changed_scripts.get(object_key, b'')
+                    if markers.get(object_key):
+                        script_cache.put(object_key, markers[object_key], object_scripts[object_key])
+
+            script_cache.remove_except(list(object_scripts) + [PREAMBLE_KEY])
+            self._write(preamble or b'', scripting_objects, object_scripts)
+            return scriptersharding.create_complete_event(callback)
+
+        finally:
+            if script_cache:
+                script_cache.close()
+            if sql_tools_client:
+                sql_tools_client.shutdown()
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _script_objects(self, sql_tools_client, scripting_objects, file_path, callback):
+        parameters = dict(self.parameters)
+        parameters[u'FilePath'] = file_path
+        parameters[u'AppendToFile'] = False
+        parameters[u'IncludeDescriptiveHeaders'] = True
+        # The inventory already contains every dependency, unchanged dependencies come from the cache.
+        parameters[u'GenerateScriptForDependentObjects'] = False
+
+        request = sql_tools_client.create_request(u'scripting_request', parameters)
+        for scripting_object in scripting_objects:
+            request.params.include_objects.add_scripting_object(
+                scripting_object[u'type'], scripting_object[u'schema'], scripting_object[u'name'])
+        request.execute()
+
+        return request.result(
+            callback=lambda response: callback(response)
+            if callback and not isinstance(response, scripting.ScriptCompleteEvent) else None)
+
+    def _write(self, preamble, scripting_objects, object_scripts):
+        """
+            Write the preamble and every object script in plan order to the target file.
+        """
+        include_headers = self.parameters.get(u'IncludeDescriptiveHeaders', True)
+        mode = u'ab' if self.parameters.get(u'AppendToFile') else u'wb'
+        with io.open(self.parameters[u'FilePath'], mode) as target_file:
+            target_file.write(preamble)
+            for scripting_object in scripting_objects:
+                object_script = object_scripts[scriptersharding.get_object_key(scripting_object)]
+                if not include_headers:
+                    object_script = scriptersplitter.HEADER_LINE_PATTERN.sub(b'', object_script)
+                target_file.write(object_script)
@@ -0,0 +1,228 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import mssqlscripter.jsonrpc.contracts.scriptingservice as scripting
+import mssqlscripter.scriptersharding as scriptersharding
+import mssqlscripter.sqltoolsclient as sqltoolsclient
+
+logger = logging.getLogger(u'mssqlscripter.scriptercheckpoint')
+
+CHECKPOINT_EXTENSION = u'.checkpoint'
+JOURNAL_FILE_NAME = u'journal.jsonl'
+DEFAULT_BATCH_SIZE = 200
+# Tools service processes started to replace one that died, per run.
+MAX_RESTARTS = 3
+
+
+def get_checkpoint_directory(file_path):
+    """
+        The checkpoint of a file path or file per object directory is kept next to it.
+    """
+    return os.path.normpath(os.path.abspath(file_path)) + CHECKPOINT_EXTENSION
+
+
+def get_identity(parameters):
+    """
+        Digest of everything deciding what a run scripts, a checkpoint only resumes the same run.
+    """
+    request_parameters = scripting.ScriptingParams(parameters).format()
+    request_parameters[u'FilePath'] = os.path.abspath(request_parameters[u'FilePath'])
+    # Connection strings carry credentials, only a digest is stored.
+    return hashlib.sha256(json.dumps(request_parameters, sort_keys=True).encode(u'utf-8')).hexdigest()
+
+
+class CheckpointJournal(object):
+    """
+        Append only journal of a checkpointed run. The first line holds the identity of the run and it's
+        batches of scripting objects, every further line a batch that completed. A line torn by a crash
+        is ignored.
+    """
+
+    def __init__(self, journal_path):
+        self.journal_path = journal_path
+
+    def create(self, identity, batches):
+        with io.open(self.journal_path, u'w', encoding=u'utf-8') as journal_file:
+            journal_file.write(json.dumps({u'identity': identity, u'batches': batches}) + u'\n')
+            self._sync(journal_file)
+
+    def load(self):
+        """
+            Return the identity, batches and the set of completed batch indexes, or None without a journal.
+        """
+        try:
+            with io.open(self.journal_path, encoding=u'utf-8') as journal_file:
+                lines = journal_file.read().splitlines()
+        except (IOError, OSError):
+            return None
+
+        try:
+            header = json.loads(lines[0])
+        except (IndexError, ValueError):
+            return None
+
+        completed_batches = set()
+        for line in lines[1:]:
+            try:
+                completed_batches.add(json.loads(line)[u'batch'])
+            except (ValueError, KeyError, TypeError):
+                logger.warning(u'Ignoring incomplete checkpoint journal line')
+        return header[u'identity'], header[u'batches'], completed_batches
+
+    def record(self, batch_index):
+        with io.open(self.journal_path, u'a', encoding=u'utf-8') as journal_file:
+            journal_file.write(json.dumps({u'batch': batch_index}) + u'\n')
+            self._sync(journal_file)
+
+    def _sync(self, journal_file):
+        # A recorded batch has to survive the machine going down with the job.
+        journal_file.flush()
+        os.fsync(journal_file.fileno())
+
+
+class CheckpointedScripter(object):
+    """
+        Script in batches of objects, recording every completed batch in a checkpoint journal, so a
+        interrupted run is resumed without scripting completed batches again. A tools service process that
+        dies is replaced and it's batch scripted again.
+
+        Batches are contiguous ranges of the plan scripted by their own request. A single file is written as
+        a segment per batch in the checkpoint directory and assembled once every batch completed.
+    """
+
+    def __init__(self, parameters, batch_size=DEFAULT_BATCH_SIZE, resume=False, enable_logging=False):
+        self.parameters = parameters
+        self.batch_size = batch_size
+        self.resume = resume
+        self.enable_logging = enable_logging
+        self.single_file = parameters[u'ScriptDestination'] == u'ToSingleFile'
+        self.checkpoint_directory = get_checkpoint_directory(parameters[u'FilePath'])
+        self.journal = CheckpointJournal(os.path.join(self.checkpoint_directory, JOURNAL_FILE_NAME))
+        self.sql_tools_client = None
+        self.restart_count = 0
+
+    def run(self, callback=None):
+        """
+            Script every remaining batch and return a ScriptCompleteEvent. Plan and progress events of the
+            batches are passed to callback. The checkpoint is removed once the run completed.
+        """
+        try:
+            identity = get_identity(self.parameters)
+            checkpoint = self.journal.load() if self.resume else None
+            if checkpoint and checkpoint[0] == identity:
+                _, batches, completed_batches = checkpoint
+                logger.info(u'Resuming with {} of {} batches completed'.format(len(completed_batches), len(batches)))
+            else:
+                if self.resume:
+                    logger.warning(u'No checkpoint of this run found in {}, starting over'.format(
+                        self.checkpoint_directory))
+                batches = self._plan_batches()
+                if batches is None:
+                    return scriptersharding.create_complete_event(
+                        callback, error_message=u'Unable to collect the object inventory')
+                completed_batches = set()
+                self.journal.create(identity, batches)
+
+            for index, batch in enumerate(batches):
+                if index in completed_batches:
+                    continue
+                complete_event = self._script_batch(index, batch, callback)
+                if complete_event.has_error or not complete_event.success:
+                    return scriptersharding.create_complete_event(
+                        callback,
+                        error_message=u'{} The run can be resumed with --resume.'.format(complete_event.error_message),
+                        error_details=complete_event.error_details)
+                self.journal.record(index)
+
+            if self.single_file:
+                self._merge(len(batches))
+            shutil.rmtree(self.checkpoint_directory, ignore_errors=True)
+            return scriptersharding.create_complete_event(callback)
+
+        finally:
+            if self.sql_tools_client:
+                self.sql_tools_client.shutdown()
+
+    def get_segment_path(self, index):
+        return os.path.join(self.checkpoint_directory, u'batch_{:05d}.sql'.format(index))
+
+    def _plan_batches(self):
+        """
+            Split the plan into batches, or return None if the request completed without a plan.
+        """
+        if os.path.exists(self.checkpoint_directory):
+            shutil.rmtree(self.checkpoint_directory)
+        os.makedirs(self.checkpoint_directory)
+
+        temp_dir = tempfile.mkdtemp(prefix=u'mssqlscripter_')
+        try:
+            scripting_objects = scriptersharding.collect_inventory(self._get_client(), self.parameters, temp_dir)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        if scripting_objects is None:
+            return None
+        return [scripting_objects[start:start + self.batch_size]
+                for start in range(0, len(scripting_objects), self.batch_size)]
+
+    def _get_client(self):
+        """
+            Return a healthy tools service client, replacing one whose process died.
+        """
+        if self.sql_tools_client and not self.sql_tools_client.is_healthy():
+            self.sql_tools_client.shutdown()
+            self.sql_tools_client = None
+        if not self.sql_tools_client:
+            self.sql_tools_client = sqltoolsclient.start_tools_service(self.enable_logging)
+        return self.sql_tools_client
+
+    def _script_batch(self, index, batch, callback):
+        while True:
+            complete_event = self._script_objects(self._get_client(), batch, index, callback)
+            if not complete_event.has_error or self.sql_tools_client.is_healthy() or \
+                    self.restart_count >= MAX_RESTARTS:
+                return complete_event
+
+            # The tools service died, script the batch again on a new process.
+            self.restart_count += 1
+            logger.warning(u'Tools service stopped while scripting batch {}, restarting it ({} of {})'.format(
+                index, self.restart_count, MAX_RESTARTS))
+
+    def _script_objects(self, sql_tools_client, scripting_objects, index, callback):
+        parameters = dict(self.parameters)
+        parameters[u'FilePath'] = self.get_segment_path(index) if self.single_file else self.parameters[u'FilePath']
+        parameters[u'AppendToFile'] = False
+        # The plan already contains every dependency, each object is scripted by exactly one batch.
+        parameters[u'GenerateScriptForDependentObjects'] = False
+
+        request = sql_tools_client.create_request(u'scripting_request', parameters)
+        for scripting_object in scripting_objects:
+            request.params.include_objects.add_scripting_object(
+                scripting_object[u'type'], scripting_object[u'schema'], scripting_object[u'name'])
+        request.execute()
+
+        return request.result(
+            callback=lambda response: callback(response)
+            if callback and not isinstance(response, scripting.ScriptCompleteEvent) else None)
+
+    def _merge(self, batch_count):
+        """
+            Concatenate the segments in plan order into the target file.
+        """
+        mode = u'ab' if self.parameters.get(u'AppendToFile') else u'wb'
+        with io.open(self.parameters[u'FilePath'], mode) as target_file:
+            for index in range(batch_count):
+                segment_path = self.get_segment_path(index)
+                if os.path.exists(segment_path):
+                    with io.open(segment_path, u'rb') as segment_file:
+                        shutil.copyfileobj(segment_file, target_file)
@@ -0,0 +1,288 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+import io
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+import mssqlscripter.scripteroutput as scripteroutput
+
+logger = logging.getLogger(u'mssqlscripter.scriptercompression')
+
+
+class GzipCompressor(object):
+    """
+        Compress blocks to gzip members. Concatenated members are a valid gzip file.
+    """
+    name = u'gzip'
+    extension = u'.gz'
+
+    def compress_block(self, data):
+        # zlib releases the GIL while compressing, so blocks compress in parallel on threads.
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return compressor.compress(data) + compressor.flush()
+
+
+class XzCompressor(object):
+    """
+        Compress blocks to xz streams. Concatenated streams are a valid xz file.
+    """
+    name = u'xz'
+    extension = u'.xz'
+
+    def __init__(self):
+        import lzma
+        self.lzma = lzma
+
+    def compress_block(self, data):
+        return self.lzma.compress(data, format=self.lzma.FORMAT_XZ)
+
+
+class ZstdCompressor(object):
+    """
+        Compress blocks to zstd frames with the optional zstandard package. Concatenated frames are a valid
+        zstd file.
+    """
+    name = u'zstd'
+    extension = u'.zst'
+
+    def __init__(self):
+        import zstandard
+        self.zstandard = zstandard
+
+    def compress_block(self, data):
+        # Compressors are not thread safe, create one per block.
+        return self.zstandard.ZstdCompressor(level=3).compress(data)
+
+
+COMPRESSORS = dict((compressor_type.name, compressor_type) for compressor_type in [
+    GzipCompressor, XzCompressor, ZstdCompressor])
+
+
+def get_compressor(name):
+    """
+        Create the compressor with the given name.
+    Exceptions raised:
+        ImportError
+            The package the compressor needs is not installed.
+    """
+    try:
+        return COMPRESSORS[name]()
+    except ImportError:
+        package = u'zstandard' if name == u'zstd' else u'lzma'
+        raise ImportError(u'{} compression requires the {} package'.format(name, package))
+
+
+class ParallelBlockWriter(object):
+    """
+        Compress written bytes in fixed size blocks on a thread pool, writing compressed blocks in order.
+        The number of blocks in flight is bounded, so memory use stays bounded if the output is slow.
+    """
+    BLOCK_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, output, compressor, pool, max_pending_blocks, block_size=BLOCK_SIZE):
+        self.output = output
+        self.compressor = compressor
+        self.pool = pool
+        self.max_pending_blocks = max_pending_blocks
+        self.block_size = block_size
+        self.buffer = bytearray()
+        self.pending_blocks = deque()
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def write(self, data):
+        self.buffer.extend(data)
+        self.bytes_in += len(data)
+        while len(self.buffer) >= self.block_size:
+            self._submit(bytes(self.buffer[:self.block_size]))
+            del self.buffer[:self.block_size]
+
+    def flush(self):
+        """
+            Blocks are only compressed once full, flushing waits for close().
+        """
+        pass
+
+    def close(self):
+        """
+            Compress the last partial block and write every pending block.
+        """
+        if self.buffer:
+            self._submit(bytes(self.buffer))
+            self.buffer = bytearray()
+        while self.pending_blocks:
+            self._write_oldest_block()
+        self.output.flush()
+
+    def _submit(self, block):
+        if len(self.pending_blocks) >= self.max_pending_blocks:
+            self._write_oldest_block()
+        self.pending_blocks.append(self.pool.apply_async(self.compressor.compress_block, (block,)))
+
+    def _write_oldest_block(self):
+        compressed_block = self.pending_blocks.popleft().get()
+        self.output.write(compressed_block)
+        self.bytes_out += len(compressed_block)
+
+
+class ScriptCompressor(object):
+    """
+        Compress the scripted output while it is produced.
+
+        A single file is written by the tools service to a spool file that is followed and compressed to the
+        target file, or to stdout when no file path was given. Files per object are written to a staging
+        directory and compressed into the target directory once the tools service moved on to the next object.
+
+        Usage:
+            script_compressor = ScriptCompressor(parameters)    # Redirects parameters.FilePath.
+            script_compressor.start()
+            ... script ...
+            script_compressor.finish()
+    """
+    # Longest time between scans of the staging directory.
+    POLL_INTERVAL = .1
+
+    def __init__(self, parameters, concurrent_writers=1):
+        self.compressor = get_compressor(parameters.Compress)
+        thread_count = parameters.CompressThreads or multiprocessing.cpu_count()
+        self.pool = ThreadPool(thread_count)
+        self.max_pending_blocks = thread_count * 2
+        # Files written at the same time by the tools service, e.g. one per shard.
+        self.concurrent_writers = concurrent_writers
+        self.single_file = parameters.ScriptDestination == u'ToSingleFile'
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.start_time = None
+        self.follower = None
+        self.writer = None
+        self.target_file = None
+        self.collector_thread = None
+        self.finished = threading.Event()
+
+        if self.single_file:
+            if parameters.FilePath:
+                target_path = parameters.FilePath
+                if not target_path.endswith(self.compressor.extension):
+                    target_path += self.compressor.extension
+                self.target_file = io.open(target_path, u'ab' if parameters.AppendToFile else u'wb')
+                output = self.target_file
+            else:
+                output = scripteroutput.get_binary_stdout()
+            self.writer = self._create_writer(output)
+            self.spool_path = tempfile.NamedTemporaryFile(prefix=u'mssqlscripter_', delete=False).name
+            parameters.FilePath = self.spool_path
+            # Appending is done to the compressed target.
+            parameters.AppendToFile = False
+        else:
+            self.target_directory = parameters.FilePath
+            self.staging_directory = tempfile.mkdtemp(prefix=u'mssqlscripter_')
+            parameters.FilePath = self.staging_directory
+
+    def start(self):
+        """
+            Start compressing on a background thread.
+        """
+        self.start_time = time.time()
+        if self.single_file:
+            # Compressed bytes must not have their line endings translated.
+            self.follower = scripteroutput.ScriptFileFollower(self.spool_path, self.writer, line_separator=None)
+            self.follower.start()
+        else:
+            self.collector_thread = threading.Thread(target=self._collect, name=u'Script_Compressor_Thread')
+            self.collector_thread.daemon = True
+            self.collector_thread.start()
+
+    def finish(self, report=sys.stderr):
+        """
+            Compress the remaining output, remove the spool file or staging directory and report the
+            compression ratio and throughput.
+        """
+        try:
+            if self.single_file:
+                try:
+                    if self.follower:
+                        self.follower.finish()
+                    self.writer.close()
+                    self._count(self.writer)
+                finally:
+                    if self.target_file:
+                        self.target_file.close()
+                    os.remove(self.spool_path)
+            else:
+                try:
+                    self.finished.set()
+                    if self.collector_thread:
+                        self.collector_thread.join()
+                    # Every file is complete once scripting finished.
+                    self._compress_files(self._get_new_files(), settled_only=False)
+                finally:
+                    shutil.rmtree(self.staging_directory, ignore_errors=True)
+        finally:
+            self.pool.close()
+            self.pool.join()
+
+        if report:
+            report.write(self.format_report())
+
+    def format_report(self):
+        elapsed = max(time.time() - (self.start_time or time.time()), 1e-6)
+        return u'Compressed {:.1f} MB to {:.1f} MB with {} (ratio {:.1f}) at {:.1f} MB/s\n'.format(
+            self.bytes_in / 1048576.0,
+            self.bytes_out / 1048576.0,
+            self.compressor.name,
+            self.bytes_in / float(self.bytes_out) if self.bytes_out else 0,
+            self.bytes_in / 1048576.0 / elapsed)
+
+    def _create_writer(self, output):
+        return ParallelBlockWriter(output, self.compressor, self.pool, self.max_pending_blocks)
+
+    def _count(self, writer):
+        self.bytes_in += writer.bytes_in
+        self.bytes_out += writer.bytes_out
+
+    def _collect(self):
+        while not self.finished.wait(self.POLL_INTERVAL):
+            try:
+                self._compress_files(self._get_new_files(), settled_only=True)
+            except Exception as error:
+                logger.error(u'Compressing scripted files failed: {}'.format(error))
+
+    def _get_new_files(self):
+        """
+            List the staged files with their modification time, oldest first. Compressed files are removed.
+        """
+        return sorted(
+            (os.path.getmtime(os.path.join(self.staging_directory, file_name)), file_name)
+            for file_name in os.listdir(self.staging_directory))
+
+    def _compress_files(self, new_files, settled_only):
+        if settled_only:
+            # The tools service writes files one after another, only the newest files may still be written.
+            if len(new_files) <= self.concurrent_writers:
+                return
+            newest_modified_time = new_files[-self.concurrent_writers][0]
+            new_files = [new_file for new_file in new_files if new_file[0] < newest_modified_time]
+
+        for _, file_name in new_files:
+            target_path = os.path.join(self.target_directory, file_name + self.compressor.extension)
+            with io.open(os.path.join(self.staging_directory, file_name), u'rb') as staged_file:
+                with io.open(target_path, u'wb') as target_file:
+                    writer = self._create_writer(target_file)
+                    shutil.copyfileobj(staged_file, writer, ParallelBlockWriter.BLOCK_SIZE)
+                    writer.close()
+            self._count(writer)
+            # Free the staging space as soon as a file is compressed.
+            os.remove(os.path.join(self.staging_directory, file_name))
@@ -0,0 +1,475 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import argparse
+import errno
+import json
+import logging
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+
+import mssqlscripter.jsonrpc.contracts.scriptingservice as scripting
+import mssqlscripter.scripterlogging as scripterlogging
+import mssqlscripter.sqltoolsclient as sqltoolsclient
+
+logger = logging.getLogger(u'mssqlscripter.scripterdaemon')
+
+DAEMON_SOCKET_NAME = u'scripterdaemon.sock'
+# Seconds without a request before the daemon shuts down.
+DEFAULT_IDLE_TIMEOUT = 600
+# Number of warm tools service processes the daemon keeps.
+DEFAULT_POOL_SIZE = 1
+# Seconds between health checks of the idle tools service processes.
+HEALTH_CHECK_INTERVAL = 10
+# Longest time to wait for a spawned daemon to accept connections.
+DAEMON_START_TIMEOUT = 10
+
+# Events the daemon streams back to the CLI.
+EVENT_TYPES = dict((event_type.__name__, event_type) for event_type in [
+    scripting.ScriptResponse,
+    scripting.ScriptPlanNotificationEvent,
+    scripting.ScriptProgressNotificationEvent,
+    scripting.ScriptCompleteEvent])
+
+# Unix domain sockets are not available on every platform, see is_supported().
+UnixStreamServer = getattr(socketserver, u'UnixStreamServer', object)
+
+
+def is_supported():
+    """
+        Daemon mode communicates over a Unix domain socket.
+    """
+    return hasattr(socket, u'AF_UNIX')
+
+
+def get_socket_path():
+    """
+        Retrieve the daemon socket path in the config directory.
+    """
+    return os.path.join(scripterlogging.get_config_log_dir(), DAEMON_SOCKET_NAME)
+
+
+class ToolsServicePool(object):
+    """
+        Warm tools service processes shared by daemon requests. Each process runs one request at a time.
+    """
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, enable_logging=False):
+        self.size = size
+        self.enable_logging = enable_logging
+        self.idle_clients = []
+        self.started_count = 0
+        self.available = threading.Condition()
+
+    def warm_up(self):
+        """
+            Start every tools service process ahead of the first request.
+        """
+        clients = []
+        try:
+            for _ in range(self.size):
+                clients.append(self.acquire())
+        except Exception as error:
+            # Requests report the failure when they try to start a tools service.
+            logger.error(u'Unable to start tools service: {}'.format(error))
+
+        for client in clients:
+            self.release(client)
+
+    def acquire(self):
+        """
+            Take a healthy idle tools service client, starting one if the pool is not full.
+            Blocks until a client is released otherwise.
+        """
+        with self.available:
+            while True:
+                while self.idle_clients:
+                    client = self.idle_clients.pop()
+                    if client.is_healthy():
+                        return client
+                    self._discard(client)
+
+                if self.started_count < self.size:
+                    self.started_count += 1
+                    break
+
+                self.available.wait()
+
+        try:
+            return sqltoolsclient.start_tools_service(self.enable_logging)
+        except Exception:
+            with self.available:
+                self.started_count -= 1
+                self.available.notify()
+            raise
+
+    def release(self, client):
+        """
+            Return a client to the pool, discarding it if the tools service failed.
+        """
+        with self.available:
+            if client.is_healthy():
+                self.idle_clients.append(client)
+            else:
+                self._discard(client)
+            self.available.notify()
+
+    def check_health(self):
+        """
+            Discard idle clients whose tools service failed, and start replacements to keep the pool warm.
+        """
+        with self.available:
+            unhealthy_clients = [client for client in self.idle_clients if not client.is_healthy()]
+            for client in unhealthy_clients:
+                self.idle_clients.remove(client)
+                self._discard(client)
+
+        for _ in unhealthy_clients:
+            try:
+                self.release(self.acquire())
+            except Exception as error:
+                logger.error(u'Unable to restart tools service: {}'.format(error))
+
+    def shutdown(self):
+        """
+            Stop every idle tools service process.
+        """
+        with self.available:
+            while self.idle_clients:
+                self._discard(self.idle_clients.pop())
+
+    def _discard(self, client):
+        logger.info(u'Discarding tools service client')
+        self.started_count -= 1
+        try:
+            client.shutdown()
+        except Exception as error:
+            logger.debug(u'Tools service client shutdown failed: {}'.format(error))
+
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    """
+        Handle one newline delimited JSON command and stream back events as JSON lines.
+    """
+
+    def handle(self):
+        self.connected = True
+        try:
+            request = json.loads(self.rfile.readline().decode(u'utf-8'))
+        except ValueError:
+            logger.error(u'Daemon received a malformed request')
+            return
+
+        command = request.get(u'command')
+        if command == u'script':
+            self.server.script(request[u'parameters'], self.send_event)
+        elif command == u'shutdown':
+            self.server.shutdown()
+        else:
+            logger.error(u'Daemon received unknown command: {}'.format(command))
+
+    def send_event(self, event):
+        """
+            Stream a event to the CLI. The request keeps running if the CLI went away.
+        """
+        if not self.connected:
+            return
+
+        message = {u'event': type(event).__name__, u'attributes': vars(event)}
+        try:
+            self.wfile.write(json.dumps(message, default=str).encode(u'utf-8') + b'\n')
+            self.wfile.flush()
+        except (IOError, OSError) as error:
+            logger.info(u'Daemon client disconnected: {}'.format(error))
+            self.connected = False
+
+
+class ScripterDaemon(socketserver.ThreadingMixIn, UnixStreamServer):
+    """
+        Run scripting requests from CLI invocations on warm tools service processes.
+
+        Usage:
+            daemon = ScripterDaemon(get_socket_path(), ToolsServicePool())
+            daemon.serve()
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path, pool, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        remove_stale_socket(socket_path)
+        # Only the owning user may connect, requests carry connection strings.
+        previous_umask = os.umask(0o077)
+        try:
+            UnixStreamServer.__init__(self, socket_path, DaemonRequestHandler)
+        finally:
+            os.umask(previous_umask)
+
+        self.socket_path = socket_path
+        self.pool = pool
+        self.idle_timeout = idle_timeout
+        self.active_requests = 0
+        self.last_activity = time.time()
+        self.activity_lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def serve(self):
+        """
+            Serve until shut down or idle for longer than the idle timeout.
+        """
+        logger.info(u'Scripter daemon listening on {}'.format(self.socket_path))
+        watchdog = threading.Thread(target=self._watch, name=u'Daemon watchdog thread')
+        watchdog.daemon = True
+        watchdog.start()
+        try:
+            self.serve_forever()
+        finally:
+            self.stopped.set()
+            self.server_close()
+            self.pool.shutdown()
+            try:
+                os.remove(self.socket_path)
+            except OSError:
+                pass
+            logger.info(u'Scripter daemon stopped')
+
+    def script(self, parameters, callback):
+        """
+            Run a scripting request on a pooled tools service and pass every response to callback.
+        """
+        with self.activity_lock:
+            self.active_requests += 1
+        try:
+            client = self.pool.acquire()
+        except Exception as error:
+            callback(error_event(error))
+            self._request_finished()
+            return
+
+        try:
+            scripting_request = client.create_request(u'scripting_request', parameters)
+            if not parameters.get(u'DisplayProgress') and not parameters.get(u'Ndjson'):
+                scripting_request.ignore_progress_notifications()
+            scripting_request.execute()
+            scripting_request.result(callback=callback)
+        except Exception as error:
+            callback(error_event(error))
+        finally:
+            self.pool.release(client)
+            self._request_finished()
+
+    def _request_finished(self):
+        with self.activity_lock:
+            self.active_requests -= 1
+            self.last_activity = time.time()
+
+    def _watch(self):
+        """
+            Check the pool health and shut down once idle for longer than the idle timeout.
+        """
+        interval = min(HEALTH_CHECK_INTERVAL, self.idle_timeout)
+        while not self.stopped.wait(interval):
+            with self.activity_lock:
+                idle = self.active_requests == 0 and time.time() - self.last_activity > self.idle_timeout
+            if idle:
+                logger.info(u'Scripter daemon idle for {} seconds, shutting down'.format(self.idle_timeout))
+                self.shutdown()
+                return
+
+            self.pool.check_health()
+
+
+def remove_stale_socket(socket_path):
+    """
+        Remove a socket left behind by a daemon that did not shut down.
+    Exceptions raised:
+        OSError
+            A daemon is already listening on the socket.
+    """
+    if not os.path.exists(socket_path):
+        return
+
+    try:
+        connect(socket_path).close()
+    except (IOError, OSError):
+        os.remove(socket_path)
+        return
+
+    raise OSError(errno.EADDRINUSE, u'Scripter daemon is already running', socket_path)
+
+
+def connect(socket_path):
+    """
+        Connect to the daemon socket.
+    """
+    client_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client_socket.connect(socket_path)
+    except Exception:
+        client_socket.close()
+        raise
+    return client_socket
+
+
+def connect_or_spawn(socket_path, idle_timeout=DEFAULT_IDLE_TIMEOUT, pool_size=DEFAULT_POOL_SIZE,
+                     enable_logging=False):
+    """
+        Connect to the daemon, starting it in the background if it is not running.
+    """
+    try:
+        return connect(socket_path)
+    except (IOError, OSError):
+        pass
+
+    daemon_args = [
+        sys.executable, u'-m', u'mssqlscripter.scripterdaemon',
+        u'--socket', socket_path,
+        u'--idle-timeout', str(idle_timeout),
+        u'--pool-size', str(pool_size)]
+    if enable_logging:
+        daemon_args.append(u'--enable-toolsservice-logging')
+
+    logger.info(u'Starting scripter daemon with arguments {}'.format(daemon_args))
+    with open(os.devnull, u'r+b') as devnull:
+        # Start a new session so the daemon outlives the CLI and it's terminal.
+        subprocess.Popen(
+            daemon_args, stdin=devnull, stdout=devnull, stderr=devnull, close_fds=True, preexec_fn=os.setsid)
+
+    deadline = time.time() + DAEMON_START_TIMEOUT
+    while True:
+        try:
+            return connect(socket_path)
+        except (IOError, OSError):
+            if time.time() > deadline:
+                raise
+            time.sleep(.1)
+
+
+def submit(parameters, callback=None, socket_path=None):
+    """
+        Run a scripting request on the daemon, starting it if needed, and pass every response to callback.
+        Returns the ScriptCompleteEvent. Failures are returned as a failed ScriptCompleteEvent.
+    """
+    request_parameters = dict(vars(parameters))
+    # The daemon does not share our working directory.
+    request_parameters[u'FilePath'] = os.path.abspath(parameters.FilePath)
+
+    complete_event = None
+    try:
+        if not is_supported():
+            raise OSError(errno.EAFNOSUPPORT, u'Daemon mode requires Unix domain sockets')
+
+        client_socket = connect_or_spawn(
+            socket_path or get_socket_path(),
+            parameters.DaemonIdleTimeout,
+            parameters.DaemonPoolSize,
+            parameters.EnableLogging)
+        try:
+            request = {u'command': u'script', u'parameters': request_parameters}
+            client_socket.sendall(json.dumps(request).encode(u'utf-8') + b'\n')
+
+            for event in read_events(client_socket):
+                if callback:
+                    callback(event)
+                if isinstance(event, scripting.ScriptCompleteEvent):
+                    complete_event = event
+                    break
+        finally:
+            client_socket.close()
+
+        if complete_event is None:
+            raise EOFError(u'Scripter daemon closed the connection before the request completed.')
+
+    except Exception as error:
+        logger.debug(u'Daemon request received exception: {}'.format(error))
+        complete_event = error_event(error)
+        if callback:
+            callback(complete_event)
+
+    return complete_event
+
+
+def shutdown(socket_path=None):
+    """
+        Ask a running daemon to shut down. Returns False if no daemon was running.
+    """
+    try:
+        client_socket = connect(socket_path or get_socket_path())
+    except (IOError, OSError):
+        return False
+
+    try:
+        client_socket.sendall(json.dumps({u'command': u'shutdown'}).encode(u'utf-8') + b'\n')
+        # The daemon closes the connection once it stopped serving.
+        client_socket.recv(1)
+    finally:
+        client_socket.close()
+    return True
+
+
+def read_events(client_socket):
+    """
+        Yield the events streamed by the daemon.
+    """
+    stream = client_socket.makefile(u'rb')
+    try:
+        for line in stream:
+            message = json.loads(line.decode(u'utf-8'))
+            event_type = EVENT_TYPES[message[u'event']]
+            # Restore the decoded event without going through the json rpc params.
+            event = event_type.__new__(event_type)
+            event.__dict__.update(message[u'attributes'])
+            yield event
+    finally:
+        stream.close()
+
+
+def error_event(error):
+    """
+        Represent a exception as a failed ScriptCompleteEvent.
+    """
+    return scripting.ScriptCompleteEvent({
+        u'operationId': None,
+        u'sequenceNumber': None,
+        u'success': False,
+        u'canceled': False,
+        u'hasError': True,
+        u'errorMessage': u'Scripting request encountered a exception',
+        u'errorDetails': error.args})
+
+
+def main(args):
+    """
+        Entry point of the daemon process.
+    """
+    parser = argparse.ArgumentParser(
+        prog=u'mssqlscripter.scripterdaemon',
+        description=u'Keep warm tools service processes for mssql-scripter --daemon.')
+    parser.add_argument(u'--socket', default=None, help=u'Unix domain socket to listen on.')
+    parser.add_argument(u'--idle-timeout', type=float, default=DEFAULT_IDLE_TIMEOUT,
+                        help=u'Seconds without requests before the daemon exits.')
+    parser.add_argument(u'--pool-size', type=int, default=DEFAULT_POOL_SIZE,
+                        help=u'Number of warm tools service processes.')
+    parser.add_argument(u'--enable-toolsservice-logging', dest=u'EnableLogging', action=u'store_true',
+                        default=False, help=u'Enable verbose logging.')
+    parser.add_argument(u'--stop', action=u'store_true', default=False, help=u'Stop the running daemon.')
+    parameters = parser.parse_args(args)
+
+    if parameters.stop:
+        shutdown(parameters.socket)
+        return
+
+    scripterlogging.initialize_logger()
+    pool = ToolsServicePool(parameters.pool_size, parameters.EnableLogging)
+    daemon = ScripterDaemon(parameters.socket or get_socket_path(), pool, parameters.idle_timeout)
+    pool.warm_up()
+    daemon.serve()
+
+
+if __name__ == u'__main__':
+    main(sys.argv[1:])
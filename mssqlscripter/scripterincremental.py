@@ -0,0 +1,145 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import tempfile
+
+import mssqlscripter.scriptersplitter as scriptersplitter
+
+logger = logging.getLogger(u'mssqlscripter.scripterincremental')
+
+MANIFEST_FILE_NAME = u'.mssqlscripter-manifest.json'
+# The time a descriptive header was scripted at, e.g. Script Date: 10/18/2026 1:23:45 PM.
+SCRIPT_DATE_PATTERN = re.compile(br'Script Date:.*?(?=\*{6}/)')
+
+
+def hash_file(file_path):
+    """
+        Return the sha256 hex digest of a file, ignoring the script date of it's descriptive headers. Scripts
+        only differing in when they were scripted hash the same.
+    """
+    digest = hashlib.sha256()
+    with io.open(file_path, u'rb') as hashed_file:
+        for line in hashed_file:
+            if scriptersplitter.HEADER_LINE_PATTERN.match(line):
+                line = SCRIPT_DATE_PATTERN.sub(b'Script Date:', line, count=1)
+            digest.update(line)
+    return digest.hexdigest()
+
+
+def is_complete(complete_event):
+    return bool(complete_event and complete_event.success and not complete_event.has_error and
+                not complete_event.canceled)
+
+
+class IncrementalWriter(object):
+    """
+        Update a file per object directory in place, only writing object scripts that changed.
+
+        The tools service scripts to a staging directory next to the target directory. Once scripting
+        finished, every staged file is hashed and compared with the hash recorded in the manifest of the
+        target directory. Unchanged files are left alone, changed and new files are moved into the target
+        directory. Files recorded in the manifest for objects that were not scripted are removed, if the
+        scripting request completed. Files the manifest does not list are never touched.
+
+        Usage:
+            incremental_writer = IncrementalWriter(parameters)    # Redirects parameters.FilePath.
+            ... script ...
+            incremental_writer.finish(complete_event)
+    """
+
+    def __init__(self, parameters):
+        self.target_directory = parameters.FilePath
+        self.manifest_path = os.path.join(self.target_directory, MANIFEST_FILE_NAME)
+        # A sibling of the target directory, so files are moved without copying them.
+        self.staging_directory = tempfile.mkdtemp(
+            prefix=u'.mssqlscripter_', dir=os.path.dirname(os.path.abspath(self.target_directory)))
+        parameters.FilePath = self.staging_directory
+        self.written_count = 0
+        self.unchanged_count = 0
+        self.removed_count = 0
+
+    def finish(self, complete_event=None, report=sys.stderr):
+        """
+            Apply the staged files to the target directory, save the manifest and report the changes.
+            Stale files are only removed when complete_event reports the request completed.
+        """
+        try:
+            previous_files = self.load_manifest()
+            files = {}
+            for file_name in sorted(os.listdir(self.staging_directory)):
+                staged_path = os.path.join(self.staging_directory, file_name)
+                if os.path.isfile(staged_path):
+                    files[file_name] = self._apply(file_name, staged_path, previous_files.get(file_name))
+
+            for file_name, entry in previous_files.items():
+                if file_name in files:
+                    continue
+                if is_complete(complete_event):
+                    self._remove(file_name)
+                else:
+                    # Objects missing from a failed request may still exist, keep their files.
+                    files[file_name] = entry
+
+            self.save_manifest(files)
+        finally:
+            shutil.rmtree(self.staging_directory, ignore_errors=True)
+
+        if report:
+            report.write(self.format_report())
+
+    def format_report(self):
+        return u'Incremental update of {}: {} written, {} unchanged, {} removed\n'.format(
+            self.target_directory, self.written_count, self.unchanged_count, self.removed_count)
+
+    def load_manifest(self):
+        """
+            Return the recorded files of the target directory as file name to hash and size.
+        """
+        try:
+            with io.open(self.manifest_path, encoding=u'utf-8') as manifest_file:
+                return json.loads(manifest_file.read()).get(u'files', {})
+        except (IOError, OSError, ValueError) as error:
+            if os.path.exists(self.manifest_path):
+                logger.warning(u'Ignoring unreadable manifest {}: {}'.format(self.manifest_path, error))
+            return {}
+
+    def save_manifest(self, files):
+        temp_path = self.manifest_path + u'.tmp'
+        with io.open(temp_path, u'w', encoding=u'utf-8') as manifest_file:
+            manifest_file.write(json.dumps({u'files': files}, indent=2, sort_keys=True, ensure_ascii=False))
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+        os.rename(temp_path, self.manifest_path)
+
+    def _apply(self, file_name, staged_path, previous_entry):
+        entry = {u'sha256': hash_file(staged_path), u'bytes': os.path.getsize(staged_path)}
+        target_path = os.path.join(self.target_directory, file_name)
+
+        # The size catches files edited since the last run without reading them. The target keeps it's
+        # script date, so it's compared with the size recorded when it was written.
+        if previous_entry and previous_entry.get(u'sha256') == entry[u'sha256'] and os.path.isfile(target_path) \
+                and os.path.getsize(target_path) == previous_entry.get(u'bytes'):
+            self.unchanged_count += 1
+            return previous_entry
+
+        if os.path.exists(target_path):
+            os.remove(target_path)
+        shutil.move(staged_path, target_path)
+        self.written_count += 1
+        return entry
+
+    def _remove(self, file_name):
+        target_path = os.path.join(self.target_directory, file_name)
+        if os.path.isfile(target_path):
+            os.remove(target_path)
+            self.removed_count += 1
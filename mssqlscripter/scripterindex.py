@@ -0,0 +1,224 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+from collections import OrderedDict
+
+import io
+import json
+import logging
+import mmap
+import os
+import re
+
+import mssqlscripter.scripteroutput as scripteroutput
+import mssqlscripter.scriptersplitter as scriptersplitter
+
+logger = logging.getLogger(u'mssqlscripter.scripterindex')
+
+INDEX_EXTENSION = u'.index.json'
+INDEX_VERSION = 1
+# Objects starting a range in the index. Headers of other types, e.g. indexes, belong to the object before them.
+INDEXED_TYPES = frozenset(scriptersplitter.CREATE_TYPE_NAMES.values())
+# A batch of SET statements, e.g. SET ANSI_NULLS ON, belongs to the object after it.
+SET_BATCH_PATTERN = re.compile(
+    br'^(?:\s|/\*.*?\*/|--[^\n]*\n|SET\s[^\n]*\n|GO\b[^\n]*(?:\n|$))*$', re.IGNORECASE | re.DOTALL)
+IDENTIFIER_PATTERN = re.compile(r'\[((?:[^\]]|\]\])*)\]|([^.\[\]]+)')
+
+
+def get_index_path(file_path):
+    return file_path + INDEX_EXTENSION
+
+
+def split_name(scripted_name):
+    """
+        Split a name as scripted, e.g. [dbo].[Customers], into it's schema and name.
+    """
+    parts = [bracketed.replace(u']]', u']') if bracketed else plain
+             for bracketed, plain in IDENTIFIER_PATTERN.findall(scripted_name)]
+    return (parts[-2] if len(parts) > 1 else None), parts[-1]
+
+
+class ScriptIndexBuilder(object):
+    """
+        Build a index of the byte range every object takes in a script, in a single pass over it's GO
+        separated batches. A object scripted in several places, e.g. a table's schema and later it's data,
+        has a range for each.
+
+        Usage:
+            builder = ScriptIndexBuilder()
+            builder.write(chunk)
+            ...
+            builder.close(index_path)
+    """
+
+    def __init__(self):
+        self.splitter = scriptersplitter.GoBatchSplitter()
+        self.entries = []
+        self.offset = 0
+        self.batch_start = 0
+        self.batch_object = None
+        self.batch_set_only = True
+        # Start of the SET batches waiting for the object after them.
+        self.pending_start = None
+
+    def write(self, data):
+        for piece, batch_complete in self.splitter.feed(data):
+            self._add_piece(piece, batch_complete)
+
+    def flush(self):
+        pass
+
+    def close(self, index_path=None):
+        """
+            Complete the index, writing it to index_path if given, and return it.
+        """
+        for piece, batch_complete in self.splitter.close():
+            self._add_piece(piece, batch_complete)
+        if self.pending_start is not None and self.entries:
+            self.entries[-1][u'length'] = self.offset - self.entries[-1][u'offset']
+
+        index = {u'version': INDEX_VERSION, u'size': self.offset, u'objects': self.entries}
+        if index_path:
+            index[u'file'] = os.path.basename(index_path[:-len(INDEX_EXTENSION)])
+            temp_path = index_path + u'.tmp'
+            with io.open(temp_path, u'w', encoding=u'utf-8') as index_file:
+                index_file.write(json.dumps(index, ensure_ascii=False))
+            if os.path.exists(index_path):
+                os.remove(index_path)
+            os.rename(temp_path, index_path)
+        return index
+
+    def _add_piece(self, piece, batch_complete):
+        if self.batch_object is None:
+            for object_type, scripted_name in scriptersplitter.find_script_objects(piece):
+                if object_type in INDEXED_TYPES:
+                    self.batch_object = (object_type,) + split_name(scripted_name)
+                    break
+        if self.batch_set_only and not SET_BATCH_PATTERN.match(piece):
+            self.batch_set_only = False
+        self.offset += len(piece)
+
+        if batch_complete:
+            self._complete_batch()
+            self.batch_start = self.offset
+            self.batch_object = None
+            self.batch_set_only = True
+
+    def _complete_batch(self):
+        current = self.entries[-1] if self.entries else None
+        if self.batch_object:
+            if not current or self.batch_object != (current[u'type'], current[u'schema'], current[u'name']):
+                object_type, schema, name = self.batch_object
+                current = {u'type': object_type, u'schema': schema, u'name': name,
+                           u'offset': self.batch_start if self.pending_start is None else self.pending_start}
+                self.entries.append(current)
+        elif self.batch_set_only:
+            if self.pending_start is None:
+                self.pending_start = self.batch_start
+            return
+        elif not current:
+            # The script before the first object, e.g. USE [database].
+            self.pending_start = None
+            return
+
+        current[u'length'] = self.offset - current[u'offset']
+        self.pending_start = None
+
+
+class ScriptIndexer(object):
+    """
+        Follow the single file the tools service writes and index it next to the file path.
+
+        Usage:
+            script_indexer = ScriptIndexer(parameters)
+            script_indexer.start()
+            ... script ...
+            script_indexer.finish()
+    """
+
+    def __init__(self, parameters):
+        self.index_path = get_index_path(parameters.FilePath)
+        self.builder = ScriptIndexBuilder()
+        # The file exists before the tools service opens it, appended scripts are indexed with the existing script.
+        if not parameters.AppendToFile or not os.path.exists(parameters.FilePath):
+            io.open(parameters.FilePath, u'wb').close()
+        self.follower = scripteroutput.ScriptFileFollower(parameters.FilePath, self.builder, line_separator=None)
+
+    def start(self):
+        self.follower.start()
+
+    def finish(self):
+        self.follower.finish()
+        index = self.builder.close(self.index_path)
+        logger.info(u'Indexed {} object ranges in {}'.format(len(index[u'objects']), self.index_path))
+
+
+class ScriptIndexReader(object):
+    """
+        Read single objects or subsets of objects from a indexed script without scanning it. The script is
+        memory mapped, so reading a object only touches it's own pages.
+
+        Usage:
+            with ScriptIndexReader(u'adventureworks.sql') as reader:
+                script = reader.read_object(u'Table', u'dbo', u'Customers')
+                for entry, script in reader.read_objects(object_type=u'StoredProcedure', schema=u'Sales'):
+                    ...
+    """
+
+    def __init__(self, file_path, index_path=None):
+        with io.open(index_path or get_index_path(file_path), encoding=u'utf-8') as index_file:
+            index = json.loads(index_file.read())
+        self.entries = index[u'objects']
+        # Keeps the objects in script order.
+        self.ranges = OrderedDict()
+        for entry in self.entries:
+            self.ranges.setdefault((entry[u'type'], entry[u'schema'], entry[u'name']), []).append(entry)
+
+        self.script_file = io.open(file_path, u'rb')
+        size = os.fstat(self.script_file.fileno()).st_size
+        if size != index[u'size']:
+            self.script_file.close()
+            raise ValueError(u'The index of {} is out of date, the script changed after it was indexed'.format(
+                file_path))
+        # Empty files can not be mapped.
+        self.script_map = mmap.mmap(self.script_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.script_map:
+            self.script_map.close()
+        self.script_file.close()
+
+    def objects(self):
+        """
+            Return the objects in the index as (type, schema, name), in script order.
+        """
+        return list(self.ranges)
+
+    def read_object(self, object_type, schema, name):
+        """
+            Return the script of a object, every range of it concatenated.
+        Exceptions raised:
+            KeyError
+                The object is not in the index.
+        """
+        return b''.join(self._read(entry) for entry in self.ranges[(object_type, schema, name)])
+
+    def read_objects(self, object_type=None, schema=None):
+        """
+            Yield (entry, script) for every range of the objects of a type and/or schema, in script order.
+        """
+        for entry in self.entries:
+            if (object_type is None or entry[u'type'] == object_type) and \
+                    (schema is None or entry[u'schema'] == schema):
+                yield entry, self._read(entry)
+
+    def _read(self, entry):
+        return self.script_map[entry[u'offset']:entry[u'offset'] + entry[u'length']]
@@ -0,0 +1,209 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import re
+
+import mssqlscripter.scripterpipeline as scripterpipeline
+
+# SQL Server accepts at most 1000 rows in a table value constructor.
+MAX_ROWS = 1000
+DEFAULT_MAX_SIZE = 1024 * 1024
+# Rows per GO batch, so the server never parses a whole table as one batch.
+GO_INTERVAL_ROWS = 10000
+
+# A line of the script, string literals and bracketed identifiers may contain line endings.
+LOGICAL_LINE_PATTERN = re.compile(br"(?:\[(?:[^\]]|\]\])*\]|'(?:[^']|'')*'|[^'\[\n])*(?:\n|\Z)")
+NAME = br'(?:\[(?:[^\]]|\]\])*\]|[\w@#$]+)(?:\.(?:\[(?:[^\]]|\]\])*\]|[\w@#$]+))*'
+# A single row INSERT statement on it's own line: the statement up to VALUES, the row and the line ending.
+INSERT_VALUES_PATTERN = re.compile(
+    br'^(INSERT\s+(?:INTO\s+)?' + NAME + br'\s*(?:\((?:\[(?:[^\]]|\]\])*\]|[^)\[])*\)\s*)?)VALUES\s*(\(.*\))'
+    br'[ \t]*(\r?\n|\Z)',
+    re.DOTALL | re.IGNORECASE)
+INSERT_START_PATTERN = re.compile(br'^INSERT\s', re.MULTILINE | re.IGNORECASE)
+# Lines besides single row INSERT statements a data batch is made of. Batches with any other line, e.g. a
+# procedure body, are kept as they are, changing their INSERT statements could change what they do.
+DATA_BATCH_LINE_PATTERN = re.compile(
+    br'^(?:[ \t]*|SET\s[^\n]*|GO\b[^\n]*|--[^\n]*|/\*[^\n]*\*/[ \t]*)(?:\r?\n|\Z)', re.IGNORECASE)
+INSERT_TABLE_PATTERN = re.compile(br'^INSERT\s+(?:INTO\s+)?(' + NAME + br')', re.IGNORECASE)
+
+
+def split_lines(data):
+    """
+        Split a script into it's lines, yielding (line, complete). A line is incomplete if it does not end
+        with a line ending, or it starts a string literal or bracketed identifier that is not terminated in
+        data, in which case it is the rest of data.
+    """
+    position = 0
+    while position < len(data):
+        match = LOGICAL_LINE_PATTERN.match(data, position)
+        if not match:
+            yield data[position:], False
+            return
+        yield match.group(), match.group().endswith(b'\n')
+        position = match.end()
+
+
+class InsertMerger(object):
+    """
+        Merge consecutive single row INSERT statements of a table into multi row INSERT statements of up to
+        max_rows rows and max_size bytes of values, starting a new GO batch every go_interval_rows rows.
+        Every other statement is kept unchanged and in place, and batches with statements other than INSERT
+        and SET, e.g. procedures, are not merged.
+    """
+
+    def __init__(self, max_rows=MAX_ROWS, max_size=DEFAULT_MAX_SIZE, go_interval_rows=GO_INTERVAL_ROWS):
+        self.max_rows = min(max_rows, MAX_ROWS)
+        self.max_size = max_size
+        self.go_interval_rows = go_interval_rows
+        self.rows_merged = 0
+        self.statements_written = 0
+
+    def merge(self, data):
+        """
+            Merge the INSERT statements of a GO batch, returning it as a list of GO batches. Only batches made
+            of INSERT and SET statements are merged.
+        """
+        if not INSERT_START_PATTERN.search(data):
+            return [data]
+
+        rows_merged, statements_written = self.rows_merged, self.statements_written
+        batches = []
+        output = bytearray()
+        statement_start = None
+        rows = []
+        size = 0
+        line_end = b'\n'
+        batch_rows = 0
+
+        for line, _ in split_lines(data):
+            insert_match = INSERT_VALUES_PATTERN.match(line)
+            if not insert_match:
+                if not DATA_BATCH_LINE_PATTERN.match(line):
+                    self.rows_merged, self.statements_written = rows_merged, statements_written
+                    return [data]
+                self._write_statement(output, statement_start, rows, line_end)
+                rows = []
+                output.extend(line)
+                continue
+
+            if rows and (insert_match.group(1) != statement_start or len(rows) >= self.max_rows or
+                         size + len(insert_match.group(2)) > self.max_size):
+                self._write_statement(output, statement_start, rows, line_end)
+                rows = []
+            if not rows:
+                if batch_rows >= self.go_interval_rows:
+                    output.extend(b'GO' + line_end)
+                    batches.append(bytes(output))
+                    output = bytearray()
+                    batch_rows = 0
+                statement_start = insert_match.group(1)
+                line_end = insert_match.group(3) or b'\n'
+                size = 0
+
+            rows.append(insert_match.group(2))
+            size += len(insert_match.group(2))
+            batch_rows += 1
+            self.rows_merged += 1
+
+        self._write_statement(output, statement_start, rows, line_end)
+        batches.append(bytes(output))
+        return batches
+
+    def _write_statement(self, output, statement_start, rows, line_end):
+        if rows:
+            output.extend(statement_start + b'VALUES ' + (b',' + line_end).join(rows) + line_end)
+            self.statements_written += 1
+
+
+class RowLimiter(object):
+    """
+        Drop the INSERT statements of a table after it's first max_rows rows, counting the rows of every
+        table. Every other statement is kept, and batches with statements other than INSERT and SET, e.g.
+        procedures, are not limited.
+    """
+
+    def __init__(self, max_rows):
+        self.max_rows = max_rows
+        self.table_rows = {}
+        self.table_order = []
+
+    def limit(self, data):
+        """
+            Return a GO batch without the rows over the limit. Only batches made of INSERT and SET statements
+            are limited.
+        """
+        if not INSERT_START_PATTERN.search(data):
+            return data
+
+        output = bytearray()
+        batch_rows = {}
+        batch_tables = []
+        for line, _ in split_lines(data):
+            table_match = INSERT_TABLE_PATTERN.match(line) if INSERT_VALUES_PATTERN.match(line) else None
+            if not table_match:
+                if not DATA_BATCH_LINE_PATTERN.match(line):
+                    return data
+                output.extend(line)
+                continue
+
+            table = table_match.group(1).decode(u'utf-8')
+            if table not in batch_rows:
+                batch_rows[table] = 0
+                batch_tables.append(table)
+            batch_rows[table] += 1
+            if self.table_rows.get(table, 0) + batch_rows[table] <= self.max_rows:
+                output.extend(line)
+
+        # Rows are only counted for batches that are limited.
+        for table in batch_tables:
+            if table not in self.table_rows:
+                self.table_rows[table] = 0
+                self.table_order.append(table)
+            self.table_rows[table] += batch_rows[table]
+        return bytes(output)
+
+    def get_truncated_tables(self):
+        """
+            Return (table, rows scripted) for every table that had rows dropped, in script order.
+        """
+        return [(table, self.table_rows[table]) for table in self.table_order
+                if self.table_rows[table] > self.max_rows]
+
+    def format_report(self):
+        truncated_tables = self.get_truncated_tables()
+        if not truncated_tables:
+            return u''
+        return u'Kept the first {} rows of {} tables: {}\n'.format(
+            self.max_rows,
+            len(truncated_tables),
+            u', '.join(u'{} ({} rows)'.format(table, rows) for table, rows in truncated_tables))
+
+
+def limit_rows(max_rows):
+    """
+        Return a pipeline stage keeping the first max_rows rows of every table.
+    """
+    limiter = RowLimiter(max_rows)
+
+    def stage(batches):
+        for batch in batches:
+            batch.data = limiter.limit(batch.data)
+            yield batch
+    stage.limiter = limiter
+    return stage
+
+
+def merge_inserts(max_rows=MAX_ROWS, max_size=DEFAULT_MAX_SIZE, go_interval_rows=GO_INTERVAL_ROWS):
+    """
+        Return a pipeline stage merging single row INSERT statements into multi row INSERT statements.
+    """
+    merger = InsertMerger(max_rows, max_size, go_interval_rows)
+
+    def stage(batches):
+        for batch in batches:
+            for data in merger.merge(batch.data):
+                yield scripterpipeline.ScriptBatch(data, batch.index, batch.object_type, batch.schema, batch.name)
+    stage.merger = merger
+    return stage
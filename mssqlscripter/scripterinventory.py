@@ -0,0 +1,121 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import mssqlscripter.jsonrpc.contracts.scriptingservice as scripting
+import mssqlscripter.scripterlogging as scripterlogging
+import mssqlscripter.scriptersharding as scriptersharding
+import mssqlscripter.sqltoolsclient as sqltoolsclient
+
+logger = logging.getLogger(u'mssqlscripter.scripterinventory')
+
+INVENTORY_CACHE_FILE_NAME = u'inventory-cache.json'
+DEFAULT_INVENTORY_TTL = 300
+INVENTORY_FORMATS = [u'json', u'tsv']
+
+
+def get_inventory_key(parameters):
+    """
+        Digest of the connection and everything deciding which objects are in the plan.
+    """
+    request_parameters = scripting.ScriptingParams(parameters).format()
+    # The plan does not depend on where the script would be written.
+    del request_parameters[u'FilePath']
+    del request_parameters[u'ScriptOptions'][u'AppendToFile']
+    # Connection strings carry credentials, only a digest is stored.
+    return hashlib.sha256(json.dumps(request_parameters, sort_keys=True).encode(u'utf-8')).hexdigest()
+
+
+class InventoryCache(object):
+    """
+        Object inventories of recent plans by connection and filters, valid for ttl seconds.
+    """
+
+    def __init__(self, ttl=DEFAULT_INVENTORY_TTL, cache_path=None):
+        self.ttl = ttl
+        self.cache_path = cache_path or os.path.join(scripterlogging.get_config_log_dir(), INVENTORY_CACHE_FILE_NAME)
+
+    def get(self, key):
+        """
+            Return the cached inventory, or None if it is missing or expired.
+        """
+        entry = self._load().get(key)
+        if entry and time.time() - entry[u'time'] < self.ttl:
+            return entry[u'objects']
+        return None
+
+    def put(self, key, scripting_objects):
+        now = time.time()
+        # Expired entries are dropped whenever a inventory is added.
+        inventories = dict(
+            (cached_key, entry) for cached_key, entry in self._load().items() if now - entry[u'time'] < self.ttl)
+        inventories[key] = {u'time': now, u'objects': scripting_objects}
+        try:
+            with io.open(self.cache_path, u'w', encoding=u'utf-8') as cache_file:
+                cache_file.write(json.dumps(inventories, ensure_ascii=False))
+        except (IOError, OSError) as error:
+            logger.warning(u'Unable to save the object inventory: {}'.format(error))
+
+    def _load(self):
+        try:
+            with io.open(self.cache_path, encoding=u'utf-8') as cache_file:
+                return json.loads(cache_file.read())
+        except (IOError, OSError, ValueError):
+            return {}
+
+
+def list_objects(parameters, ttl=DEFAULT_INVENTORY_TTL, enable_logging=False, cache_path=None):
+    """
+        Return the scripting objects of the plan, from the inventory cache if a plan was captured within ttl
+        seconds, or None if the request completed without a plan.
+    """
+    key = get_inventory_key(parameters)
+    inventory_cache = InventoryCache(ttl, cache_path)
+    if ttl > 0:
+        scripting_objects = inventory_cache.get(key)
+        if scripting_objects is not None:
+            logger.info(u'Using cached inventory of {} objects'.format(len(scripting_objects)))
+            return scripting_objects
+
+    sql_tools_client = None
+    temp_dir = tempfile.mkdtemp(prefix=u'mssqlscripter_')
+    try:
+        sql_tools_client = sqltoolsclient.start_tools_service(enable_logging)
+        # The request is cancelled as soon as the plan arrives.
+        scripting_objects = scriptersharding.collect_inventory(sql_tools_client, parameters, temp_dir)
+    finally:
+        if sql_tools_client:
+            sql_tools_client.shutdown()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    if scripting_objects is not None and ttl > 0:
+        inventory_cache.put(key, scripting_objects)
+    return scripting_objects
+
+
+def write_inventory(scripting_objects, output_format, output):
+    """
+        Write the inventory to a text output as a JSON array or as tab separated values with a header line.
+    """
+    scripting_objects = [
+        {u'type': scripting_object[u'type'], u'schema': scripting_object[u'schema'], u'name': scripting_object[u'name']}
+        for scripting_object in scripting_objects]
+
+    if output_format == u'json':
+        output.write(json.dumps(scripting_objects, indent=2, ensure_ascii=False))
+        output.write(u'\n')
+    else:
+        output.write(u'type\tschema\tname\n')
+        for scripting_object in scripting_objects:
+            output.write(u'{}\t{}\t{}\n'.format(
+                scripting_object[u'type'], scripting_object[u'schema'] or u'', scripting_object[u'name']))
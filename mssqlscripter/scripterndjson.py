@@ -0,0 +1,163 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+from collections import deque
+
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import mssqlscripter.jsonrpc.contracts.scriptingservice as scripting
+import mssqlscripter.scripteroutput as scripteroutput
+import mssqlscripter.scriptersharding as scriptersharding
+import mssqlscripter.scriptersplitter as scriptersplitter
+
+logger = logging.getLogger(u'mssqlscripter.scripterndjson')
+
+
+class NdjsonObjectWriter(object):
+    """
+        Split a script with descriptive headers into it's objects and write every object as a JSON line with
+        it's schema, name, type, script, length in bytes and scripting duration in seconds.
+
+        Objects are written in script order as soon as the next object started and the tools service reported
+        the object completed. The script before the first object, e.g. USE [database], is not a object and
+        is skipped.
+    """
+
+    def __init__(self, output, include_headers=True):
+        self.output = output
+        self.include_headers = include_headers
+        self.matcher = scriptersplitter.HeaderObjectMatcher()
+        self.lock = threading.Lock()
+        self.buffer = bytearray()
+        self.current_object = None
+        self.current_script = bytearray()
+        # Objects whose script is complete, waiting for their Completed notification.
+        self.completed_objects = deque()
+        self.started_times = {}
+        self.durations = {}
+        self.object_count = 0
+
+    def handle_response(self, response):
+        """
+            Learn the plan and object durations from the responses of the scripting request.
+        """
+        with self.lock:
+            if isinstance(response, scripting.ScriptPlanNotificationEvent):
+                self.matcher.add(response.scripting_objects)
+            elif isinstance(response, scripting.ScriptProgressNotificationEvent):
+                key = scriptersharding.get_object_key(response.scripting_object)
+                if response.status == u'Progress':
+                    self.started_times[key] = time.time()
+                elif key in self.started_times:
+                    self.durations[key] = time.time() - self.started_times.pop(key)
+                self._write_completed_objects()
+
+    def write(self, data):
+        with self.lock:
+            self.buffer.extend(data)
+            # Headers are matched on complete lines only.
+            line_end = self.buffer.rfind(b'\n') + 1
+            if not line_end:
+                return
+
+            lines = bytes(self.buffer[:line_end])
+            del self.buffer[:line_end]
+            position = 0
+            for match in scriptersplitter.HEADER_PATTERN.finditer(lines):
+                scripting_object = self.matcher.match(match)
+                if scripting_object:
+                    self.current_script.extend(lines[position:match.start()])
+                    self._complete_object()
+                    self.current_object = scripting_object
+                    position = match.start()
+            self.current_script.extend(lines[position:])
+            self._write_completed_objects()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        """
+            Write every remaining object, with the duration if it was reported.
+        """
+        with self.lock:
+            self.current_script.extend(self.buffer)
+            self.buffer = bytearray()
+            self._complete_object()
+            self._write_completed_objects(final=True)
+
+    def _complete_object(self):
+        if self.current_object:
+            self.completed_objects.append((self.current_object, bytes(self.current_script)))
+        self.current_object = None
+        self.current_script = bytearray()
+
+    def _write_completed_objects(self, final=False):
+        while self.completed_objects:
+            scripting_object, script = self.completed_objects[0]
+            key = scriptersharding.get_object_key(scripting_object)
+            if key not in self.durations and not final:
+                break
+            self.completed_objects.popleft()
+
+            if not self.include_headers:
+                script = scriptersplitter.HEADER_LINE_PATTERN.sub(b'', script)
+            duration = self.durations.pop(key, None)
+            line = json.dumps({
+                u'schema': scripting_object[u'schema'],
+                u'name': scripting_object[u'name'],
+                u'type': scripting_object[u'type'],
+                u'script': script.decode(u'utf-8', u'replace'),
+                u'bytes': len(script),
+                u'duration': round(duration, 3) if duration is not None else None}, ensure_ascii=False)
+            self.output.write(line.encode(u'utf-8') + b'\n')
+            self.output.flush()
+            self.object_count += 1
+
+
+class NdjsonScripter(object):
+    """
+        Follow the spool file the tools service writes and stream it's objects as JSON lines to the file path,
+        or stdout when no file path was given.
+
+        Usage:
+            ndjson_scripter = NdjsonScripter(parameters)    # Redirects parameters.FilePath.
+            ndjson_scripter.start()
+            ... script, passing responses to ndjson_scripter.handle_response ...
+            ndjson_scripter.finish()
+    """
+
+    def __init__(self, parameters):
+        self.target_file = io.open(parameters.FilePath, u'wb') if parameters.FilePath else None
+        self.writer = NdjsonObjectWriter(
+            self.target_file or scripteroutput.get_binary_stdout(), parameters.IncludeDescriptiveHeaders)
+        self.spool_path = tempfile.NamedTemporaryFile(prefix=u'mssqlscripter_', delete=False).name
+        parameters.FilePath = self.spool_path
+        parameters.AppendToFile = False
+        # Objects are split out of the script by their headers.
+        parameters.IncludeDescriptiveHeaders = True
+        self.follower = scripteroutput.ScriptFileFollower(self.spool_path, self.writer, line_separator=None)
+
+    def handle_response(self, response):
+        self.writer.handle_response(response)
+
+    def start(self):
+        self.follower.start()
+
+    def finish(self):
+        try:
+            self.follower.finish()
+            self.writer.close()
+            logger.info(u'Wrote {} objects as JSON lines'.format(self.writer.object_count))
+        finally:
+            if self.target_file:
+                self.target_file.close()
+            os.remove(self.spool_path)
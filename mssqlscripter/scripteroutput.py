@@ -0,0 +1,233 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+
+import mssqlscripter.scriptersplitter as scriptersplitter
+
+logger = logging.getLogger(u'mssqlscripter.scripteroutput')
+
+
+def get_binary_stdout():
+    """
+        Retrieve stdout for writing bytes. Python 2 writes bytes to sys.stdout itself.
+    """
+    return getattr(sys.stdout, u'buffer', sys.stdout)
+
+
+class ScriptFileFollower(object):
+    """
+        Copy a script file to a output stream while the tools service is still writing it, so consumers of the
+        output start immediately. Memory use is bounded by the chunk size.
+
+        Line endings are translated to the platform line separator, as reading the script in text mode and
+        writing it to sys.stdout did. A line separator of None copies the bytes unchanged.
+
+        Usage:
+            follower = ScriptFileFollower(file_path, get_binary_stdout())
+            follower.start()
+            ... script to file_path ...
+            follower.finish()
+    """
+    CHUNK_SIZE = 1024 * 1024
+    # Longest time to wait for the file to grow before reading again.
+    POLL_INTERVAL = .05
+
+    def __init__(self, file_path, output, chunk_size=CHUNK_SIZE, line_separator=os.linesep):
+        self.file_path = file_path
+        self.output = output
+        self.chunk_size = chunk_size
+        self.line_separator = line_separator.encode(u'ascii') if line_separator is not None else None
+        # A carriage return ending a chunk may start a CRLF completed by the next chunk.
+        self.pending_carriage_return = False
+        self.bytes_written = 0
+        self.exception = None
+        self.finished = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """
+            Start following the file on a background thread.
+        """
+        self.thread = threading.Thread(target=self._follow, name=u'Script_File_Follower_Thread')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def finish(self):
+        """
+            Copy the rest of the file once the tools service stopped writing it, and wait for the copy to complete.
+        Exceptions raised:
+            IOError
+                Writing to the output failed, e.g. the consumer closed the pipe.
+        """
+        self.finished.set()
+        if self.thread:
+            self.thread.join()
+        if self.exception:
+            raise self.exception
+
+    def _follow(self):
+        try:
+            with io.open(self.file_path, u'rb') as script_file:
+                while True:
+                    # Check before reading, so the read after finish() reaches the final end of the file.
+                    finished = self.finished.is_set()
+                    chunk = script_file.read(self.chunk_size)
+                    if chunk:
+                        self._write(chunk)
+                    elif finished:
+                        self._write(b'', final=True)
+                        break
+                    else:
+                        self.finished.wait(self.POLL_INTERVAL)
+        except Exception as error:
+            logger.debug(u'Script file follower encountered exception {}'.format(error))
+            self.exception = error
+
+        logger.info(u'Script file follower wrote {} bytes'.format(self.bytes_written))
+
+    def _write(self, chunk, final=False):
+        """
+            Write a chunk with universal newlines translated to the line separator. UTF-8 never encodes other
+            characters with carriage return or line feed bytes, so chunks can be translated independently.
+        """
+        if self.line_separator is not None:
+            chunk = self._translate_newlines(chunk, final)
+
+        if chunk:
+            self.output.write(chunk)
+            self.output.flush()
+            self.bytes_written += len(chunk)
+
+    def _translate_newlines(self, chunk, final):
+        if self.pending_carriage_return:
+            chunk = b'\r' + chunk
+            self.pending_carriage_return = False
+        if not final and chunk.endswith(b'\r'):
+            chunk = chunk[:-1]
+            self.pending_carriage_return = True
+
+        chunk = chunk.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+        if self.line_separator != b'\n':
+            chunk = chunk.replace(b'\n', self.line_separator)
+        return chunk
+
+
+class RotatingScriptWriter(object):
+    """
+        Write a script to numbered chunk files, rolling over to the next chunk at the first GO batch separator
+        after a chunk reached max_chunk_size. A manifest lists every chunk with the objects it contains, and is
+        rewritten as each chunk completes so loaders can start on complete chunks.
+
+        A script.sql target is written to script.001.sql, script.002.sql, ... and script.sql.manifest.json.
+    """
+    MANIFEST_EXTENSION = u'.manifest.json'
+
+    def __init__(self, file_path, max_chunk_size):
+        self.file_path = file_path
+        self.max_chunk_size = max_chunk_size
+        self.splitter = scriptersplitter.GoBatchSplitter()
+        self.chunks = []
+        self.chunk_file = None
+        self.chunk_objects = set()
+        self.manifest_path = file_path + self.MANIFEST_EXTENSION
+
+    def write(self, data):
+        for piece, batch_complete in self.splitter.feed(data):
+            self._write_piece(piece, batch_complete)
+
+    def flush(self):
+        if self.chunk_file:
+            self.chunk_file.flush()
+
+    def close(self):
+        """
+            Complete the last chunk and write the final manifest.
+        """
+        for piece, batch_complete in self.splitter.close():
+            self._write_piece(piece, batch_complete)
+        self._complete_chunk()
+        self._write_manifest(complete=True)
+
+    def get_chunk_path(self, index):
+        base_path, extension = os.path.splitext(self.file_path)
+        return u'{}.{:03d}{}'.format(base_path, index, extension or u'.sql')
+
+    def _write_piece(self, piece, batch_complete):
+        if not piece:
+            return
+
+        if not self.chunk_file:
+            chunk_path = self.get_chunk_path(len(self.chunks) + 1)
+            self.chunk_file = io.open(chunk_path, u'wb')
+            self.chunk_objects = set()
+            self.chunks.append({
+                u'file': os.path.basename(chunk_path), u'bytes': 0, u'objects': [], u'complete': False})
+
+        chunk = self.chunks[-1]
+        self.chunk_file.write(piece)
+        chunk[u'bytes'] += len(piece)
+        for script_object in scriptersplitter.find_script_objects(piece):
+            if script_object not in self.chunk_objects:
+                self.chunk_objects.add(script_object)
+                chunk[u'objects'].append({u'type': script_object[0], u'name': script_object[1]})
+
+        if batch_complete and chunk[u'bytes'] >= self.max_chunk_size:
+            self._complete_chunk()
+            self._write_manifest(complete=False)
+
+    def _complete_chunk(self):
+        if self.chunk_file:
+            self.chunk_file.close()
+            self.chunk_file = None
+            self.chunks[-1][u'complete'] = True
+
+    def _write_manifest(self, complete):
+        manifest = {
+            u'script': os.path.basename(self.file_path),
+            u'max_chunk_size': self.max_chunk_size,
+            u'complete': complete,
+            u'chunks': self.chunks}
+        # Replace the manifest in one step, so readers never see a partial manifest.
+        temp_path = self.manifest_path + u'.tmp'
+        with io.open(temp_path, u'w', encoding=u'utf-8') as manifest_file:
+            manifest_file.write(json.dumps(manifest, indent=2, ensure_ascii=False))
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+        os.rename(temp_path, self.manifest_path)
+
+
+class ScriptRotator(object):
+    """
+        Follow the spool file the tools service writes and rotate it into chunk files.
+
+        Usage:
+            script_rotator = ScriptRotator(parameters)    # Redirects parameters.FilePath.
+            script_rotator.start()
+            ... script ...
+            script_rotator.finish()
+    """
+
+    def __init__(self, parameters):
+        self.writer = RotatingScriptWriter(parameters.FilePath, parameters.MaxFileSize)
+        self.spool_path = tempfile.NamedTemporaryFile(prefix=u'mssqlscripter_', delete=False).name
+        parameters.FilePath = self.spool_path
+        self.follower = ScriptFileFollower(self.spool_path, self.writer, line_separator=None)
+
+    def start(self):
+        self.follower.start()
+
+    def finish(self):
+        try:
+            self.follower.finish()
+            self.writer.close()
+        finally:
+            os.remove(self.spool_path)
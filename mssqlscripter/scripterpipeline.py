@@ -0,0 +1,315 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+from collections import deque
+from queue import Queue
+
+import ast
+import importlib
+import inspect
+import io
+import logging
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+
+import mssqlscripter.scripterindex as scripterindex
+import mssqlscripter.scripteroutput as scripteroutput
+import mssqlscripter.scriptersplitter as scriptersplitter
+
+logger = logging.getLogger(u'mssqlscripter.scripterpipeline')
+
+# Batches waiting for the stages, bounds memory when the stages are slower than the tools service.
+MAX_QUEUED_BATCHES = 64
+END_OF_SCRIPT = None
+# A stage given as module:attribute, or a stage factory with literal arguments as module:attribute(arguments).
+STAGE_NAME_PATTERN = re.compile(r'^([\w.]+):(\w+)(?:\((.*)\))?$', re.DOTALL)
+
+
+class ScriptBatch(object):
+    """
+        A GO separated batch of the script, including it's GO line, and the object it belongs to. Batches
+        without a object of their own, e.g. indexes, belong to the object before them.
+    """
+
+    def __init__(self, data, index, object_type=None, schema=None, name=None):
+        self.data = data
+        self.index = index
+        self.object_type = object_type
+        self.schema = schema
+        self.name = name
+
+    def __repr__(self):
+        return u'ScriptBatch({}, {} {}.{}, {} bytes)'.format(
+            self.index, self.object_type, self.schema, self.name, len(self.data))
+
+
+class Pipeline(object):
+    """
+        Split a script into batches while it is streamed and run them through stages on a background thread,
+        writing the batches the last stage yields to output.
+
+        A stage is a callable taking a iterable of ScriptBatch and returning a iterable of ScriptBatch, usually
+        a generator function. Stages may modify, drop, split or hold back batches. Use ProcessStage for CPU
+        heavy work.
+
+        Usage:
+            pipeline = Pipeline([strip_headers, rename_schema(u'dbo', u'staging')], output)
+            pipeline.write(chunk)
+            ...
+            pipeline.close()
+    """
+
+    def __init__(self, stages, output):
+        self.stages = stages
+        self.output = output
+        self.splitter = scriptersplitter.GoBatchSplitter()
+        self.batch_pieces = []
+        self.batch_count = 0
+        self.current_object = (None, None, None)
+        self.queue = Queue(MAX_QUEUED_BATCHES)
+        self.exception = None
+        self.end_of_script = False
+        self.thread = threading.Thread(target=self._run, name=u'Script_Pipeline_Thread')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def write(self, data):
+        for piece, batch_complete in self.splitter.feed(data):
+            self._add_piece(piece, batch_complete)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        """
+            Run the last batch through the stages and wait for them to complete.
+        Exceptions raised:
+            Exception
+                Raised by a stage or writing to the output.
+        """
+        for piece, batch_complete in self.splitter.close():
+            self._add_piece(piece, batch_complete)
+        self.queue.put(END_OF_SCRIPT)
+        self.thread.join()
+        if self.exception:
+            raise self.exception
+
+    def _add_piece(self, piece, batch_complete):
+        self.batch_pieces.append(piece)
+        if not batch_complete:
+            return
+
+        data = b''.join(self.batch_pieces)
+        self.batch_pieces = []
+        for object_type, scripted_name in scriptersplitter.find_script_objects(data):
+            if object_type in scripterindex.INDEXED_TYPES:
+                self.current_object = (object_type,) + scripterindex.split_name(scripted_name)
+                break
+        self.queue.put(ScriptBatch(data, self.batch_count, *self.current_object))
+        self.batch_count += 1
+
+    def _get_batches(self):
+        while True:
+            batch = self.queue.get()
+            if batch is END_OF_SCRIPT:
+                self.end_of_script = True
+                return
+            yield batch
+
+    def _run(self):
+        batches = self._get_batches()
+        try:
+            for stage in self.stages:
+                batches = stage(batches)
+            for batch in batches:
+                self.output.write(batch.data)
+                self.output.flush()
+        except Exception as error:
+            logger.debug(u'Script pipeline encountered exception {}'.format(error))
+            self.exception = error
+        finally:
+            # Keep taking batches after a stage failed, so the script is not blocked on a full queue.
+            if not self.end_of_script:
+                for _ in self._get_batches():
+                    pass
+
+
+class ProcessStage(object):
+    """
+        Run a function over every batch on a pool of processes, keeping the batch order. The function
+        returns the batch, or None to drop it, and has to be importable by the worker processes, e.g. a
+        module level function. At most twice as many batches as processes are in flight.
+    """
+
+    def __init__(self, function, processes=None):
+        self.function = function
+        self.processes = processes or multiprocessing.cpu_count()
+
+    def __call__(self, batches):
+        pool = multiprocessing.Pool(self.processes)
+        try:
+            pending_results = deque()
+            for batch in batches:
+                pending_results.append(pool.apply_async(self.function, (batch,)))
+                if len(pending_results) >= self.processes * 2:
+                    batch = pending_results.popleft().get()
+                    if batch is not None:
+                        yield batch
+            while pending_results:
+                batch = pending_results.popleft().get()
+                if batch is not None:
+                    yield batch
+        finally:
+            pool.terminate()
+            pool.join()
+
+
+def stage_factory(function):
+    """
+        Mark a function returning a stage, so it is only loaded with it's arguments.
+    """
+    function.stage_factory = True
+    return function
+
+
+def strip_headers(batches):
+    """
+        Remove the descriptive headers.
+    """
+    for batch in batches:
+        batch.data = scriptersplitter.HEADER_LINE_PATTERN.sub(b'', batch.data)
+        yield batch
+
+
+@stage_factory
+def rename_schema(old_schema, new_schema):
+    """
+        Return a stage renaming bracketed references to a schema, e.g. [dbo].[Customers].
+    """
+    pattern = re.compile(re.escape(u'[{}].'.format(old_schema).encode(u'utf-8')))
+    replacement = u'[{}].'.format(new_schema).encode(u'utf-8')
+
+    def stage(batches):
+        for batch in batches:
+            batch.data = pattern.sub(lambda match: replacement, batch.data)
+            if batch.schema == old_schema:
+                batch.schema = new_schema
+            yield batch
+    return stage
+
+
+@stage_factory
+def drop_batches(pattern):
+    """
+        Return a stage dropping the batches matching a regular expression over their bytes, e.g.
+        br'^SET ANSI_PADDING'. A text pattern is matched as UTF-8.
+    """
+    if not isinstance(pattern, bytes):
+        pattern = pattern.encode(u'utf-8')
+    pattern = re.compile(pattern, re.MULTILINE | re.IGNORECASE)
+
+    def stage(batches):
+        for batch in batches:
+            if not pattern.search(batch.data):
+                yield batch
+    return stage
+
+
+def load_stage(stage_name):
+    """
+        Import a stage given as module:attribute, e.g. mssqlscripter.scripterpipeline:strip_headers, or
+        create one with a stage factory given as module:attribute(arguments) with literal arguments, e.g.
+        mssqlscripter.scripterpipeline:rename_schema('dbo', 'staging').
+    Exceptions raised:
+        ValueError
+            The name is not module:attribute or module:attribute(arguments), or does not load a stage.
+        ImportError, AttributeError
+            The stage does not exist.
+    """
+    match = STAGE_NAME_PATTERN.match(stage_name)
+    if not match:
+        raise ValueError(
+            u'Pipeline stages are given as module:attribute or module:attribute(arguments), not {}'.format(stage_name))
+    module_name, attribute, arguments = match.groups()
+    stage = getattr(importlib.import_module(module_name), attribute)
+
+    if arguments is not None:
+        try:
+            arguments = ast.literal_eval(u'({},)'.format(arguments)) if arguments.strip() else ()
+        except (SyntaxError, ValueError):
+            raise ValueError(u'Arguments of pipeline stage {} are not literals'.format(stage_name))
+        if not callable(stage):
+            raise ValueError(u'{} is not a stage factory'.format(stage_name))
+        try:
+            stage = stage(*arguments)
+        except Exception as error:
+            raise ValueError(u'Unable to create pipeline stage {}: {}'.format(stage_name, error))
+    elif getattr(stage, u'stage_factory', False):
+        raise ValueError(u'{} returns a stage, give it\'s arguments as {}(arguments)'.format(stage_name, stage_name))
+
+    if not callable(stage) or getattr(stage, u'stage_factory', False) or not accepts_batches(stage):
+        raise ValueError(u'{} is not a stage taking the batches of the script'.format(stage_name))
+    return stage
+
+
+def accepts_batches(stage):
+    """
+        Check a callable can be called with the batches alone.
+    """
+    try:
+        signature = inspect.signature(stage)
+    except AttributeError:
+        # Python 2 has no signatures, the stage is checked when it runs.
+        return True
+    except (TypeError, ValueError):
+        # Builtins may have no signature.
+        return True
+
+    try:
+        signature.bind(None)
+    except TypeError:
+        return False
+    return True
+
+
+class ScriptPipeline(object):
+    """
+        Follow the spool file the tools service writes and run it through the pipeline stages to the file path,
+        or stdout when no file path was given.
+
+        Usage:
+            script_pipeline = ScriptPipeline(parameters, stages)    # Redirects parameters.FilePath.
+            script_pipeline.start()
+            ... script ...
+            script_pipeline.finish()
+    """
+
+    def __init__(self, parameters, stages):
+        self.target_file = None
+        if parameters.FilePath:
+            self.target_file = io.open(parameters.FilePath, u'ab' if parameters.AppendToFile else u'wb')
+        self.pipeline = Pipeline(stages, self.target_file or scripteroutput.get_binary_stdout())
+        self.spool_path = tempfile.NamedTemporaryFile(prefix=u'mssqlscripter_', delete=False).name
+        parameters.FilePath = self.spool_path
+        parameters.AppendToFile = False
+        # Stages see the line endings written to the output.
+        self.follower = scripteroutput.ScriptFileFollower(
+            self.spool_path, self.pipeline, line_separator=None if self.target_file else os.linesep)
+
+    def start(self):
+        self.follower.start()
+
+    def finish(self):
+        try:
+            self.follower.finish()
+            self.pipeline.close()
+            logger.info(u'Pipeline processed {} batches'.format(self.pipeline.batch_count))
+        finally:
+            if self.target_file:
+                self.target_file.close()
+            os.remove(self.spool_path)
@@ -0,0 +1,142 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import io
+import json
+import logging
+import sys
+import time
+
+import mssqlscripter.jsonrpc.contracts.scriptingservice as scripting
+import mssqlscripter.scriptersharding as scriptersharding
+
+logger = logging.getLogger(u'mssqlscripter.scripterretry')
+
+DEFAULT_RETRY_COUNT = 2
+# Seconds before the first retry pass, doubled for every further pass.
+RETRY_BACKOFF = 2.0
+
+
+class FailedObject(object):
+    """
+        A object the tools service reported with the Error status, and the outcome of it's retries.
+    """
+
+    def __init__(self, scripting_object):
+        self.scripting_object = scripting_object
+        self.attempts = 1
+        self.error_message = None
+        self.error_details = None
+        self.recovered = False
+
+    def format(self):
+        """
+            Format the failure into a dictionary.
+        """
+        return {
+            u'type': self.scripting_object.get(u'type'),
+            u'schema': self.scripting_object.get(u'schema'),
+            u'name': self.scripting_object.get(u'name'),
+            u'attempts': self.attempts,
+            u'recovered': self.recovered,
+            u'error_message': self.error_message,
+            u'error_details': self.error_details}
+
+
+class FailedObjectCollector(object):
+    """
+        Collect the objects reported with the Error status from the responses of a request, passing every
+        response on to callback.
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.failed_objects = {}
+
+    def __call__(self, response):
+        if isinstance(response, scripting.ScriptProgressNotificationEvent) and response.status == u'Error':
+            key = scriptersharding.get_object_key(response.scripting_object)
+            failed_object = self.failed_objects.setdefault(key, FailedObject(response.scripting_object))
+            failed_object.error_message = response.error_message
+            failed_object.error_details = response.error_details
+
+        if self.callback:
+            self.callback(response)
+
+
+def retry_failed_objects(
+        sql_tools_client,
+        parameters,
+        failed_objects,
+        retry_count=DEFAULT_RETRY_COUNT,
+        callback=None,
+        backoff=RETRY_BACKOFF,
+        sleep=time.sleep):
+    """
+        Script the failed objects again with requests including only them, for up to retry_count passes
+        with exponential backoff. Objects of a single file are appended to it. Returns every failed object
+        with it's outcome.
+    """
+    pending_objects = dict(failed_objects)
+    for retry in range(retry_count):
+        if not pending_objects:
+            break
+
+        delay = backoff * 2 ** retry
+        logger.info(u'Retrying {} failed objects in {} seconds'.format(len(pending_objects), delay))
+        sleep(delay)
+
+        retry_parameters = dict(parameters)
+        # A single file already holds every other object, files per object are rewritten.
+        retry_parameters[u'AppendToFile'] = parameters[u'ScriptDestination'] == u'ToSingleFile'
+        retry_parameters[u'ContinueScriptingOnError'] = True
+        # Dependencies of the failed objects were scripted by the first request.
+        retry_parameters[u'GenerateScriptForDependentObjects'] = False
+
+        request = sql_tools_client.create_request(u'scripting_request', retry_parameters)
+        for failed_object in pending_objects.values():
+            request.params.include_objects.add_scripting_object(
+                failed_object.scripting_object[u'type'],
+                failed_object.scripting_object[u'schema'],
+                failed_object.scripting_object[u'name'])
+        request.execute()
+
+        collector = FailedObjectCollector(callback)
+        complete_event = request.result(callback=collector)
+
+        for key, failed_object in list(pending_objects.items()):
+            failed_object.attempts += 1
+            if key in collector.failed_objects:
+                failed_object.error_message = collector.failed_objects[key].error_message
+                failed_object.error_details = collector.failed_objects[key].error_details
+            elif complete_event and not complete_event.has_error:
+                failed_object.recovered = True
+                del pending_objects[key]
+
+    return list(failed_objects.values())
+
+
+def report_failed_objects(failed_objects, report_path=None, output=sys.stderr):
+    """
+        Write a line per object that could not be scripted to output, and every failed object with it's
+        outcome as JSON to report_path.
+    """
+    for failed_object in failed_objects:
+        if not failed_object.recovered:
+            output.write(u'Failed to script {} {} after {} attempts: {}\n'.format(
+                failed_object.scripting_object.get(u'type'),
+                u'.'.join(name for name in (
+                    failed_object.scripting_object.get(u'schema'), failed_object.scripting_object.get(u'name'))
+                    if name),
+                failed_object.attempts,
+                failed_object.error_message))
+
+    if report_path:
+        report = {
+            u'recovered': sum(1 for failed_object in failed_objects if failed_object.recovered),
+            u'failed': sum(1 for failed_object in failed_objects if not failed_object.recovered),
+            u'objects': [failed_object.format() for failed_object in failed_objects]}
+        with io.open(report_path, u'w', encoding=u'utf-8') as report_file:
+            report_file.write(json.dumps(report, indent=2, ensure_ascii=False))
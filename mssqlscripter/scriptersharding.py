@@ -0,0 +1,288 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import mssqlscripter.jsonrpc.contracts.scriptingservice as scripting
+import mssqlscripter.scripterlogging as scripterlogging
+import mssqlscripter.sqltoolsclient as sqltoolsclient
+
+logger = logging.getLogger(u'mssqlscripter.scriptersharding')
+
+HISTORY_FILE_NAME = u'scripting-history.json'
+
+# Estimated relative cost of scripting a object of each type when no durations were recorded.
+TYPE_COSTS = {
+    u'Table': 4.0,
+    u'View': 2.0,
+    u'StoredProcedure': 1.0,
+    u'UserDefinedFunction': 1.0,
+    u'Trigger': 1.0,
+}
+DEFAULT_TYPE_COST = 1.0
+# Tables dominate when their data is scripted.
+TABLE_DATA_COST_FACTOR = 10.0
+
+
+def get_object_key(scripting_object):
+    """
+        Identify a scripting object as type.schema.name.
+    """
+    return u'{}.{}.{}'.format(
+        scripting_object[u'type'], scripting_object[u'schema'], scripting_object[u'name'])
+
+
+class ScriptingHistory(object):
+    """
+        Per-object scripting durations recorded by earlier runs against the same database and options.
+    """
+
+    def __init__(self, parameters, history_path=None):
+        self.history_path = history_path or os.path.join(
+            scripterlogging.get_config_log_dir(), HISTORY_FILE_NAME)
+        # Connection strings carry credentials, only a digest is stored.
+        identity = u'{}|{}|{}'.format(
+            parameters[u'ConnectionString'],
+            parameters.get(u'TypeOfDataToScript'),
+            parameters.get(u'ScriptCreateDrop'))
+        self.key = hashlib.sha256(identity.encode(u'utf-8')).hexdigest()
+        self.durations = self._load().get(self.key, {})
+        self.lock = threading.Lock()
+
+    def record(self, scripting_object, duration):
+        with self.lock:
+            self.durations[get_object_key(scripting_object)] = duration
+
+    def save(self):
+        """
+            Merge the recorded durations into the history file.
+        """
+        history = self._load()
+        with self.lock:
+            history[self.key] = self.durations
+        try:
+            with io.open(self.history_path, u'w', encoding=u'utf-8') as history_file:
+                history_file.write(json.dumps(history, ensure_ascii=False))
+        except (IOError, OSError) as error:
+            logger.warning(u'Unable to save scripting history: {}'.format(error))
+
+    def _load(self):
+        try:
+            with io.open(self.history_path, encoding=u'utf-8') as history_file:
+                return json.loads(history_file.read())
+        except (IOError, OSError, ValueError):
+            return {}
+
+
+def estimate_costs(scripting_objects, history, script_data=False):
+    """
+        Estimate the cost of every object. Recorded durations are used when available, type costs
+        scaled to the recorded durations otherwise.
+    """
+    def type_cost(scripting_object):
+        cost = TYPE_COSTS.get(scripting_object[u'type'], DEFAULT_TYPE_COST)
+        if script_data and scripting_object[u'type'] == u'Table':
+            cost *= TABLE_DATA_COST_FACTOR
+        return cost
+
+    type_costs = [type_cost(scripting_object) for scripting_object in scripting_objects]
+    recorded = [history.durations.get(get_object_key(scripting_object)) for scripting_object in scripting_objects]
+
+    recorded_type_cost = sum(cost for cost, duration in zip(type_costs, recorded) if duration is not None)
+    scale = sum(duration for duration in recorded if duration is not None) / recorded_type_cost \
+        if recorded_type_cost else 1.0
+
+    return [duration if duration is not None else cost * scale for cost, duration in zip(type_costs, recorded)]
+
+
+def partition(scripting_objects, costs, shard_count):
+    """
+        Split the objects into at most shard_count contiguous ranges of similar cost, so concatenating
+        the shard outputs keeps the plan order.
+    """
+    shard_count = max(1, min(shard_count, len(scripting_objects)))
+    total_cost = sum(costs)
+    shards = []
+    start = 0
+    accumulated_cost = 0.0
+    for index, cost in enumerate(costs):
+        accumulated_cost += cost
+        remaining_objects = len(scripting_objects) - index - 1
+        remaining_shards = shard_count - len(shards) - 1
+        target_cost = total_cost * (len(shards) + 1) / shard_count
+        # Close the shard at it's cost target, or when every remaining shard needs a object.
+        if remaining_shards and (accumulated_cost >= target_cost or remaining_objects == remaining_shards):
+            shards.append(scripting_objects[start:index + 1])
+            start = index + 1
+
+    shards.append(scripting_objects[start:])
+    return [shard for shard in shards if shard]
+
+
+def collect_inventory(sql_tools_client, parameters, temp_dir):
+    """
+        Return the scripting objects of the plan of a scripting request, cancelled as soon as the plan arrives,
+        or None if the request completed without a plan.
+    """
+    parameters = dict(parameters)
+    # Objects scripted before the cancel arrives are discarded with the temp directory.
+    parameters[u'FilePath'] = os.path.join(temp_dir, u'inventory.sql') \
+        if parameters[u'ScriptDestination'] == u'ToSingleFile' else temp_dir
+    parameters[u'AppendToFile'] = False
+
+    request = sql_tools_client.create_request(u'scripting_request', parameters)
+    request.execute()
+
+    scripting_objects = None
+    while not request.completed():
+        response = request.get_response(timeout=scripting.ScriptingRequest.RESPONSE_WAIT_TIMEOUT)
+        if isinstance(response, scripting.ScriptPlanNotificationEvent):
+            scripting_objects = response.scripting_objects
+            request.cancel()
+
+    return scripting_objects
+
+
+def create_complete_event(callback=None, error_message=None, error_details=None):
+    """
+        Create the ScriptCompleteEvent of a run made of several scripting requests and pass it to callback.
+    """
+    complete_event = scripting.ScriptCompleteEvent({
+        u'operationId': None,
+        u'sequenceNumber': None,
+        u'success': error_message is None,
+        u'canceled': False,
+        u'hasError': error_message is not None,
+        u'errorMessage': error_message,
+        u'errorDetails': error_details})
+    if callback:
+        callback(complete_event)
+    return complete_event
+
+
+class ShardedScripter(object):
+    """
+        Script one database with a scripting request per shard, each on it's own tools service process.
+
+        The object inventory is collected from the plan notification of a request that is cancelled as soon
+        as the plan arrives. Shards are contiguous ranges of the plan, their outputs are concatenated in order.
+    """
+
+    def __init__(self, parameters, shard_count, enable_logging=False, history_path=None):
+        self.parameters = parameters
+        self.shard_count = shard_count
+        self.enable_logging = enable_logging
+        self.history = ScriptingHistory(parameters, history_path)
+        self.callback_lock = threading.Lock()
+
+    def run(self, callback=None):
+        """
+            Script every shard and return a ScriptCompleteEvent for the whole database.
+            Plan and progress events of the shards are passed to callback.
+        """
+        clients = []
+        temp_dir = tempfile.mkdtemp(prefix=u'mssqlscripter_shards_')
+        try:
+            # Every tools service warms up while the inventory is collected.
+            for _ in range(self.shard_count):
+                clients.append(sqltoolsclient.start_tools_service(self.enable_logging))
+
+            scripting_objects = collect_inventory(clients[0], self.parameters, temp_dir)
+            if scripting_objects is None:
+                return create_complete_event(callback, error_message=u'Unable to collect the object inventory')
+
+            script_data = self.parameters.get(u'TypeOfDataToScript') in (u'DataOnly', u'SchemaAndData')
+            shards = partition(
+                scripting_objects,
+                estimate_costs(scripting_objects, self.history, script_data),
+                self.shard_count)
+            logger.info(u'Scripting {} objects in {} shards of {} objects'.format(
+                len(scripting_objects), len(shards), [len(shard) for shard in shards]))
+
+            complete_events = [None] * len(shards)
+            shard_paths = [self._get_shard_path(temp_dir, index) for index in range(len(shards))]
+            threads = [
+                threading.Thread(
+                    target=self._script_shard,
+                    args=(clients[index], shards[index], shard_paths[index], complete_events, index, callback))
+                for index in range(len(shards))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.history.save()
+
+            failed_events = [event for event in complete_events if event is None or event.has_error]
+            if failed_events:
+                error = failed_events[0]
+                return create_complete_event(
+                    callback,
+                    error_message=error.error_message if error else u'Shard did not complete',
+                    error_details=error.error_details if error else None)
+
+            if self.parameters[u'ScriptDestination'] == u'ToSingleFile':
+                self._merge(shard_paths)
+
+            return create_complete_event(callback)
+
+        finally:
+            for client in clients:
+                client.shutdown()
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _script_shard(self, sql_tools_client, shard, file_path, complete_events, index, callback):
+        parameters = dict(self.parameters)
+        parameters[u'FilePath'] = file_path
+        parameters[u'AppendToFile'] = False
+        # The inventory already contains every dependency, each object is scripted by exactly one shard.
+        parameters[u'GenerateScriptForDependentObjects'] = False
+
+        request = sql_tools_client.create_request(u'scripting_request', parameters)
+        for scripting_object in shard:
+            request.params.include_objects.add_scripting_object(
+                scripting_object[u'type'], scripting_object[u'schema'], scripting_object[u'name'])
+        request.execute()
+
+        started = {}
+
+        def handle_response(response):
+            if isinstance(response, scripting.ScriptProgressNotificationEvent):
+                key = get_object_key(response.scripting_object)
+                if response.status == u'Progress':
+                    started[key] = time.time()
+                elif response.status == u'Completed' and key in started:
+                    self.history.record(response.scripting_object, time.time() - started.pop(key))
+
+            if callback and not isinstance(response, scripting.ScriptCompleteEvent):
+                with self.callback_lock:
+                    callback(response)
+
+        complete_events[index] = request.result(callback=handle_response)
+
+    def _get_shard_path(self, temp_dir, index):
+        if self.parameters[u'ScriptDestination'] == u'ToSingleFile':
+            return os.path.join(temp_dir, u'shard_{}.sql'.format(index))
+        # Objects scripted to their own files do not need a merge.
+        return self.parameters[u'FilePath']
+
+    def _merge(self, shard_paths):
+        """
+            Concatenate the shard outputs in plan order into the target file.
+        """
+        mode = u'ab' if self.parameters.get(u'AppendToFile') else u'wb'
+        with io.open(self.parameters[u'FilePath'], mode) as target_file:
+            for shard_path in shard_paths:
+                if os.path.exists(shard_path):
+                    with io.open(shard_path, u'rb') as shard_file:
+                        shutil.copyfileobj(shard_file, target_file)
@@ -0,0 +1,231 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import re
+
+# A GO batch separator line, optionally with a repeat count.
+GO_LINE_PATTERN = re.compile(br'^[ \t]*GO(?:[ \t]+\d+)?[ \t]*\r?\n', re.MULTILINE | re.IGNORECASE)
+
+# Lexer states.
+NORMAL = 0
+STRING = 1
+IDENTIFIER = 2
+LINE_COMMENT = 3
+BLOCK_COMMENT = 4
+
+# Tokens changing the lexer state, searched for in each state.
+STATE_TOKEN_PATTERNS = {
+    NORMAL: re.compile(br"'|\[|--|/\*"),
+    STRING: re.compile(br"'"),
+    IDENTIFIER: re.compile(br'\]\]|\]'),
+    LINE_COMMENT: re.compile(br'\n'),
+    BLOCK_COMMENT: re.compile(br'/\*|\*/'),
+}
+# A quote inside a bracketed identifier, rules out counting quotes.
+IDENTIFIER_QUOTE_PATTERN = re.compile(br"\[[^\]]*'")
+
+# Objects a script statement belongs to: descriptive headers, CREATE and INSERT statements.
+HEADER_PATTERN = re.compile(br'^/\*{6} Object:\s+(\w+)\s+(.+?)\s+Script Date:', re.MULTILINE)
+HEADER_LINE_PATTERN = re.compile(br'^/\*{6} Object:.*?\*{6}/[ \t]*\r?\n', re.MULTILINE)
+CREATE_PATTERN = re.compile(
+    br'^CREATE\s+(TABLE|VIEW|PROCEDURE|FUNCTION|SCHEMA|TYPE|SEQUENCE|SYNONYM|TRIGGER|DATABASE)\s+'
+    br'((?:\[(?:[^\]]|\]\])*\]|[\w@#$]+)(?:\.(?:\[(?:[^\]]|\]\])*\]|[\w@#$]+))*)',
+    re.MULTILINE | re.IGNORECASE)
+INSERT_PATTERN = re.compile(
+    br'^INSERT\s+(?:INTO\s+)?((?:\[(?:[^\]]|\]\])*\]|[\w@#$]+)(?:\.(?:\[(?:[^\]]|\]\])*\]|[\w@#$]+))*)',
+    re.MULTILINE | re.IGNORECASE)
+CREATE_TYPE_NAMES = {
+    b'TABLE': u'Table', b'VIEW': u'View', b'PROCEDURE': u'StoredProcedure', b'FUNCTION': u'UserDefinedFunction',
+    b'SCHEMA': u'Schema', b'TYPE': u'UserDefinedType', b'SEQUENCE': u'Sequence', b'SYNONYM': u'Synonym',
+    b'TRIGGER': u'Trigger', b'DATABASE': u'Database'}
+
+
+class GoBatchSplitter(object):
+    """
+        Split a UTF-8 T-SQL script into GO separated batches while it is streamed.
+
+        GO lines inside string literals, bracketed identifiers and comments are not separators. Every GO
+        token and line ending is ASCII, so the script is split as bytes without decoding it.
+
+        feed() returns the script back as pieces of (bytes, batch_complete). Only the incomplete last line is
+        buffered, so batches of any size stream through in bounded memory.
+
+        Usage:
+            splitter = GoBatchSplitter()
+            for data, batch_complete in splitter.feed(chunk):
+                ...
+            for data, batch_complete in splitter.close():
+                ...
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        # Lexer state at checked_offset, GO lines are searched for from search_offset.
+        self.state = NORMAL
+        self.block_comment_depth = 0
+        self.checked_offset = 0
+        self.search_offset = 0
+        # Bytes of the current batch were returned.
+        self.in_batch = False
+
+    def feed(self, data):
+        """
+            Append data to the script and return the pieces of the script up to it's last line ending.
+        """
+        self.buffer.extend(data)
+        pieces = []
+
+        while True:
+            match = GO_LINE_PATTERN.search(self.buffer, self.search_offset)
+            if not match:
+                break
+
+            self._advance(match.start())
+            if self.state == NORMAL:
+                pieces.append((bytes(self.buffer[:match.end()]), True))
+                self._consume(match.end())
+                self.in_batch = False
+            else:
+                # The GO line is part of a literal or comment, lex it with the rest of the batch.
+                self.search_offset = match.end()
+
+        # Everything up to the last line ending can no longer start a GO line.
+        line_end = self.buffer.rfind(b'\n') + 1
+        if line_end > self.checked_offset:
+            self._advance(line_end)
+            pieces.append((bytes(self.buffer[:line_end]), False))
+            self._consume(line_end)
+            self.in_batch = True
+
+        return pieces
+
+    def close(self):
+        """
+            Return the rest of the script, completing the last batch.
+        """
+        pieces = []
+        if self.buffer or self.in_batch:
+            pieces.append((bytes(self.buffer), True))
+        self.buffer = bytearray()
+        self.checked_offset = self.search_offset = 0
+        self.in_batch = False
+        return pieces
+
+    def _consume(self, offset):
+        del self.buffer[:offset]
+        self.checked_offset = max(self.checked_offset - offset, 0)
+        self.search_offset = max(self.search_offset - offset, 0)
+
+    def _advance(self, end):
+        """
+            Move the lexer state from checked_offset to end, which is always a line start.
+        """
+        start = self.checked_offset
+        self.checked_offset = end
+        if start >= end:
+            return
+
+        if self.state == NORMAL and self._count_quotes(start, end):
+            return
+
+        buffer = self.buffer
+        position = start
+        while position < end:
+            match = STATE_TOKEN_PATTERNS[self.state].search(buffer, position, end)
+            if not match:
+                if self.state == LINE_COMMENT:
+                    # The line comment ended with the line before end.
+                    self.state = NORMAL
+                return
+
+            token = match.group()
+            position = match.end()
+            if self.state == NORMAL:
+                if token == b"'":
+                    self.state = STRING
+                elif token == b'[':
+                    self.state = IDENTIFIER
+                elif token == b'--':
+                    self.state = LINE_COMMENT
+                else:
+                    self.state = BLOCK_COMMENT
+                    self.block_comment_depth = 1
+            elif self.state == BLOCK_COMMENT:
+                # Block comments nest in T-SQL.
+                self.block_comment_depth += 1 if token == b'/*' else -1
+                if self.block_comment_depth == 0:
+                    self.state = NORMAL
+            elif token != b']]':
+                # A doubled quote ends and restarts the string, a doubled bracket is escaped.
+                self.state = NORMAL
+
+    def _count_quotes(self, start, end):
+        """
+            Without comments and quotes in identifiers, the quote count alone decides if the region ends
+            inside a string. This is the common case for data, returns False if the region needs lexing.
+        """
+        region = self.buffer[start:end]
+        if b'--' in region or b'/*' in region or region.count(b'[') != region.count(b']') or \
+                IDENTIFIER_QUOTE_PATTERN.search(region):
+            return False
+
+        if region.count(b"'") % 2:
+            self.state = STRING
+        return True
+
+
+def get_header_name(scripting_object):
+    """
+        Name a scripting object as it's descriptive header does, e.g. [dbo].[Customers].
+    """
+    names = [scripting_object[u'schema'], scripting_object[u'name']] if scripting_object[u'schema'] else \
+        [scripting_object[u'name']]
+    return u'.'.join(u'[{}]'.format(name.replace(u']', u']]')) for name in names)
+
+
+class HeaderObjectMatcher(object):
+    """
+        Match descriptive headers to the scripting objects of a plan. Headers of other objects, e.g.
+        indexes, do not match.
+    """
+
+    def __init__(self, scripting_objects=()):
+        self.objects_by_header = {}
+        self.objects_by_name = {}
+        self.add(scripting_objects)
+
+    def add(self, scripting_objects):
+        for scripting_object in scripting_objects:
+            header_name = get_header_name(scripting_object)
+            self.objects_by_header[(scripting_object[u'type'], header_name)] = scripting_object
+            self.objects_by_name.setdefault(header_name, scripting_object)
+
+    def match(self, header_match):
+        """
+            Return the scripting object of a HEADER_PATTERN match, or None.
+        """
+        header = (header_match.group(1).decode(u'utf-8'), header_match.group(2).decode(u'utf-8'))
+        return self.objects_by_header.get(header) or self.objects_by_name.get(header[1])
+
+
+def find_script_objects(data):
+    """
+        Find the objects a piece of script belongs to, as (type, name) in order of appearance. Names are
+        schema qualified as scripted, e.g. [dbo].[Customers].
+    """
+    found_objects = []
+    for match in HEADER_PATTERN.finditer(data):
+        found_objects.append((match.start(), match.group(1).decode(u'utf-8'), match.group(2).decode(u'utf-8')))
+    for match in CREATE_PATTERN.finditer(data):
+        found_objects.append((match.start(), CREATE_TYPE_NAMES[match.group(1).upper()], match.group(2).decode(u'utf-8')))
+    # Data scripts repeat the table on every row, only it's first INSERT is kept.
+    inserted_tables = set()
+    for match in INSERT_PATTERN.finditer(data):
+        if match.group(1) not in inserted_tables:
+            inserted_tables.add(match.group(1))
+            found_objects.append((match.start(), u'Table', match.group(1).decode(u'utf-8')))
+
+    found_objects.sort()
+    return [(object_type, name) for _, object_type, name in found_objects]
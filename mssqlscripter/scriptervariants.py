@@ -0,0 +1,114 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import io
+import logging
+import os
+import shutil
+import tempfile
+
+import mssqlscripter.jsonrpc.contracts.scriptingservice as scripting
+import mssqlscripter.scriptersharding as scriptersharding
+import mssqlscripter.sqltoolsclient as sqltoolsclient
+
+logger = logging.getLogger(u'mssqlscripter.scriptervariants')
+
+
+def get_variant_path(file_path, script_destination, name):
+    """
+        A single file variant is written next to the file path with it's name before the extension, e.g.
+        script.azure.sql, a file per object variant to a subdirectory of the file path.
+    """
+    if script_destination == u'ToFilePerObject':
+        return os.path.join(file_path, name)
+    root, extension = os.path.splitext(file_path)
+    return u'{}.{}{}'.format(root, name, extension)
+
+
+class VariantScripter(object):
+    """
+        Script several variants of a database, each with it's own scripting options and output, over one tools
+        service process. The object inventory is collected once from the plan notification of a request that
+        is cancelled as soon as the plan arrives, every variant then scripts exactly these objects.
+    """
+
+    def __init__(self, parameters, variants, enable_logging=False):
+        self.parameters = parameters
+        self.variants = variants
+        self.enable_logging = enable_logging
+        self.sql_tools_client = None
+
+    def run(self, callback=None):
+        """
+            Script every variant and return a ScriptCompleteEvent, with a error naming the variants that failed.
+            Plan and progress events of the variants are passed to callback.
+        """
+        temp_dir = tempfile.mkdtemp(prefix=u'mssqlscripter_variants_')
+        try:
+            scripting_objects = scriptersharding.collect_inventory(self._get_client(), self.parameters, temp_dir)
+            if scripting_objects is None:
+                return scriptersharding.create_complete_event(
+                    callback, error_message=u'Unable to collect the object inventory')
+            logger.info(u'Scripting {} objects in {} variants'.format(len(scripting_objects), len(self.variants)))
+
+            failed_variants = []
+            for name, options in self.variants:
+                complete_event = self._script_variant(name, options, scripting_objects, callback)
+                if complete_event.has_error or not complete_event.success:
+                    logger.warning(u'Variant {} failed: {}'.format(name, complete_event.error_message))
+                    failed_variants.append((name, complete_event))
+
+            if failed_variants:
+                return scriptersharding.create_complete_event(
+                    callback,
+                    error_message=u'Variants failed: {}'.format(u', '.join(name for name, _ in failed_variants)),
+                    error_details=u'\n'.join(
+                        u'{}: {}'.format(name, complete_event.error_message)
+                        for name, complete_event in failed_variants))
+
+            return scriptersharding.create_complete_event(callback)
+
+        finally:
+            if self.sql_tools_client:
+                self.sql_tools_client.shutdown()
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _get_client(self):
+        """
+            Return a healthy tools service client, replacing one whose process died.
+        """
+        if self.sql_tools_client and not self.sql_tools_client.is_healthy():
+            self.sql_tools_client.shutdown()
+            self.sql_tools_client = None
+        if not self.sql_tools_client:
+            self.sql_tools_client = sqltoolsclient.start_tools_service(self.enable_logging)
+        return self.sql_tools_client
+
+    def _script_variant(self, name, options, scripting_objects, callback):
+        parameters = dict(self.parameters)
+        parameters.update(options)
+        parameters[u'FilePath'] = get_variant_path(
+            self.parameters[u'FilePath'], self.parameters[u'ScriptDestination'], name)
+        # The inventory already contains every dependency.
+        parameters[u'GenerateScriptForDependentObjects'] = False
+
+        if parameters[u'ScriptDestination'] == u'ToFilePerObject' and not os.path.exists(parameters[u'FilePath']):
+            os.makedirs(parameters[u'FilePath'])
+        if not scripting_objects:
+            # A request without objects would script the whole database.
+            if parameters[u'ScriptDestination'] == u'ToSingleFile' and not parameters.get(u'AppendToFile'):
+                io.open(parameters[u'FilePath'], u'wb').close()
+            return scriptersharding.create_complete_event()
+
+        logger.info(u'Scripting variant {} to {}'.format(name, parameters[u'FilePath']))
+        request = self._get_client().create_request(u'scripting_request', parameters)
+        for scripting_object in scripting_objects:
+            request.params.include_objects.add_scripting_object(
+                scripting_object[u'type'], scripting_object[u'schema'], scripting_object[u'name'])
+        request.execute()
+
+        return request.result(
+            callback=lambda response: callback(response)
+            if callback and not isinstance(response, scripting.ScriptCompleteEvent) else None)
@@ -3,23 +3,97 @@
 # Licensed under the MIT License. See License.txt in the project root for license information.
 # --------------------------------------------------------------------------------------------
 
+import io
 import logging
+import subprocess
+import sys
+import time
+
 import mssqlscripter.jsonrpc.jsonrpcclient as json_rpc_client
 import mssqlscripter.jsonrpc.contracts.scriptingservice as scripting
+import mssqlscripter.mssqltoolsservice as mssqltoolsservice
+import mssqlscripter.scripterlogging as scripterlogging
 
 logger = logging.getLogger(u'mssqlscripter.sqltoolsclient')
 
+# Longest time to wait for the tools service process to exit once killed.
+PROCESS_EXIT_TIMEOUT = 1
+
+
+def start_tools_service(enable_logging=False):
+    """
+        Start the tools service process and return a SqlToolsClient over it's stdio streams.
+        The returned client owns the process and kills it on shutdown.
+    """
+    sqltoolsservice_args = [mssqltoolsservice.get_executable_path()]
+
+    if enable_logging:
+        sqltoolsservice_args.append('--enable-logging')
+        sqltoolsservice_args.append('--log-dir')
+        sqltoolsservice_args.append(scripterlogging.get_config_log_dir())
+
+    logger.debug('Loading mssqltoolsservice with arguments {}'.format(sqltoolsservice_args))
+    tools_service_process = subprocess.Popen(
+        sqltoolsservice_args,
+        bufsize=0,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE)
+
+    # Python 2.7 uses the built-in File type when referencing the subprocess.PIPE.
+    # This built-in type for that version blocks on readinto() because it attempts to fill buffer.
+    # Wrap a FileIO around it to use a different implementation that does not attempt to fill the buffer
+    # on readinto().
+    std_out_wrapped = io.open(
+        tools_service_process.stdout.fileno(),
+        u'rb',
+        buffering=0,
+        closefd=False)
+
+    try:
+        return SqlToolsClient(tools_service_process.stdin, std_out_wrapped, tools_service_process)
+    except Exception:
+        stop_tools_service(tools_service_process)
+        raise
+
+
+def stop_tools_service(tools_service_process):
+    """
+        Kill the tools service process and wait for it to exit.
+    """
+    tools_service_process.kill()
+    # Close the stdout file handle or else we would get a resource warning (found via pytest).
+    # This must be closed after the process is killed, otherwise we would block because the process is using
+    # it's stdout.
+    tools_service_process.stdout.close()
+    # None value indicates process has not terminated.
+    if wait_for_process_exit(tools_service_process, PROCESS_EXIT_TIMEOUT) is None:
+        sys.stderr.write(
+            u'Sql Tools Service process was not shut down properly.')
+
+
+def wait_for_process_exit(process, timeout):
+    """
+        Wait up to timeout seconds for process to exit and return it's exit code, or None if it is still running.
+        Polls since Popen.wait() does not take a timeout on Python 2.
+    """
+    deadline = time.time() + timeout
+    while process.poll() is None and time.time() < deadline:
+        time.sleep(.01)
+
+    return process.poll()
+
 
 class SqlToolsClient(object):
     """
         Create sql tools service requests.
     """
 
-    def __init__(self, input_stream, output_stream):
+    def __init__(self, input_stream, output_stream, tools_service_process=None):
         """
-            Initializes the sql tools client.
+            Initializes the sql tools client. A tools service process passed in is owned by the client.
         """
         self.current_id = 1
+        self.tools_service_process = tools_service_process
         self.json_rpc_client = json_rpc_client.JsonRpcClient(
             input_stream, output_stream)
         self.json_rpc_client.start()
@@ -41,6 +115,28 @@ class SqlToolsClient(object):
 
             return request
 
+    def submit(self, request_type, parameters):
+        """
+            Create and execute a request. The returned request is a handle to wait on with result();
+            many requests can run concurrently over this client's tools service process.
+        """
+        request = self.create_request(request_type, parameters)
+        request.execute()
+        return request
+
+    def is_healthy(self):
+        """
+            Check the tools service process is running and the json rpc client has not failed.
+        """
+        if self.tools_service_process and self.tools_service_process.poll() is not None:
+            return False
+
+        return (self.json_rpc_client.exception is None and
+                self.json_rpc_client.response_thread.is_alive())
+
     def shutdown(self):
         logger.info(u'Shutting down Sql Tools Client')
         self.json_rpc_client.shutdown()
+
+        if self.tools_service_process:
+            stop_tools_service(self.tools_service_process)
@@ -0,0 +1,173 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+from collections import deque
+
+import io
+
+import mssqlscripter.jsonrpc.contracts.scriptingservice as scripting
+import mssqlscripter.sqltoolsclient as sqltoolsclient
+
+OPERATION_ID = u'1'
+
+
+def table(name, schema=u'dbo'):
+    return {u'type': u'Table', u'schema': schema, u'name': name}
+
+
+def complete_event(error_message=None):
+    return scripting.ScriptCompleteEvent({
+        u'operationId': OPERATION_ID, u'sequenceNumber': None, u'success': error_message is None,
+        u'canceled': False, u'hasError': error_message is not None, u'errorMessage': error_message,
+        u'errorDetails': None})
+
+
+def progress_event(scripting_object, status, error_message=None):
+    return scripting.ScriptProgressNotificationEvent({
+        u'operationId': OPERATION_ID, u'sequenceNumber': None, u'status': status, u'completedCount': 0,
+        u'totalCount': 1, u'scriptingObject': scripting_object, u'errorMessage': error_message,
+        u'errorDetails': None})
+
+
+def patch_tools_service(test_case, create_client=None):
+    """
+        Replace sqltoolsclient.start_tools_service with fake clients until the test completes. Returns the
+        list every started client is added to.
+    """
+    started_clients = []
+    start_tools_service = sqltoolsclient.start_tools_service
+
+    def start_fake_tools_service(enable_logging=False):
+        client = (create_client or FakeToolsClient)()
+        started_clients.append(client)
+        return client
+
+    sqltoolsclient.start_tools_service = start_fake_tools_service
+    test_case.addCleanup(setattr, sqltoolsclient, u'start_tools_service', start_tools_service)
+    return started_clients
+
+
+class FakeToolsClient(object):
+    """
+        Tools service client recording it's requests. A request scripts the objects it includes, or the
+        plan without any, reporting a ScriptResponse, the plan, a progress notification per object and
+        the ScriptCompleteEvent.
+
+        failures
+            Number of requests a object fails in, by name.
+        die
+            The process dies on it's first request.
+        failing_options
+            Requests with these scripting options fail on their first object.
+        write_scripts
+            Write the name of every scripted object to a single file.
+    """
+
+    def __init__(self, plan=None, failures=None, die=False, failing_options=None, write_scripts=False):
+        self.plan = plan or [table(u'T1')]
+        self.failures = dict(failures or {})
+        self.die = die
+        self.failing_options = failing_options
+        self.write_scripts = write_scripts
+        self.healthy = True
+        self.shut_down = False
+        self.requests = []
+
+    @property
+    def parameters(self):
+        return [request.parameters for request in self.requests]
+
+    @property
+    def file_paths(self):
+        return [request.parameters[u'FilePath'] for request in self.requests]
+
+    @property
+    def included_names(self):
+        return [[scripting_object[u'Name'] for scripting_object in request.params.include_objects.format()]
+                for request in self.requests]
+
+    def is_healthy(self):
+        return self.healthy
+
+    def shutdown(self):
+        self.healthy = False
+        self.shut_down = True
+
+    def create_request(self, request_type, parameters):
+        request = FakeScriptingRequest(self, parameters)
+        self.requests.append(request)
+        return request
+
+
+class FakeScriptingRequest(object):
+
+    def __init__(self, client, parameters):
+        self.client = client
+        self.parameters = parameters
+        self.params = scripting.ScriptingParams(parameters)
+        self.responses = None
+
+    def ignore_progress_notifications(self, keep_plan=False):
+        pass
+
+    def execute(self):
+        if self.client.die:
+            self.client.healthy = False
+            self.responses = deque([complete_event(u'Tools service stopped')])
+            return
+
+        scripting_objects = [
+            {u'type': scripting_object[u'Type'], u'schema': scripting_object[u'Schema'],
+             u'name': scripting_object[u'Name']}
+            for scripting_object in self.params.include_objects.format()] or self.client.plan
+        self.responses = deque([
+            scripting.ScriptResponse({u'operationId': OPERATION_ID}),
+            scripting.ScriptPlanNotificationEvent({
+                u'operationId': OPERATION_ID, u'sequenceNumber': None, u'scriptingObjects': scripting_objects,
+                u'count': len(scripting_objects)})])
+
+        options = self.params.scripting_options.get_options()
+        failing_options = self.client.failing_options
+        failed = failing_options and all(options[option] == value for option, value in failing_options.items())
+
+        scripted_names = []
+        error_message = None
+        for scripting_object in scripting_objects:
+            if failed:
+                # The first object can not be scripted with these options and stops the request.
+                error_message = u'{} can not be scripted with these options'.format(scripting_object[u'name'])
+                self.responses.append(progress_event(scripting_object, u'Error', error_message))
+                break
+            if self.client.failures.get(scripting_object[u'name']):
+                self.client.failures[scripting_object[u'name']] -= 1
+                self.responses.append(
+                    progress_event(scripting_object, u'Error', u'Lock request time out period exceeded.'))
+            else:
+                scripted_names.append(scripting_object[u'name'])
+                self.responses.append(progress_event(scripting_object, u'Completed'))
+        self.responses.append(complete_event(error_message))
+
+        if self.client.write_scripts and self.parameters[u'ScriptDestination'] == u'ToSingleFile':
+            with io.open(self.parameters[u'FilePath'], u'ab' if options[u'AppendToFile'] else u'wb') as script_file:
+                script_file.write(u''.join(name + u'\n' for name in scripted_names).encode(u'utf-8'))
+
+    def cancel(self):
+        # The plan was received, the request completes without scripting further objects.
+        self.responses = deque(
+            [response for response in self.responses if isinstance(response, scripting.ScriptCompleteEvent)])
+
+    def completed(self):
+        return not self.responses
+
+    def get_response(self, timeout=None):
+        return self.responses.popleft() if self.responses else None
+
+    def result(self, timeout=None, callback=None):
+        response = None
+        while self.responses:
+            response = self.responses.popleft()
+            if callback:
+                callback(response)
+        return response
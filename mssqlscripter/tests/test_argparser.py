@@ -6,6 +6,8 @@
 import unittest
 import mssqlscripter.argparser as parser
 import os
+import shutil
+import tempfile
 
 
 class TestParser(unittest.TestCase):
@@ -44,6 +46,67 @@ class TestParser(unittest.TestCase):
         parameters = parser.parse_arguments(standard_connection)
         self.assertEqual(parameters.ConnectionString, u'Server=TestServer;Database=mydatabase;User Id=my_username;Password=PLACEHOLDER;')
 
+    def test_resume_implies_checkpoint(self):
+        """
+            Verify a checkpointed run is resumed with it's arguments and --resume.
+        """
+        connection = [u'--connection-string', u'Server=TestServer;Database=mydatabase;Integrated Security=True;']
+        for resume_args in ([u'--resume'], [u'--checkpoint', u'--resume']):
+            parameters = parser.parse_arguments(connection + [u'-f', u'script.sql'] + resume_args)
+            self.assertTrue(parameters.Checkpoint)
+            self.assertTrue(parameters.Resume)
+
+        for invalid_args in ([u'--resume'], [u'--resume', u'-f', u'script.sql', u'--shards', u'2']):
+            self.assertRaises(SystemExit, parser.parse_arguments, connection + invalid_args)
+
+        # Script processors rejected with --checkpoint are rejected with --resume.
+        for processor_args in ([u'--pipeline-stage', u'mssqlscripter.scripterpipeline:strip_headers'],
+                               [u'--data-only', u'--merge-inserts'], [u'--data-only', u'--max-rows-per-table', u'10']):
+            self.assertRaises(
+                SystemExit, parser.parse_arguments, connection + [u'-f', u'script.sql', u'--resume'] + processor_args)
+
+    def test_bulk_export_rejects_resume(self):
+        """
+            Verify a bulk export is not checkpointed, it's directory is no script to resume.
+        """
+        connection = [u'--connection-string', u'Server=TestServer;Database=mydatabase;Integrated Security=True;']
+        export_directory = tempfile.mkdtemp()
+        try:
+            bulk_export = connection + [u'--bulk-export', u'csv', u'--data-only', u'-f', export_directory]
+            self.assertEqual(parser.parse_arguments(bulk_export).BulkExport, u'csv')
+            for checkpoint_args in ([u'--checkpoint'], [u'--resume']):
+                self.assertRaises(SystemExit, parser.parse_arguments, bulk_export + checkpoint_args)
+        finally:
+            shutil.rmtree(export_directory)
+
+    def test_retry_requires_single_request(self):
+        """
+            Verify failed objects are only retried and reported by a single scripting request.
+        """
+        connection = [u'--connection-string', u'Server=TestServer;Database=mydatabase;Integrated Security=True;']
+        self.assertEqual(parser.parse_arguments(connection + [u'-r']).RetryCount, 2)
+        self.assertEqual(parser.parse_arguments(connection + [u'-r', u'--retry-failed', u'0']).RetryCount, 0)
+
+        for mode_args in ([u'--shards', u'2'], [u'--daemon'], [u'--cache'], [u'--checkpoint'],
+                          [u'--variant', u'drop=--script-drop']):
+            for retry_args in ([u'--retry-failed', u'3'], [u'--failure-report', u'failures.json']):
+                self.assertRaises(
+                    SystemExit, parser.parse_arguments, connection + [u'-r', u'-f', u'script.sql'] + mode_args + retry_args)
+
+    def test_pipeline_stage_loaded(self):
+        """
+            Verify pipeline stages are loaded when the arguments are parsed, stage factories with their arguments.
+        """
+        connection = [u'--connection-string', u'Server=TestServer;Database=mydatabase;Integrated Security=True;']
+        parameters = parser.parse_arguments(connection + [
+            u'--pipeline-stage', u'mssqlscripter.scripterpipeline:strip_headers',
+            u'--pipeline-stage', u"mssqlscripter.scripterpipeline:rename_schema('dbo', 'staging')"])
+        self.assertEqual(len(parameters.PipelineStages), 2)
+
+        for stage_name in (u'mssqlscripter.scripterpipeline:rename_schema', u'mssqlscripter.scripterpipeline:missing',
+                           u'mssqlscripter.missing:strip_headers'):
+            self.assertRaises(SystemExit, parser.parse_arguments, connection + [u'--pipeline-stage', stage_name])
+
 
 if __name__ == u'__main__':
     unittest.main()
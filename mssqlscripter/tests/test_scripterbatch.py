@@ -0,0 +1,120 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import faketoolsservice
+import mssqlscripter.scripterbatch as scripterbatch
+
+
+class ScripterBatchTest(unittest.TestCase):
+    """
+        Batch scripting tests.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        # Every database has 3 objects.
+        self.started_clients = faketoolsservice.patch_tools_service(self, lambda: faketoolsservice.FakeToolsClient(
+            plan=[faketoolsservice.table(u'T{}'.format(index)) for index in range(3)]))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_manifest(self, file_name, content):
+        manifest_path = os.path.join(self.temp_dir, file_name)
+        with io.open(manifest_path, u'w', encoding=u'utf-8') as manifest_file:
+            manifest_file.write(content)
+        return manifest_path
+
+    def test_load_json_manifest(self):
+        """
+            Verify defaults are applied to every target of a JSON manifest.
+        """
+        manifest_path = self.write_manifest(u'manifest.json', json.dumps({
+            u'defaults': {u'server': u'localhost', u'schema-and-data': True},
+            u'targets': [{u'database': u'db1'}, {u'database': u'db2', u'schema-and-data': False}]}))
+
+        self.assertEqual(scripterbatch.load_manifest(manifest_path), [
+            {u'server': u'localhost', u'schema-and-data': True, u'database': u'db1'},
+            {u'server': u'localhost', u'schema-and-data': False, u'database': u'db2'}])
+
+    def test_load_csv_manifest(self):
+        """
+            Verify CSV cells are converted to flags and lists, and empty cells are omitted.
+        """
+        manifest_path = self.write_manifest(
+            u'manifest.csv',
+            u'server,database,include-objects,data-only\nlocalhost,db1,dbo.T1 dbo.T2,true\nlocalhost,db2,,false\n')
+
+        self.assertEqual(scripterbatch.load_manifest(manifest_path), [
+            {u'server': u'localhost', u'database': u'db1', u'include-objects': [u'dbo.T1', u'dbo.T2'],
+             u'data-only': True},
+            {u'server': u'localhost', u'database': u'db2', u'data-only': False}])
+
+    def test_target_arguments(self):
+        """
+            Verify targets are converted to mssql-scripter arguments.
+        """
+        target = {
+            u'name': u'tenant', u'server': u'localhost', u'data-only': True, u'file-per-object': False,
+            u'include-objects': [u'dbo.T1', u'dbo.T2'], u'-d': u'db1', u'f': u'script.sql'}
+
+        self.assertEqual(scripterbatch.get_target_arguments(target), [
+            u'-d', u'db1', u'--data-only', u'-f', u'script.sql', u'--include-objects', u'dbo.T1', u'dbo.T2',
+            u'--server', u'localhost'])
+        self.assertEqual(scripterbatch.get_target_name({u'server': u'host\\sql', u'database': u'db 1'}, 0),
+                         u'host_sql_db_1')
+
+    def test_unsupported_options_rejected(self):
+        """
+            Verify targets with options only mssql-scripter implements are invalid and not scripted.
+        """
+        file_path = os.path.join(self.temp_dir, u'script.sql')
+        batch_targets = scripterbatch.parse_targets([
+            {u'server': u'localhost', u'database': u'db1', u'f': file_path},
+            {u'server': u'localhost', u'database': u'db2', u'shards': 2, u'index': True},
+            {u'server': u'localhost', u'database': u'db3', u'data-only': True, u'max-rows-per-table': 0}], self.temp_dir)
+
+        self.assertEqual(batch_targets[0].parameters.FilePath, file_path)
+        self.assertEqual([batch_target.error for batch_target in batch_targets], [
+            None,
+            u'Invalid target arguments: --shards, --index can not be used with mssql-scripter-batch',
+            u'Invalid target arguments: --max-rows-per-table can not be used with mssql-scripter-batch'])
+        scripterbatch.BatchScripter(batch_targets).run()
+        self.assertEqual([file_path for client in self.started_clients for file_path in client.file_paths],
+                         [file_path])
+
+    def test_batch_scripts_targets(self):
+        """
+            Verify every target is scripted to the output directory by workers reusing their tools service.
+        """
+        targets = [{u'server': u'localhost', u'database': u'db{}'.format(index)} for index in range(5)]
+        batch_targets = scripterbatch.parse_targets(targets, self.temp_dir)
+        scripterbatch.BatchScripter(batch_targets, worker_count=2).run()
+
+        # A worker starts one tools service at most, idle workers may not start any.
+        self.assertLessEqual(len(self.started_clients), 2)
+        self.assertEqual(
+            sorted(file_path for client in self.started_clients for file_path in client.file_paths),
+            [os.path.join(self.temp_dir, u'localhost_db{}.sql'.format(index)) for index in range(5)])
+        self.assertTrue(all(batch_target.success for batch_target in batch_targets))
+        self.assertEqual([batch_target.object_count for batch_target in batch_targets], [3] * 5)
+
+        summary_path = os.path.join(self.temp_dir, u'summary.json')
+        scripterbatch.write_summary(batch_targets, summary_path, io.StringIO())
+        with io.open(summary_path, encoding=u'utf-8') as summary_file:
+            summary = json.load(summary_file)
+        self.assertEqual(summary[u'succeeded'], 5)
+        self.assertEqual(summary[u'targets'][0][u'name'], u'localhost_db0')
+
+
+if __name__ == u'__main__':
+    unittest.main()
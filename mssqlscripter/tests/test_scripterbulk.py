@@ -0,0 +1,121 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import argparse
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mssqlscripter.scripterbulk as scripterbulk
+
+DATA = (
+    b'SET IDENTITY_INSERT [dbo].[Customers] ON\r\n'
+    b'INSERT [dbo].[Customers] ([Id], [Name], [Created], [Photo]) VALUES '
+    b'(1, N\'Contoso, "Ltd"\r\nGO\r\n\', CAST(N\'2017-01-01T00:00:00.000\' AS DateTime), 0x0aff)\r\n'
+    b'INSERT [dbo].[Customers] ([Id], [Name], [Created], [Photo]) VALUES (2, N\'\', NULL, NULL)\r\n'
+    b'INSERT [dbo].[Customers] ([Id], [Name], [Created], [Photo]) VALUES (3, NULL, NULL, NULL)\r\n'
+    b'SET IDENTITY_INSERT [dbo].[Customers] OFF\r\n'
+    b'INSERT [Sales].[Order]]s] ([Id], [Total]) VALUES (1, CAST(12.50 AS Decimal(18, 2)))\r\n'
+    b'GO\r\n')
+
+
+class ScripterBulkTest(unittest.TestCase):
+    """
+        Bulk load format export tests.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_convert_statements(self):
+        """
+            Verify INSERT statements are converted to quoted rows per table with the column types.
+        """
+        customers, orders = scripterbulk.convert_statements(DATA, u'csv')
+        self.assertEqual(customers.table, (u'dbo', u'Customers'))
+        self.assertEqual(customers.columns, [u'Id', u'Name', u'Created', u'Photo'])
+        self.assertEqual(customers.types, [u'int', u'nvarchar', u'DateTime', u'varbinary'])
+        self.assertEqual(customers.row_count, 3)
+        self.assertEqual(customers.data, (
+            b'1,"Contoso, ""Ltd""\r\nGO\r\n",2017-01-01T00:00:00.000,0AFF\r\n'
+            b'2,"",,\r\n'
+            b'3,,,\r\n'))
+        self.assertEqual((orders.table, orders.types, orders.data),
+                         ((u'Sales', u'Order]s'), [u'int', u'Decimal(18, 2)'], b'1,12.50\r\n'))
+
+        customers, _ = scripterbulk.convert_statements(DATA, u'bcp')
+        self.assertEqual(customers.data.split(b'\x1e\n')[1:3], [b'2\x1f\x00\x1f\x1f', b'3\x1f\x1f\x1f'])
+        self.assertRaises(ValueError, scripterbulk.parse_values, u"(1, geography::Point(1, 2, 4326))")
+
+    def test_table_writer(self):
+        """
+            Verify every table gets a data file, a sidecar and, for bcp, a format file, appending tables seen again.
+        """
+        writer = scripterbulk.BulkTableWriter(self.temp_dir, u'bcp')
+        for table_rows in scripterbulk.convert_statements(DATA, u'bcp') + scripterbulk.convert_statements(DATA, u'bcp'):
+            writer.write(table_rows)
+        writer.close()
+
+        self.assertEqual(sorted(os.listdir(self.temp_dir)), [
+            u'Sales.Order]s.dat', u'Sales.Order]s.fmt', u'Sales.Order]s.json',
+            u'dbo.Customers.dat', u'dbo.Customers.fmt', u'dbo.Customers.json'])
+        with io.open(os.path.join(self.temp_dir, u'dbo.Customers.json'), encoding=u'utf-8') as sidecar_file:
+            sidecar = json.loads(sidecar_file.read())
+        self.assertEqual(sidecar[u'rows'], 6)
+        self.assertEqual(sidecar[u'columns'][2], {u'name': u'Created', u'type': u'DateTime'})
+        with io.open(os.path.join(self.temp_dir, u'dbo.Customers.dat'), u'rb') as data_file:
+            self.assertEqual(data_file.read().count(b'\x1e\n'), 6)
+        with io.open(os.path.join(self.temp_dir, u'dbo.Customers.fmt'), encoding=u'utf-8') as format_file:
+            self.assertEqual(format_file.read().splitlines()[:3], [
+                u'14.0', u'4', u'1\tSQLCHAR\t0\t0\t"\x1f"\t1\tId\t""'])
+
+    def test_unsupported_value(self):
+        """
+            Verify a table with a value that can not be converted is reported and skipped, and the other tables
+            are still exported.
+        """
+        spatial_data = (
+            b'INSERT [dbo].[Places] ([Id], [Location]) VALUES (1, NULL)\r\n'
+            b'INSERT [dbo].[Places] ([Id], [Location]) VALUES (2, geography::Point(1, 2, 4326))\r\n')
+        directory = os.path.join(self.temp_dir, u'export')
+        parameters = argparse.Namespace(BulkExport=u'csv', FilePath=directory, MaxRowsPerTable=None)
+        bulk_exporter = scripterbulk.BulkExporter(parameters, processes=1)
+        bulk_exporter.start()
+        with io.open(parameters.FilePath, u'ab') as spool_file:
+            spool_file.write(DATA + spatial_data + DATA)
+        report = io.StringIO()
+        bulk_exporter.finish(report=report)
+
+        self.assertEqual(sorted(os.listdir(directory)), [
+            u'Sales.Order]s.csv', u'Sales.Order]s.json', u'dbo.Customers.csv', u'dbo.Customers.json'])
+        self.assertIn(u'Unable to export dbo.Places: Unsupported value in', report.getvalue())
+        with io.open(os.path.join(directory, u'dbo.Customers.json'), encoding=u'utf-8') as sidecar_file:
+            self.assertEqual(json.loads(sidecar_file.read())[u'rows'], 6)
+
+    def test_max_rows(self):
+        """
+            Verify only the first rows of every table are written and the sidecar marks truncated tables.
+        """
+        writer = scripterbulk.BulkTableWriter(self.temp_dir, u'csv', max_rows=2)
+        for table_rows in scripterbulk.convert_statements(DATA, u'csv') + scripterbulk.convert_statements(DATA, u'csv'):
+            writer.write(table_rows)
+        writer.close()
+
+        with io.open(os.path.join(self.temp_dir, u'dbo.Customers.csv'), u'rb') as data_file:
+            self.assertEqual(data_file.read(), b'1,"Contoso, ""Ltd""\r\nGO\r\n",2017-01-01T00:00:00.000,0AFF\r\n2,"",,\r\n')
+        self.assertEqual(writer.tables[(u'dbo', u'Customers')][u'scripted_rows'], 6)
+        with io.open(os.path.join(self.temp_dir, u'Sales.Order]s.json'), encoding=u'utf-8') as sidecar_file:
+            sidecar = json.loads(sidecar_file.read())
+        self.assertEqual((sidecar[u'rows'], sidecar[u'truncated']), (2, False))
+
+
+if __name__ == u'__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import mssqlscripter.scriptercache as scriptercache
+import mssqlscripter.scriptersplitter as scriptersplitter
+
+HEADER = u'/****** Object:  {} {}    Script Date: 1/1/2017 ******/\r\n'
+
+
+class ScripterCacheTest(unittest.TestCase):
+    """
+        Object script cache tests.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.temp_dir, u'cache.sqlite')
+        self.parameters = {
+            u'ConnectionString': u'Server=test;Database=db;User Id=sa;Password=secret;',
+            u'TypeOfDataToScript': u'SchemaOnly'}
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_split_object_scripts(self):
+        """
+            Verify scripts are split at the headers of scripting objects and other headers stay with their object.
+        """
+        objects = [
+            {u'type': u'Table', u'schema': u'dbo', u'name': u'T]1'},
+            {u'type': u'StoredProcedure', u'schema': u'dbo', u'name': u'P1'}]
+        table_script = HEADER.format(u'Table', u'[dbo].[T]]1]') + u'CREATE TABLE [dbo].[T]]1] (a int)\r\nGO\r\n' + \
+            HEADER.format(u'Index', u'[IX_T1]') + u'CREATE INDEX [IX_T1] ON [dbo].[T]]1] (a)\r\nGO\r\n'
+        procedure_script = HEADER.format(u'StoredProcedure', u'[dbo].[P1]') + u'CREATE PROCEDURE [dbo].[P1] AS\r\nGO\r\n'
+        data = (u'USE [db]\r\nGO\r\n' + procedure_script + table_script).encode(u'utf-8')
+
+        preamble, object_scripts = scriptercache.split_object_scripts(data, objects)
+
+        self.assertEqual(preamble, b'USE [db]\r\nGO\r\n')
+        self.assertEqual(object_scripts, {
+            u'Table.dbo.T]1': table_script.encode(u'utf-8'),
+            u'StoredProcedure.dbo.P1': procedure_script.encode(u'utf-8')})
+        self.assertEqual(
+            scriptersplitter.HEADER_LINE_PATTERN.sub(b'', object_scripts[u'StoredProcedure.dbo.P1']),
+            b'CREATE PROCEDURE [dbo].[P1] AS\r\nGO\r\n')
+
+    def test_cache_keyed_by_marker_and_options(self):
+        """
+            Verify scripts are only returned for the cached marker, options and database, whatever the credentials.
+        """
+        script_cache = scriptercache.ScriptCache(self.parameters, self.cache_path)
+        script_cache.put(u'Table.dbo.T1', u'2017-01-01T00:00:00', b'CREATE TABLE')
+        script_cache.put(u'Table.dbo.T2', u'2017-01-01T00:00:00', b'CREATE TABLE')
+        script_cache.remove_except([u'Table.dbo.T1'])
+        script_cache.close()
+
+        self.parameters[u'ConnectionString'] = u'Server=TEST;Database=db;Integrated Security=True;'
+        script_cache = scriptercache.ScriptCache(self.parameters, self.cache_path)
+        self.assertEqual(script_cache.get(u'Table.dbo.T1', u'2017-01-01T00:00:00'), b'CREATE TABLE')
+        self.assertIsNone(script_cache.get(u'Table.dbo.T1', u'2017-01-02T00:00:00'))
+        self.assertIsNone(script_cache.get(u'Table.dbo.T2', u'2017-01-01T00:00:00'))
+        script_cache.close()
+
+        self.parameters[u'ScriptIndexes'] = True
+        script_cache = scriptercache.ScriptCache(self.parameters, self.cache_path)
+        self.assertIsNone(script_cache.get(u'Table.dbo.T1', u'2017-01-01T00:00:00'))
+        script_cache.close()
+
+    def test_odbc_connection_string(self):
+        """
+            Verify tools service connection strings are converted to ODBC connection strings.
+        """
+        self.assertEqual(
+            scriptercache.get_odbc_connection_string(u'Server=localhost;Database=db;User Id=sa;Password=p}w;'),
+            u'DRIVER={ODBC Driver 17 for SQL Server};SERVER={localhost};DATABASE={db};UID={sa};PWD={p}}w}')
+        self.assertEqual(
+            scriptercache.get_odbc_connection_string(u'Data Source=localhost;Integrated Security=True;'),
+            u'DRIVER={ODBC Driver 17 for SQL Server};SERVER={localhost};Trusted_Connection=yes')
+
+
+if __name__ == u'__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import faketoolsservice
+import mssqlscripter.scriptercheckpoint as scriptercheckpoint
+
+
+class ScripterCheckpointTest(unittest.TestCase):
+    """
+        Checkpointed scripting tests.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.parameters = {
+            u'FilePath': os.path.join(self.temp_dir, u'script.sql'),
+            u'ConnectionString': u'Server=test;Database=db;',
+            u'ScriptDestination': u'ToSingleFile'}
+        # The first tools service dies on it's first request.
+        self.started_clients = faketoolsservice.patch_tools_service(
+            self, lambda: faketoolsservice.FakeToolsClient(die=not self.started_clients, write_scripts=True))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_journal_ignores_torn_line(self):
+        """
+            Verify completed batches are loaded and a line torn by a crash is ignored.
+        """
+        journal = scriptercheckpoint.CheckpointJournal(os.path.join(self.temp_dir, u'journal.jsonl'))
+        self.assertIsNone(journal.load())
+
+        journal.create(u'identity', [[{u'type': u'Table', u'schema': u'dbo', u'name': u'T1'}]])
+        journal.record(0)
+        with io.open(journal.journal_path, u'a', encoding=u'utf-8') as journal_file:
+            journal_file.write(u'{"batch": 1')
+
+        identity, batches, completed_batches = journal.load()
+        self.assertEqual(identity, u'identity')
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(completed_batches, set([0]))
+
+    def test_identity_ignores_relative_paths(self):
+        """
+            Verify a run is identified by what it scripts, not by how the file path was given.
+        """
+        identity = scriptercheckpoint.get_identity(self.parameters)
+        working_directory = os.getcwd()
+        os.chdir(self.temp_dir)
+        try:
+            self.assertEqual(
+                identity, scriptercheckpoint.get_identity(dict(self.parameters, FilePath=u'script.sql')))
+        finally:
+            os.chdir(working_directory)
+        self.assertNotEqual(
+            identity, scriptercheckpoint.get_identity(dict(self.parameters, ConnectionString=u'Server=other;')))
+
+    def test_resume_scripts_remaining_batches(self):
+        """
+            Verify a resumed run only scripts incomplete batches, restarts a tools service that died and
+            assembles the segments in plan order.
+        """
+        batches = [[{u'type': u'Table', u'schema': u'dbo', u'name': u'T{}'.format(index)}] for index in range(3)]
+        scripter = scriptercheckpoint.CheckpointedScripter(self.parameters, resume=True)
+        os.makedirs(scripter.checkpoint_directory)
+        scripter.journal.create(scriptercheckpoint.get_identity(self.parameters), batches)
+        with io.open(scripter.get_segment_path(0), u'wb') as segment_file:
+            segment_file.write(b'T0\n')
+        scripter.journal.record(0)
+
+        self.assertTrue(scripter.run().success)
+
+        self.assertEqual(len(self.started_clients), 2)
+        self.assertEqual(self.started_clients[1].included_names, [[u'T1'], [u'T2']])
+        with io.open(self.parameters[u'FilePath'], u'rb') as script_file:
+            self.assertEqual(script_file.read(), b'T0\nT1\nT2\n')
+        self.assertFalse(os.path.exists(scripter.checkpoint_directory))
+
+
+if __name__ == u'__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+from multiprocessing.pool import ThreadPool
+
+import argparse
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import mssqlscripter.scriptercompression as scriptercompression
+
+SCRIPT = b''.join(
+    u'INSERT [dbo].[T1] ([id], [name]) VALUES ({}, N\'row {}\')\r\n'.format(row, row).encode(u'utf-8')
+    for row in range(1000))
+
+
+class ScripterCompressionTest(unittest.TestCase):
+    """
+        Compressed output tests.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def compress_blocks(self, compressor):
+        output = io.BytesIO()
+        pool = ThreadPool(2)
+        try:
+            writer = scriptercompression.ParallelBlockWriter(
+                output, compressor, pool, max_pending_blocks=2, block_size=1000)
+            for offset in range(0, len(SCRIPT), 777):
+                writer.write(SCRIPT[offset:offset + 777])
+            writer.close()
+        finally:
+            pool.close()
+
+        self.assertEqual(writer.bytes_in, len(SCRIPT))
+        self.assertEqual(writer.bytes_out, len(output.getvalue()))
+        return output.getvalue()
+
+    def test_gzip_blocks_concatenate(self):
+        """
+            Verify blocks compressed in parallel decompress to the original bytes in order.
+        """
+        compressed = self.compress_blocks(scriptercompression.GzipCompressor())
+        with gzip.GzipFile(fileobj=io.BytesIO(compressed)) as gzip_file:
+            self.assertEqual(gzip_file.read(), SCRIPT)
+
+    def test_xz_blocks_concatenate(self):
+        """
+            Verify xz streams compressed in parallel decompress to the original bytes in order.
+        """
+        try:
+            compressor = scriptercompression.get_compressor(u'xz')
+        except ImportError:
+            self.skipTest(u'lzma is not available')
+
+        import lzma
+        self.assertEqual(lzma.decompress(self.compress_blocks(compressor)), SCRIPT)
+
+    def test_compress_single_file(self):
+        """
+            Verify the spool file written by the tools service is compressed to the target file.
+        """
+        file_path = os.path.join(self.temp_dir, u'script.sql')
+        parameters = self.create_parameters(file_path, u'ToSingleFile')
+        script_compressor = scriptercompression.ScriptCompressor(parameters)
+        self.assertNotEqual(parameters.FilePath, file_path)
+
+        script_compressor.start()
+        with io.open(parameters.FilePath, u'wb') as spool_file:
+            spool_file.write(SCRIPT)
+        report = io.StringIO()
+        script_compressor.finish(report)
+
+        with gzip.open(file_path + u'.gz') as gzip_file:
+            self.assertEqual(gzip_file.read(), SCRIPT)
+        self.assertFalse(os.path.exists(parameters.FilePath))
+        self.assertIn(u'with gzip', report.getvalue())
+
+    def test_compress_file_per_object(self):
+        """
+            Verify only files the tools service moved on from are compressed before scripting finished.
+        """
+        parameters = self.create_parameters(self.temp_dir, u'ToFilePerObject')
+        script_compressor = scriptercompression.ScriptCompressor(parameters)
+        staging_directory = parameters.FilePath
+
+        for index, file_name in enumerate([u'dbo.T1.Table.sql', u'dbo.T2.Table.sql']):
+            staged_path = os.path.join(staging_directory, file_name)
+            with io.open(staged_path, u'wb') as staged_file:
+                staged_file.write(SCRIPT)
+            os.utime(staged_path, (index, index))
+
+        script_compressor._compress_files(script_compressor._get_new_files(), settled_only=True)
+        self.assertEqual(os.listdir(staging_directory), [u'dbo.T2.Table.sql'])
+
+        script_compressor.finish(report=None)
+        self.assertEqual(sorted(os.listdir(self.temp_dir)), [u'dbo.T1.Table.sql.gz', u'dbo.T2.Table.sql.gz'])
+        with gzip.open(os.path.join(self.temp_dir, u'dbo.T2.Table.sql.gz')) as gzip_file:
+            self.assertEqual(gzip_file.read(), SCRIPT)
+        self.assertFalse(os.path.exists(staging_directory))
+        self.assertEqual(script_compressor.bytes_in, 2 * len(SCRIPT))
+
+    def create_parameters(self, file_path, script_destination):
+        return argparse.Namespace(
+            FilePath=file_path, ScriptDestination=script_destination, AppendToFile=False,
+            Compress=u'gzip', CompressThreads=2)
+
+
+if __name__ == u'__main__':
+    unittest.main()
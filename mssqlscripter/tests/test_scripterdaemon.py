@@ -0,0 +1,128 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import faketoolsservice
+import mssqlscripter.jsonrpc.contracts.scriptingservice as scripting
+import mssqlscripter.scripterdaemon as scripterdaemon
+
+
+@unittest.skipUnless(scripterdaemon.is_supported(), u'Daemon mode requires Unix domain sockets')
+class ScripterDaemonTest(unittest.TestCase):
+    """
+        Scripter daemon tests.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.temp_dir, u'daemon.sock')
+        self.started_clients = faketoolsservice.patch_tools_service(self)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_pool_reuses_healthy_clients(self):
+        """
+            Verify released clients are reused and unhealthy clients are replaced.
+        """
+        pool = scripterdaemon.ToolsServicePool(size=1)
+        pool.warm_up()
+        self.assertEqual(len(self.started_clients), 1)
+
+        client = pool.acquire()
+        pool.release(client)
+        self.assertIs(pool.acquire(), client)
+
+        client.healthy = False
+        pool.release(client)
+        self.assertTrue(client.shut_down)
+
+        replacement = pool.acquire()
+        self.assertIsNot(replacement, client)
+        self.assertEqual(len(self.started_clients), 2)
+
+        pool.release(replacement)
+        replacement.healthy = False
+        pool.check_health()
+        self.assertTrue(replacement.shut_down)
+        self.assertEqual(len(self.started_clients), 3)
+        self.assertEqual(pool.idle_clients, [self.started_clients[2]])
+
+    def test_submit_streams_events(self):
+        """
+            Verify a request is run on the warm tools service and it's events are streamed back.
+        """
+        daemon = self.start_daemon(scripterdaemon.ToolsServicePool(size=1))
+
+        events = []
+        parameters = argparse.Namespace(
+            FilePath=u'relative.sql', ConnectionString=u'Server=test;', ScriptDestination=u'ToSingleFile',
+            DisplayProgress=True, EnableLogging=False, DaemonIdleTimeout=60, DaemonPoolSize=1)
+        complete_event = scripterdaemon.submit(parameters, callback=events.append, socket_path=self.socket_path)
+        scripterdaemon.submit(parameters, socket_path=self.socket_path)
+
+        self.assertEqual(
+            [type(event) for event in events],
+            [scripting.ScriptResponse, scripting.ScriptPlanNotificationEvent, scripting.ScriptProgressNotificationEvent,
+             scripting.ScriptCompleteEvent])
+        self.assertIs(complete_event, events[-1])
+        self.assertTrue(complete_event.success)
+        self.assertEqual(events[2].scripting_object, faketoolsservice.table(u'T1'))
+
+        # Both requests ran on the same warm tools service, with the file path resolved by the CLI.
+        self.assertEqual(len(self.started_clients), 1)
+        self.assertEqual(
+            self.started_clients[0].file_paths, [os.path.abspath(u'relative.sql')] * 2)
+
+        self.assertTrue(scripterdaemon.shutdown(self.socket_path))
+        daemon.join()
+        self.assertFalse(os.path.exists(self.socket_path))
+        self.assertTrue(self.started_clients[0].shut_down)
+
+    def test_submit_without_daemon_reports_error(self):
+        """
+            Verify a failed connection is reported as a failed complete event.
+        """
+        parameters = argparse.Namespace(
+            FilePath=u'relative.sql', DaemonIdleTimeout=60, DaemonPoolSize=1, EnableLogging=False)
+        scripterdaemon.DAEMON_START_TIMEOUT, start_timeout = 0, scripterdaemon.DAEMON_START_TIMEOUT
+        try:
+            complete_event = scripterdaemon.submit(
+                parameters, socket_path=os.path.join(self.temp_dir, u'missing', u'daemon.sock'))
+        finally:
+            scripterdaemon.DAEMON_START_TIMEOUT = start_timeout
+
+        self.assertTrue(complete_event.has_error)
+        self.assertFalse(complete_event.success)
+
+    def test_idle_timeout(self):
+        """
+            Verify the daemon stops once idle for longer than the idle timeout.
+        """
+        pool = scripterdaemon.ToolsServicePool(size=1)
+        pool.warm_up()
+        daemon = self.start_daemon(pool, idle_timeout=.1)
+
+        daemon.join(5)
+        self.assertFalse(daemon.is_alive())
+        self.assertFalse(os.path.exists(self.socket_path))
+        self.assertTrue(self.started_clients[0].shut_down)
+
+    def start_daemon(self, pool, idle_timeout=60):
+        daemon = scripterdaemon.ScripterDaemon(self.socket_path, pool, idle_timeout)
+        daemon_thread = threading.Thread(target=daemon.serve)
+        daemon_thread.daemon = True
+        daemon_thread.start()
+        return daemon_thread
+
+
+if __name__ == u'__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import argparse
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import mssqlscripter.jsonrpc.contracts.scriptingservice as scripting
+import mssqlscripter.scripterincremental as scripterincremental
+
+
+def complete_event(success):
+    return scripting.ScriptCompleteEvent({
+        u'operationId': None, u'sequenceNumber': None, u'success': success, u'canceled': False,
+        u'hasError': not success, u'errorMessage': None, u'errorDetails': None})
+
+
+class IncrementalWriterTest(unittest.TestCase):
+    """
+        Incremental file per object tests.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.target_directory = os.path.join(self.temp_dir, u'objects')
+        os.makedirs(self.target_directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def script(self, scripts, success=True):
+        """
+            Stage the object scripts as the tools service would and apply them to the target directory.
+        """
+        parameters = argparse.Namespace(FilePath=self.target_directory)
+        incremental_writer = scripterincremental.IncrementalWriter(parameters)
+        for file_name, script in scripts.items():
+            with io.open(os.path.join(parameters.FilePath, file_name), u'wb') as staged_file:
+                staged_file.write(script)
+        incremental_writer.finish(complete_event(success), report=None)
+
+        self.assertFalse(os.path.exists(incremental_writer.staging_directory))
+        return incremental_writer
+
+    def read(self, file_name):
+        with io.open(os.path.join(self.target_directory, file_name), u'rb') as target_file:
+            return target_file.read()
+
+    def test_only_changed_files_written(self):
+        """
+            Verify unchanged files keep their modification time and changed files are replaced.
+        """
+        self.script({u'dbo.T1.Table.sql': b'CREATE TABLE [T1]', u'dbo.T2.Table.sql': b'CREATE TABLE [T2]'})
+        unchanged_path = os.path.join(self.target_directory, u'dbo.T1.Table.sql')
+        os.utime(unchanged_path, (1, 1))
+
+        incremental_writer = self.script({
+            u'dbo.T1.Table.sql': b'CREATE TABLE [T1]', u'dbo.T2.Table.sql': b'CREATE TABLE [T2] (a int)'})
+
+        self.assertEqual((incremental_writer.written_count, incremental_writer.unchanged_count), (1, 1))
+        self.assertEqual(os.path.getmtime(unchanged_path), 1)
+        self.assertEqual(self.read(u'dbo.T2.Table.sql'), b'CREATE TABLE [T2] (a int)')
+
+    def test_script_date_ignored(self):
+        """
+            Verify files only differing in the script date of their descriptive headers are unchanged.
+        """
+        header = u'/****** Object:  Table [dbo].[T1]    Script Date: {} ******/\r\nCREATE TABLE [T1]\r\n'
+        self.script({u'dbo.T1.Table.sql': header.format(u'1/2/2026 9:05:01 AM').encode(u'utf-8')})
+
+        incremental_writer = self.script(
+            {u'dbo.T1.Table.sql': header.format(u'10/18/2026 11:45:30 PM').encode(u'utf-8')})
+        self.assertEqual((incremental_writer.written_count, incremental_writer.unchanged_count), (0, 1))
+        self.assertEqual(self.read(u'dbo.T1.Table.sql'), header.format(u'1/2/2026 9:05:01 AM').encode(u'utf-8'))
+
+        incremental_writer = self.script({u'dbo.T1.Table.sql': header.format(u'10/18/2026 11:45:30 PM').replace(
+            u'CREATE TABLE [T1]', u'CREATE TABLE [T1] (a int)').encode(u'utf-8')})
+        self.assertEqual((incremental_writer.written_count, incremental_writer.unchanged_count), (1, 0))
+
+    def test_edited_file_rewritten(self):
+        """
+            Verify a file edited since the last run is rewritten although it's script did not change.
+        """
+        self.script({u'dbo.T1.Table.sql': b'CREATE TABLE [T1]'})
+        with io.open(os.path.join(self.target_directory, u'dbo.T1.Table.sql'), u'ab') as target_file:
+            target_file.write(b'-- edited')
+
+        self.assertEqual(self.script({u'dbo.T1.Table.sql': b'CREATE TABLE [T1]'}).written_count, 1)
+        self.assertEqual(self.read(u'dbo.T1.Table.sql'), b'CREATE TABLE [T1]')
+
+    def test_stale_files_removed_on_success_only(self):
+        """
+            Verify files of dropped objects are removed after a complete run, and files not in the manifest are kept.
+        """
+        with io.open(os.path.join(self.target_directory, u'README.md'), u'wb') as readme_file:
+            readme_file.write(b'notes')
+        self.script({u'dbo.T1.Table.sql': b'CREATE TABLE [T1]', u'dbo.T2.Table.sql': b'CREATE TABLE [T2]'})
+
+        self.script({u'dbo.T1.Table.sql': b'CREATE TABLE [T1]'}, success=False)
+        self.assertTrue(os.path.exists(os.path.join(self.target_directory, u'dbo.T2.Table.sql')))
+
+        incremental_writer = self.script({u'dbo.T1.Table.sql': b'CREATE TABLE [T1]'})
+        self.assertEqual(incremental_writer.removed_count, 1)
+        self.assertEqual(
+            sorted(os.listdir(self.target_directory)),
+            [scripterincremental.MANIFEST_FILE_NAME, u'README.md', u'dbo.T1.Table.sql'])
+        self.assertEqual(list(incremental_writer.load_manifest()), [u'dbo.T1.Table.sql'])
+
+
+if __name__ == u'__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import mssqlscripter.scripterindex as scripterindex
+
+SCRIPT = (
+    b'USE [AdventureWorks]\r\nGO\r\n'
+    b'SET ANSI_NULLS ON\r\nGO\r\nSET QUOTED_IDENTIFIER ON\r\nGO\r\n'
+    b'CREATE TABLE [dbo].[Customers]([Id] [int] NOT NULL, [Name] [nvarchar](50) NULL)\r\nGO\r\n'
+    b'CREATE NONCLUSTERED INDEX [IX_Name] ON [dbo].[Customers]([Name])\r\nGO\r\n'
+    b'/****** Object:  StoredProcedure [Sales].[Get]]Orders]    Script Date: 1/1/2017 ******/\r\n'
+    b'SET ANSI_NULLS ON\r\nGO\r\n'
+    b'CREATE PROCEDURE [Sales].[Get]]Orders] AS SELECT \'\r\nGO\r\n\'\r\nGO\r\n'
+    b'INSERT [dbo].[Customers] ([Id], [Name]) VALUES (1, N\'Contoso\')\r\n'
+    b'INSERT [dbo].[Customers] ([Id], [Name]) VALUES (2, N\'Fabrikam\')\r\nGO\r\n')
+
+
+class ScripterIndexTest(unittest.TestCase):
+    """
+        Script index tests.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.temp_dir, u'script.sql')
+        with io.open(self.file_path, u'wb') as script_file:
+            script_file.write(SCRIPT)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def build_index(self, chunk_size):
+        builder = scripterindex.ScriptIndexBuilder()
+        for start in range(0, len(SCRIPT), chunk_size):
+            builder.write(SCRIPT[start:start + chunk_size])
+        return builder.close(scripterindex.get_index_path(self.file_path))
+
+    def test_index_ranges(self):
+        """
+            Verify objects get the batches before them with SET statements and the batches after them without a object.
+        """
+        index = self.build_index(7)
+        self.assertEqual(index[u'size'], len(SCRIPT))
+        self.assertEqual(
+            [(entry[u'type'], entry[u'schema'], entry[u'name']) for entry in index[u'objects']],
+            [(u'Table', u'dbo', u'Customers'), (u'StoredProcedure', u'Sales', u'Get]Orders'),
+             (u'Table', u'dbo', u'Customers')])
+
+        table, procedure, data = index[u'objects']
+        self.assertEqual(table[u'offset'], SCRIPT.index(b'SET ANSI_NULLS'))
+        self.assertEqual(table[u'offset'] + table[u'length'], procedure[u'offset'])
+        self.assertEqual(procedure[u'offset'], SCRIPT.index(b'/******'))
+        # The GO inside the string literal does not end the procedure.
+        self.assertEqual(procedure[u'offset'] + procedure[u'length'], data[u'offset'])
+        self.assertEqual(data[u'offset'] + data[u'length'], len(SCRIPT))
+        self.assertEqual(index, self.build_index(len(SCRIPT)))
+
+    def test_reader(self):
+        """
+            Verify objects and subsets are read from the mapped script, and a changed script is rejected.
+        """
+        self.build_index(4096)
+        with scripterindex.ScriptIndexReader(self.file_path) as reader:
+            # Objects with several ranges are listed once, where they are first scripted.
+            self.assertEqual(
+                reader.objects(), [(u'Table', u'dbo', u'Customers'), (u'StoredProcedure', u'Sales', u'Get]Orders')])
+            customers = reader.read_object(u'Table', u'dbo', u'Customers')
+            self.assertTrue(customers.startswith(b'SET ANSI_NULLS ON'))
+            self.assertIn(b'CREATE NONCLUSTERED INDEX', customers)
+            self.assertTrue(customers.endswith(b'VALUES (2, N\'Fabrikam\')\r\nGO\r\n'))
+            self.assertEqual(
+                [entry[u'name'] for entry, _ in reader.read_objects(schema=u'Sales')], [u'Get]Orders'])
+            self.assertEqual(len(list(reader.read_objects(object_type=u'Table'))), 2)
+            self.assertRaises(KeyError, reader.read_object, u'View', u'dbo', u'Customers')
+
+        with io.open(self.file_path, u'ab') as script_file:
+            script_file.write(b'GO\r\n')
+        self.assertRaises(ValueError, scripterindex.ScriptIndexReader, self.file_path)
+
+
+if __name__ == u'__main__':
+    unittest.main()
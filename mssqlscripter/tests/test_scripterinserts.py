@@ -0,0 +1,106 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import unittest
+
+import mssqlscripter.scripterinserts as scripterinserts
+
+DATA = (
+    b'SET IDENTITY_INSERT [dbo].[Customers] ON\r\n'
+    b'INSERT [dbo].[Customers] ([Id], [Name]) VALUES (1, N\'Contoso\r\nGO\r\n\')\r\n'
+    b'INSERT [dbo].[Customers] ([Id], [Name]) VALUES (2, N\'Fabrikam, (Inc.)\')\r\n'
+    b'INSERT [dbo].[Customers] ([Id], [Name]) VALUES (3, NULL)\r\n'
+    b'INSERT [dbo].[Customers] ([Id], [Name]) VALUES (4, N\'Adventure Works\')\r\n'
+    b'SET IDENTITY_INSERT [dbo].[Customers] OFF\r\n'
+    b'INSERT [dbo].[Orders] ([Id], [Customer]) VALUES (1, 2)\r\n'
+    b'INSERT [dbo].[Orders] ([Id]) VALUES (2)\r\n'
+    b'GO\r\n')
+PROCEDURE = (
+    b'CREATE PROCEDURE [dbo].[AddCustomers] @x int AS\r\n'
+    b'IF @x = 1\r\n'
+    b'INSERT INTO [dbo].[Customers] VALUES (1)\r\n'
+    b'INSERT INTO [dbo].[Customers] VALUES (2)\r\n'
+    b'GO\r\n')
+
+
+class ScripterInsertsTest(unittest.TestCase):
+    """
+        INSERT statement merging tests.
+    """
+
+    def test_merge_inserts(self):
+        """
+            Verify rows are merged per table and column list up to the row limit, keeping other statements in place.
+        """
+        merger = scripterinserts.InsertMerger(max_rows=3)
+        self.assertEqual(merger.merge(DATA), [
+            b'SET IDENTITY_INSERT [dbo].[Customers] ON\r\n'
+            b'INSERT [dbo].[Customers] ([Id], [Name]) VALUES (1, N\'Contoso\r\nGO\r\n\'),\r\n'
+            b'(2, N\'Fabrikam, (Inc.)\'),\r\n(3, NULL)\r\n'
+            b'INSERT [dbo].[Customers] ([Id], [Name]) VALUES (4, N\'Adventure Works\')\r\n'
+            b'SET IDENTITY_INSERT [dbo].[Customers] OFF\r\n'
+            b'INSERT [dbo].[Orders] ([Id], [Customer]) VALUES (1, 2)\r\n'
+            b'INSERT [dbo].[Orders] ([Id]) VALUES (2)\r\n'
+            b'GO\r\n'])
+        self.assertEqual((merger.rows_merged, merger.statements_written), (6, 4))
+
+    def test_size_limit_and_go_interval(self):
+        """
+            Verify the size limit ends statements and GO batch separators are added between statements.
+        """
+        merger = scripterinserts.InsertMerger(max_rows=1000, max_size=30, go_interval_rows=2)
+        batches = merger.merge(DATA)
+        self.assertEqual(len(batches), 3)
+        self.assertTrue(all(batch.endswith(b'GO\r\n') for batch in batches))
+        # No two rows fit into 30 bytes of values.
+        self.assertTrue(batches[1].startswith(
+            b'INSERT [dbo].[Customers] ([Id], [Name]) VALUES (3, NULL)\r\nINSERT [dbo].[Customers]'))
+        self.assertEqual(merger.statements_written, 6)
+
+        schema_batch = b'CREATE TABLE [dbo].[Customers]([Id] [int] NOT NULL)\r\nGO\r\n'
+        self.assertEqual(merger.merge(schema_batch), [schema_batch])
+        # A unterminated string literal is kept as it is.
+        unterminated_batch = b'INSERT [dbo].[Customers] ([Id]) VALUES (1)\r\n-- it\'s\r\nGO\r\n'
+        self.assertEqual(merger.merge(unterminated_batch), [unterminated_batch])
+
+    def test_procedure_bodies_are_not_merged(self):
+        """
+            Verify INSERT statements of a procedure are kept, merging them would put both rows under the IF.
+        """
+        merger = scripterinserts.InsertMerger()
+        self.assertEqual(merger.merge(PROCEDURE), [PROCEDURE])
+        self.assertEqual((merger.rows_merged, merger.statements_written), (0, 0))
+
+    def test_row_limiter(self):
+        """
+            Verify rows after the limit are dropped per table across batches and truncated tables are reported.
+        """
+        limiter = scripterinserts.RowLimiter(max_rows=2)
+        self.assertEqual(limiter.limit(DATA), (
+            b'SET IDENTITY_INSERT [dbo].[Customers] ON\r\n'
+            b'INSERT [dbo].[Customers] ([Id], [Name]) VALUES (1, N\'Contoso\r\nGO\r\n\')\r\n'
+            b'INSERT [dbo].[Customers] ([Id], [Name]) VALUES (2, N\'Fabrikam, (Inc.)\')\r\n'
+            b'SET IDENTITY_INSERT [dbo].[Customers] OFF\r\n'
+            b'INSERT [dbo].[Orders] ([Id], [Customer]) VALUES (1, 2)\r\n'
+            b'INSERT [dbo].[Orders] ([Id]) VALUES (2)\r\n'
+            b'GO\r\n'))
+        self.assertEqual(limiter.limit(b'INSERT [dbo].[Orders] ([Id]) VALUES (3)\r\nGO\r\n'), b'GO\r\n')
+        self.assertEqual(limiter.get_truncated_tables(), [(u'[dbo].[Customers]', 4), (u'[dbo].[Orders]', 3)])
+        self.assertIn(u'Kept the first 2 rows of 2 tables', limiter.format_report())
+        self.assertEqual(scripterinserts.RowLimiter(max_rows=4).format_report(), u'')
+
+    def test_procedure_bodies_are_not_limited(self):
+        """
+            Verify INSERT statements of a procedure are kept and it is not reported as a truncated table.
+        """
+        limiter = scripterinserts.RowLimiter(max_rows=1)
+        self.assertEqual(limiter.limit(PROCEDURE), PROCEDURE)
+        self.assertEqual(limiter.get_truncated_tables(), [])
+        self.assertEqual(limiter.limit(DATA).count(b'\r\nINSERT'), 2)
+        self.assertEqual(limiter.get_truncated_tables(), [(u'[dbo].[Customers]', 4), (u'[dbo].[Orders]', 2)])
+
+
+if __name__ == u'__main__':
+    unittest.main()
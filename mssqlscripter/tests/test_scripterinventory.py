@@ -0,0 +1,76 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mssqlscripter.scripterinventory as scripterinventory
+
+SCRIPTING_OBJECTS = [
+    {u'type': u'Database', u'schema': None, u'name': u'db'},
+    {u'type': u'Table', u'schema': u'dbo', u'name': u'T1'}]
+
+
+class ScripterInventoryTest(unittest.TestCase):
+    """
+        Object inventory tests.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.temp_dir, u'inventory.json')
+        self.parameters = {
+            u'FilePath': None,
+            u'ConnectionString': u'Server=test;Database=db;Password=secret;',
+            u'ScriptDestination': u'ToSingleFile'}
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_inventory_key(self):
+        """
+            Verify the key ignores the file path and depends on the filters.
+        """
+        key = scripterinventory.get_inventory_key(self.parameters)
+        self.assertEqual(key, scripterinventory.get_inventory_key(dict(self.parameters, FilePath=u'script.sql')))
+        self.assertNotEqual(key, scripterinventory.get_inventory_key(dict(self.parameters, IncludeTypes=[u'Table'])))
+
+    def test_cache_expires(self):
+        """
+            Verify inventories are returned within the ttl and are not stored with credentials.
+        """
+        inventory_cache = scripterinventory.InventoryCache(ttl=60, cache_path=self.cache_path)
+        inventory_cache.put(u'key', SCRIPTING_OBJECTS)
+        self.assertEqual(inventory_cache.get(u'key'), SCRIPTING_OBJECTS)
+        self.assertIsNone(inventory_cache.get(u'other'))
+        self.assertIsNone(scripterinventory.InventoryCache(ttl=0, cache_path=self.cache_path).get(u'key'))
+
+        # The cache is read through list_objects without starting a tools service.
+        key = scripterinventory.get_inventory_key(self.parameters)
+        inventory_cache.put(key, SCRIPTING_OBJECTS)
+        self.assertEqual(
+            scripterinventory.list_objects(self.parameters, ttl=60, cache_path=self.cache_path), SCRIPTING_OBJECTS)
+        with io.open(self.cache_path, encoding=u'utf-8') as cache_file:
+            self.assertNotIn(u'secret', cache_file.read())
+
+    def test_write_inventory(self):
+        """
+            Verify inventories are written as JSON and as TSV with a header.
+        """
+        output = io.StringIO()
+        scripterinventory.write_inventory(SCRIPTING_OBJECTS, u'json', output)
+        self.assertEqual(json.loads(output.getvalue()), SCRIPTING_OBJECTS)
+
+        output = io.StringIO()
+        scripterinventory.write_inventory(SCRIPTING_OBJECTS, u'tsv', output)
+        self.assertEqual(output.getvalue(), u'type\tschema\tname\nDatabase\t\tdb\nTable\tdbo\tT1\n')
+
+
+if __name__ == u'__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import io
+import json
+import unittest
+
+import mssqlscripter.jsonrpc.contracts.scriptingservice as scripting
+import mssqlscripter.scripterndjson as scripterndjson
+
+SCRIPTING_OBJECTS = [
+    {u'type': u'Table', u'schema': u'dbo', u'name': u'Customers'},
+    {u'type': u'StoredProcedure', u'schema': u'dbo', u'name': u'GetCustomers'}]
+
+SCRIPT = (
+    b'USE [AdventureWorks]\r\nGO\r\n'
+    b'/****** Object:  Table [dbo].[Customers]    Script Date: 1/1/2017 ******/\r\n'
+    b'CREATE TABLE [dbo].[Customers]([Id] [int] NOT NULL)\r\nGO\r\n'
+    b'/****** Object:  Index [IX_Customers]    Script Date: 1/1/2017 ******/\r\n'
+    b'CREATE INDEX [IX_Customers] ON [dbo].[Customers]([Id])\r\nGO\r\n'
+    b'/****** Object:  StoredProcedure [dbo].[GetCustomers]    Script Date: 1/1/2017 ******/\r\n'
+    b'CREATE PROCEDURE [dbo].[GetCustomers] AS SELECT N\'\xc3\xa9\'\r\nGO\r\n')
+
+
+def plan_event():
+    return scripting.ScriptPlanNotificationEvent({
+        u'operationId': None, u'sequenceNumber': None, u'scriptingObjects': SCRIPTING_OBJECTS,
+        u'count': len(SCRIPTING_OBJECTS)})
+
+
+def progress_event(scripting_object, status):
+    return scripting.ScriptProgressNotificationEvent({
+        u'operationId': None, u'sequenceNumber': None, u'status': status, u'completedCount': 0,
+        u'totalCount': len(SCRIPTING_OBJECTS), u'scriptingObject': scripting_object,
+        u'errorMessage': None, u'errorDetails': None})
+
+
+class ScripterNdjsonTest(unittest.TestCase):
+    """
+        JSON lines output tests.
+    """
+
+    def read_lines(self, output):
+        return [json.loads(line) for line in output.getvalue().decode(u'utf-8').splitlines()]
+
+    def test_objects_are_written_as_they_complete(self):
+        """
+            Verify a object is written once the next object started and it was reported completed.
+        """
+        output = io.BytesIO()
+        writer = scripterndjson.NdjsonObjectWriter(output)
+        writer.handle_response(plan_event())
+        writer.handle_response(progress_event(SCRIPTING_OBJECTS[0], u'Progress'))
+        # Chunks end in the middle of lines.
+        procedure_start = SCRIPT.index(b'/****** Object:  StoredProcedure')
+        writer.write(SCRIPT[:150])
+        writer.write(SCRIPT[150:procedure_start + 10])
+        self.assertEqual(output.getvalue(), b'')
+
+        writer.handle_response(progress_event(SCRIPTING_OBJECTS[0], u'Completed'))
+        self.assertEqual(output.getvalue(), b'')
+        writer.handle_response(progress_event(SCRIPTING_OBJECTS[1], u'Progress'))
+        writer.write(SCRIPT[procedure_start + 10:])
+        lines = self.read_lines(output)
+        self.assertEqual(len(lines), 1)
+        # The index belongs to the table, the script before the first object is skipped.
+        self.assertEqual(lines[0][u'name'], u'Customers')
+        self.assertTrue(lines[0][u'script'].startswith(u'/****** Object:  Table [dbo].[Customers]'))
+        self.assertIn(u'CREATE INDEX [IX_Customers]', lines[0][u'script'])
+        self.assertEqual(lines[0][u'bytes'], len(lines[0][u'script'].encode(u'utf-8')))
+        self.assertIsNotNone(lines[0][u'duration'])
+
+        writer.close()
+        lines = self.read_lines(output)
+        self.assertEqual([line[u'name'] for line in lines], [u'Customers', u'GetCustomers'])
+        self.assertEqual(lines[1][u'script'], SCRIPT[procedure_start:].decode(u'utf-8'))
+        self.assertIsNone(lines[1][u'duration'])
+
+    def test_headers_are_removed_when_excluded(self):
+        """
+            Verify headers used to split the script are removed from scripts when the user excluded them.
+        """
+        output = io.BytesIO()
+        writer = scripterndjson.NdjsonObjectWriter(output, include_headers=False)
+        writer.handle_response(plan_event())
+        writer.write(SCRIPT)
+        writer.close()
+
+        lines = self.read_lines(output)
+        self.assertEqual([(line[u'type'], line[u'schema']) for line in lines],
+                         [(u'Table', u'dbo'), (u'StoredProcedure', u'dbo')])
+        self.assertFalse(any(u'Object:' in line[u'script'] for line in lines))
+        self.assertEqual(lines[1][u'script'], u'CREATE PROCEDURE [dbo].[GetCustomers] AS SELECT N\'\xe9\'\r\nGO\r\n')
+        self.assertEqual(lines[1][u'bytes'], len(lines[1][u'script'].encode(u'utf-8')))
+
+
+if __name__ == u'__main__':
+    unittest.main()
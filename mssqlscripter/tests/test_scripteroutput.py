@@ -0,0 +1,128 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mssqlscripter.scripteroutput as scripteroutput
+
+
+class ScriptFileFollowerTest(unittest.TestCase):
+    """
+        Script file follower tests.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.temp_dir, u'script.sql')
+        io.open(self.file_path, u'wb').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_follows_growing_file(self):
+        """
+            Verify bytes appended while following are copied before and after finish.
+        """
+        output = io.BytesIO()
+        follower = scripteroutput.ScriptFileFollower(self.file_path, output, chunk_size=4, line_separator=u'\n')
+        follower.start()
+
+        with io.open(self.file_path, u'ab', buffering=0) as script_file:
+            script_file.write(b'CREATE TABLE [T1]\r\nGO\r\n')
+            # Wait until the follower caught up with the file.
+            while output.tell() < 21:
+                follower.finished.wait(.01)
+            self.assertEqual(output.getvalue(), b'CREATE TABLE [T1]\nGO\n')
+
+            script_file.write(b'CREATE TABLE [T2]\r\nGO\r\n')
+
+        follower.finish()
+        self.assertEqual(output.getvalue(), b'CREATE TABLE [T1]\nGO\nCREATE TABLE [T2]\nGO\n')
+        self.assertEqual(follower.bytes_written, 42)
+
+    def test_translates_newlines_across_chunks(self):
+        """
+            Verify a CRLF split between chunks and lone carriage returns are translated.
+        """
+        with io.open(self.file_path, u'wb') as script_file:
+            script_file.write(u'N\'caf\u00e9\'\r\nGO\r\rend\r'.encode(u'utf-8'))
+
+        for chunk_size in range(1, 8):
+            output = io.BytesIO()
+            follower = scripteroutput.ScriptFileFollower(
+                self.file_path, output, chunk_size=chunk_size, line_separator=u'\r\n')
+            follower.start()
+            follower.finish()
+
+            self.assertEqual(
+                output.getvalue().decode(u'utf-8'), u'N\'caf\u00e9\'\r\nGO\r\n\r\nend\r\n')
+
+    def test_output_exception_raised_on_finish(self):
+        """
+            Verify a failed write to the output is raised once following finishes.
+        """
+        with io.open(self.file_path, u'wb') as script_file:
+            script_file.write(b'GO\n')
+
+        follower = scripteroutput.ScriptFileFollower(self.file_path, ClosedOutput())
+        follower.start()
+        with self.assertRaises(IOError):
+            follower.finish()
+
+
+class RotatingScriptWriterTest(unittest.TestCase):
+    """
+        Rotating script writer tests.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.temp_dir, u'script.sql')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_rotates_on_batch_boundaries(self):
+        """
+            Verify chunks end on GO lines once full and the manifest lists their objects.
+        """
+        script = b''.join(
+            u'CREATE TABLE [dbo].[T{0}] (a int)\nGO\nINSERT [dbo].[T{0}] ([a]) VALUES (1)\nGO\n'.format(
+                index).encode(u'utf-8') for index in range(3))
+
+        writer = scripteroutput.RotatingScriptWriter(self.file_path, max_chunk_size=40)
+        for offset in range(0, len(script), 5):
+            writer.write(script[offset:offset + 5])
+        writer.close()
+
+        with io.open(self.file_path + u'.manifest.json', encoding=u'utf-8') as manifest_file:
+            manifest = json.loads(manifest_file.read())
+        self.assertTrue(manifest[u'complete'])
+        self.assertEqual([chunk[u'file'] for chunk in manifest[u'chunks']], [
+            u'script.001.sql', u'script.002.sql', u'script.003.sql'])
+        self.assertEqual(manifest[u'chunks'][1][u'objects'], [{u'type': u'Table', u'name': u'[dbo].[T1]'}])
+
+        chunks = []
+        for index, chunk in enumerate(manifest[u'chunks']):
+            with io.open(writer.get_chunk_path(index + 1), u'rb') as chunk_file:
+                chunks.append(chunk_file.read())
+            self.assertEqual(len(chunks[-1]), chunk[u'bytes'])
+            self.assertTrue(chunks[-1].endswith(b'GO\n'))
+        self.assertEqual(b''.join(chunks), script)
+
+
+class ClosedOutput(object):
+
+    def write(self, data):
+        raise IOError(u'Broken pipe')
+
+
+if __name__ == u'__main__':
+    unittest.main()
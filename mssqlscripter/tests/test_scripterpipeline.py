@@ -0,0 +1,111 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import io
+import unittest
+
+import mssqlscripter.scripterpipeline as scripterpipeline
+
+SCRIPT = (
+    b'/****** Object:  Table [dbo].[Customers]    Script Date: 1/1/2017 ******/\r\n'
+    b'SET ANSI_PADDING ON\r\nGO\r\n'
+    b'CREATE TABLE [dbo].[Customers]([Id] [int] NOT NULL)\r\nGO\r\n'
+    b'CREATE INDEX [IX_Id] ON [dbo].[Customers]([Id])\r\nGO\r\n'
+    b'/****** Object:  View [Sales].[Orders]    Script Date: 1/1/2017 ******/\r\n'
+    b'CREATE VIEW [Sales].[Orders] AS SELECT \'\r\nGO\r\n\' AS [Text] FROM [dbo].[Customers]\r\nGO\r\n')
+
+
+def number_batch(batch):
+    batch.data = u'-- {}\r\n'.format(batch.index).encode(u'utf-8') + batch.data
+    # Dropped by the worker.
+    return None if batch.object_type == u'View' else batch
+
+
+def run_pipeline(stages, chunk_size=5):
+    output = io.BytesIO()
+    pipeline = scripterpipeline.Pipeline(stages, output)
+    for start in range(0, len(SCRIPT), chunk_size):
+        pipeline.write(SCRIPT[start:start + chunk_size])
+    pipeline.close()
+    return output.getvalue()
+
+
+class ScripterPipelineTest(unittest.TestCase):
+    """
+        Script pipeline tests.
+    """
+
+    def test_batches_and_stages(self):
+        """
+            Verify batches are attributed to their objects and run through the stages in order.
+        """
+        seen_batches = []
+
+        def collect(batches):
+            for batch in batches:
+                seen_batches.append((batch.index, batch.object_type, batch.schema, batch.name))
+                yield batch
+
+        self.assertEqual(run_pipeline([collect]), SCRIPT)
+        self.assertEqual(seen_batches, [
+            (0, u'Table', u'dbo', u'Customers'), (1, u'Table', u'dbo', u'Customers'),
+            (2, u'Table', u'dbo', u'Customers'), (3, u'View', u'Sales', u'Orders')])
+
+        output = run_pipeline([
+            scripterpipeline.strip_headers,
+            scripterpipeline.drop_batches(br'^SET ANSI_PADDING'),
+            scripterpipeline.rename_schema(u'dbo', u'staging')])
+        self.assertEqual(output, (
+            b'CREATE TABLE [staging].[Customers]([Id] [int] NOT NULL)\r\nGO\r\n'
+            b'CREATE INDEX [IX_Id] ON [staging].[Customers]([Id])\r\nGO\r\n'
+            b'CREATE VIEW [Sales].[Orders] AS SELECT \'\r\nGO\r\n\' AS [Text] FROM [staging].[Customers]\r\nGO\r\n'))
+
+    def test_process_stage_keeps_order(self):
+        """
+            Verify batches processed by a pool of processes are written in script order.
+        """
+        output = run_pipeline([scripterpipeline.ProcessStage(number_batch, processes=2)])
+        self.assertEqual(output.count(b'CREATE'), 2)
+        self.assertTrue(output.startswith(b'-- 0\r\n/******'))
+        self.assertLess(output.index(b'-- 1\r\n'), output.index(b'-- 2\r\n'))
+        self.assertNotIn(b'VIEW', output)
+
+    def test_stage_error(self):
+        """
+            Verify a failing stage is raised by close and does not block the script.
+        """
+        def fail(batches):
+            for batch in batches:
+                raise ValueError(u'stage failed')
+                yield batch
+
+        self.assertRaises(ValueError, run_pipeline, [fail], 1)
+
+    def test_load_stage(self):
+        """
+            Verify stages are loaded by name, stage factories with their arguments, and anything else is rejected.
+        """
+        self.assertIs(
+            scripterpipeline.load_stage(u'mssqlscripter.scripterpipeline:strip_headers'),
+            scripterpipeline.strip_headers)
+        output = run_pipeline([
+            scripterpipeline.load_stage(u"mssqlscripter.scripterpipeline:rename_schema('dbo', 'staging')"),
+            scripterpipeline.load_stage(u"mssqlscripter.scripterpipeline:drop_batches('^CREATE INDEX')")])
+        self.assertIn(b'CREATE TABLE [staging].[Customers]', output)
+        self.assertNotIn(b'CREATE INDEX', output)
+
+        for stage_name in (
+                u'strip_headers',
+                u'mssqlscripter.scripterpipeline:rename_schema',
+                u'mssqlscripter.scripterpipeline:drop_batches',
+                u"mssqlscripter.scripterpipeline:rename_schema('dbo')",
+                u'mssqlscripter.scripterpipeline:rename_schema(dbo, staging)',
+                u'mssqlscripter.scripterpipeline:MAX_QUEUED_BATCHES',
+                u"mssqlscripter.scripterpipeline:strip_headers('x')"):
+            self.assertRaises(ValueError, scripterpipeline.load_stage, stage_name)
+
+
+if __name__ == u'__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import faketoolsservice
+import mssqlscripter.argparser as parser
+import mssqlscripter.main as main
+import mssqlscripter.scripterretry as scripterretry
+
+
+class ScripterRetryTest(unittest.TestCase):
+    """
+        Failed object retry tests.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def collect(self, names):
+        collector = scripterretry.FailedObjectCollector()
+        for name in names:
+            collector(faketoolsservice.progress_event(faketoolsservice.table(name), u'Progress'))
+            collector(faketoolsservice.progress_event(
+                faketoolsservice.table(name), u'Error', u'Lock request time out period exceeded.'))
+        return collector.failed_objects
+
+    def test_retries_only_failed_objects(self):
+        """
+            Verify retries include only pending objects, back off exponentially and stop once every object recovered.
+        """
+        # T1 fails once more, T2 recovers on the first retry.
+        client = faketoolsservice.FakeToolsClient(failures={u'T1': 1})
+        delays = []
+        failed_objects = scripterretry.retry_failed_objects(
+            client, {u'FilePath': u'script.sql', u'ConnectionString': u'Server=test;',
+                     u'ScriptDestination': u'ToSingleFile'},
+            self.collect([u'T1', u'T2']), retry_count=3, sleep=delays.append)
+
+        self.assertEqual([sorted(names) for names in client.included_names], [[u'T1', u'T2'], [u'T1']])
+        self.assertEqual(delays, [2.0, 4.0])
+        self.assertTrue(all(parameters[u'AppendToFile'] for parameters in client.parameters))
+        self.assertEqual(
+            sorted((failed_object.scripting_object[u'name'], failed_object.attempts, failed_object.recovered)
+                   for failed_object in failed_objects),
+            [(u'T1', 3, True), (u'T2', 2, True)])
+
+    def test_retry_requires_continue_on_error(self):
+        """
+            Verify failed objects are not retried without --continue-on-error, also when progress is decoded.
+        """
+        started_clients = faketoolsservice.patch_tools_service(
+            self, lambda: faketoolsservice.FakeToolsClient(failures={u'T1': 1}))
+        parameters = parser.parse_arguments([
+            u'--connection-string', u'Server=test;Database=db;', u'-f', os.path.join(self.temp_dir, u'script.sql'),
+            u'--display-progress'])
+
+        main.run_scripting_request(parameters, lambda response: None)
+        self.assertEqual(len(started_clients[0].requests), 1)
+
+    def test_report_failed_objects(self):
+        """
+            Verify unrecovered objects are written to the output and every object to the JSON report.
+        """
+        failed_objects = list(self.collect([u'T1', u'T2']).values())
+        failed_objects[0].recovered = True
+        report_path = os.path.join(self.temp_dir, u'report.json')
+        output = io.StringIO()
+
+        scripterretry.report_failed_objects(failed_objects, report_path, output)
+
+        self.assertEqual(output.getvalue().count(u'\n'), 1)
+        self.assertIn(u'Lock request time out period exceeded.', output.getvalue())
+        with io.open(report_path, encoding=u'utf-8') as report_file:
+            report = json.loads(report_file.read())
+        self.assertEqual((report[u'recovered'], report[u'failed']), (1, 1))
+        self.assertEqual(len(report[u'objects']), 2)
+
+
+if __name__ == u'__main__':
+    unittest.main()
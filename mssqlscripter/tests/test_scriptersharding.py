@@ -0,0 +1,87 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import mssqlscripter.scriptersharding as scriptersharding
+
+
+class ScripterShardingTest(unittest.TestCase):
+    """
+        Sharded scripting tests.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.history_path = os.path.join(self.temp_dir, u'history.json')
+        self.parameters = {
+            u'ConnectionString': u'Server=test;Database=db;',
+            u'TypeOfDataToScript': u'SchemaOnly',
+            u'ScriptCreateDrop': u'ScriptCreate'}
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_partition_keeps_plan_order(self):
+        """
+            Verify shards are contiguous ranges of similar cost that cover every object.
+        """
+        objects = list(range(10))
+
+        shards = scriptersharding.partition(objects, [1.0] * 10, 3)
+        self.assertEqual(shards, [[0, 1, 2, 3], [4, 5, 6], [7, 8, 9]])
+
+        # A expensive object gets a shard of it's own.
+        shards = scriptersharding.partition(objects, [10.0] + [1.0] * 9, 2)
+        self.assertEqual(shards, [[0], [1, 2, 3, 4, 5, 6, 7, 8, 9]])
+
+        # Every shard gets at least one object.
+        shards = scriptersharding.partition(objects, [1.0] * 9 + [100.0], 4)
+        self.assertEqual(shards, [[0, 1, 2, 3, 4, 5, 6], [7], [8], [9]])
+
+        self.assertEqual(scriptersharding.partition(objects[:2], [1.0, 1.0], 8), [[0], [1]])
+        self.assertEqual(scriptersharding.partition([], [], 4), [])
+
+    def test_estimate_costs(self):
+        """
+            Verify recorded durations are used and type costs are scaled to them.
+        """
+        objects = [
+            {u'type': u'Table', u'schema': u'dbo', u'name': u'T1'},
+            {u'type': u'Table', u'schema': u'dbo', u'name': u'T2'},
+            {u'type': u'StoredProcedure', u'schema': u'dbo', u'name': u'P1'}]
+        history = scriptersharding.ScriptingHistory(self.parameters, self.history_path)
+
+        self.assertEqual(scriptersharding.estimate_costs(objects, history), [4.0, 4.0, 1.0])
+        self.assertEqual(scriptersharding.estimate_costs(objects, history, script_data=True), [40.0, 40.0, 1.0])
+
+        history.record(objects[0], 2.0)
+        self.assertEqual(scriptersharding.estimate_costs(objects, history), [2.0, 2.0, .5])
+
+    def test_history_persisted_per_database(self):
+        """
+            Verify durations are saved and only loaded for the same database and options.
+        """
+        scripting_object = {u'type': u'Table', u'schema': u'dbo', u'name': u'T1'}
+        history = scriptersharding.ScriptingHistory(self.parameters, self.history_path)
+        history.record(scripting_object, 1.5)
+        history.save()
+
+        history = scriptersharding.ScriptingHistory(self.parameters, self.history_path)
+        self.assertEqual(history.durations, {u'Table.dbo.T1': 1.5})
+
+        with open(self.history_path) as history_file:
+            self.assertNotIn(u'Server=test', history_file.read())
+
+        self.parameters[u'TypeOfDataToScript'] = u'DataOnly'
+        history = scriptersharding.ScriptingHistory(self.parameters, self.history_path)
+        self.assertEqual(history.durations, {})
+
+
+if __name__ == u'__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import unittest
+
+import mssqlscripter.scriptersplitter as scriptersplitter
+
+
+class GoBatchSplitterTest(unittest.TestCase):
+    """
+        GO batch splitter tests.
+    """
+
+    def split(self, script, chunk_size):
+        """
+            Feed the script in chunks and return the complete batches.
+        """
+        splitter = scriptersplitter.GoBatchSplitter()
+        pieces = []
+        for offset in range(0, len(script), chunk_size):
+            pieces.extend(splitter.feed(script[offset:offset + chunk_size]))
+        pieces.extend(splitter.close())
+
+        batches = [b'']
+        for data, batch_complete in pieces:
+            batches[-1] += data
+            if batch_complete:
+                batches.append(b'')
+        self.assertEqual(b''.join(batches), script)
+        return batches[:-1]
+
+    def test_splits_on_go_lines(self):
+        """
+            Verify scripts split after GO lines, with any chunk size.
+        """
+        script = b'CREATE TABLE [T1] (a int)\r\nGO\r\nCREATE TABLE [T2] (a int)\r\ngo 2\r\nSELECT 1\r\n'
+        for chunk_size in range(1, len(script) + 1):
+            self.assertEqual(self.split(script, chunk_size), [
+                b'CREATE TABLE [T1] (a int)\r\nGO\r\n',
+                b'CREATE TABLE [T2] (a int)\r\ngo 2\r\n',
+                b'SELECT 1\r\n'])
+
+    def test_ignores_go_in_literals_and_comments(self):
+        """
+            Verify GO lines inside strings, bracketed identifiers and nested block comments do not split.
+        """
+        script = (
+            b"INSERT [T] VALUES (N'it''s\nGO\n')\n"
+            b'CREATE TABLE [a]]\nGO\n] (a int)\n'
+            b'/* outer /* inner */\nGO\n*/\n'
+            b'-- GO\n'
+            b'GO\n'
+            b'SELECT 1\n')
+        for chunk_size in (1, 3, 7, len(script)):
+            batches = self.split(script, chunk_size)
+            self.assertEqual(len(batches), 2)
+            self.assertEqual(batches[1], b'SELECT 1\n')
+
+    def test_finds_script_objects(self):
+        """
+            Verify objects are found in headers, CREATE and INSERT statements in order of appearance.
+        """
+        script = (
+            b'/****** Object:  Table [dbo].[Customers]    Script Date: 1/1/2017 ******/\n'
+            b'CREATE TABLE [dbo].[Customers] (a int)\nGO\n'
+            b'INSERT [dbo].[Orders] ([a]) VALUES (1)\n'
+            b'INSERT [dbo].[Orders] ([a]) VALUES (2)\n'
+            b'CREATE PROCEDURE dbo.GetOrders AS SELECT 1\n')
+        self.assertEqual(scriptersplitter.find_script_objects(script), [
+            (u'Table', u'[dbo].[Customers]'),
+            (u'Table', u'[dbo].[Customers]'),
+            (u'Table', u'[dbo].[Orders]'),
+            (u'StoredProcedure', u'dbo.GetOrders')])
+
+
+if __name__ == u'__main__':
+    unittest.main()
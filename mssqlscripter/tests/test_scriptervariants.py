@@ -0,0 +1,118 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import faketoolsservice
+import mssqlscripter.argparser as parser
+import mssqlscripter.scriptervariants as scriptervariants
+
+SCRIPTING_OBJECTS = [faketoolsservice.table(u'Customers'), faketoolsservice.table(u'Orders', schema=u'Sales')]
+
+
+class ScripterVariantsTest(unittest.TestCase):
+    """
+        Variant scripting tests.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.temp_dir, u'script.sql')
+        self.failing_options = None
+        self.started_clients = faketoolsservice.patch_tools_service(self, lambda: faketoolsservice.FakeToolsClient(
+            plan=SCRIPTING_OBJECTS, failing_options=self.failing_options, write_scripts=True))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def parse_variants(self, *variants):
+        args = [u'--connection-string', u'Server=test;Database=db;', u'-f', self.file_path]
+        for variant in variants:
+            args.extend([u'--variant', variant])
+        return parser.parse_arguments(args)
+
+    def test_parse_variants(self):
+        """
+            Verify variants keep the scripting options that differ from the arguments, mapped like the arguments.
+        """
+        parameters = self.parse_variants(
+            u'sql2014=--target-server-version 2014', u'azure-drop=--target-server-version AzureDB --script-drop')
+        self.assertEqual(parameters.Variants, [
+            (u'sql2014', {u'ScriptCompatibilityOption': u'Script120Compat'}),
+            (u'azure-drop', {
+                u'ScriptCreateDrop': u'ScriptDrop',
+                u'TargetDatabaseEngineEdition': u'SqlAzureDatabaseEdition',
+                u'TargetDatabaseEngineType': u'SqlAzure'})])
+        self.assertEqual(parameters.ScriptCompatibilityOption, u'Script130Compat')
+
+        # Variants can not change the connection, what is scripted or where.
+        for variant in (u'other=-d other', u'deps=--include-dependencies', u'name with space=--script-drop'):
+            self.assertRaises(SystemExit, self.parse_variants, variant)
+        self.assertRaises(SystemExit, self.parse_variants, u'drop=--script-drop', u'drop=--data-only')
+
+    def test_variant_paths(self):
+        """
+            Verify single file variants are named after the file path and file per object variants get a directory.
+        """
+        self.assertEqual(
+            scriptervariants.get_variant_path(os.path.join(u'out', u'script.sql'), u'ToSingleFile', u'azure'),
+            os.path.join(u'out', u'script.azure.sql'))
+        self.assertEqual(scriptervariants.get_variant_path(u'script', u'ToSingleFile', u'azure'), u'script.azure')
+        self.assertEqual(
+            scriptervariants.get_variant_path(u'out', u'ToFilePerObject', u'azure'), os.path.join(u'out', u'azure'))
+
+    def test_variants_share_inventory_and_tools_service(self):
+        """
+            Verify the inventory is collected once and every variant scripts it with it's options on one tools service.
+        """
+        parameters = self.parse_variants(u'sql2014=--target-server-version 2014', u'drop=--script-drop')
+        scripter = scriptervariants.VariantScripter(vars(parameters), parameters.Variants)
+        self.assertTrue(scripter.run().success)
+
+        self.assertEqual(len(self.started_clients), 1)
+        client = self.started_clients[0]
+        self.assertFalse(client.healthy)
+        # The inventory request includes no objects, every variant includes the inventory.
+        self.assertEqual(client.included_names, [[], [u'Customers', u'Orders'], [u'Customers', u'Orders']])
+        options = [request.params.scripting_options for request in client.requests[1:]]
+        self.assertEqual(
+            [(option.ScriptCompatibilityOption, option.ScriptCreateDrop) for option in options],
+            [(u'Script120Compat', u'ScriptCreate'), (u'Script130Compat', u'ScriptDrop')])
+        for name in (u'sql2014', u'drop'):
+            with io.open(os.path.join(self.temp_dir, u'script.{}.sql'.format(name)), u'rb') as script_file:
+                self.assertEqual(script_file.read(), b'Customers\nOrders\n')
+        self.assertFalse(os.path.exists(self.file_path))
+
+        # A failing variant does not stop the others and is named in the error.
+        self.failing_options = {u'ScriptCreateDrop': u'ScriptDrop'}
+        scripter = scriptervariants.VariantScripter(
+            vars(parameters), [(u'fail', {u'ScriptCreateDrop': u'ScriptDrop'})] + parameters.Variants)
+        complete_event = scripter.run()
+        self.assertTrue(complete_event.has_error)
+        self.assertEqual(complete_event.error_message, u'Variants failed: fail, drop')
+        self.assertEqual(len(self.started_clients[1].requests), 4)
+
+    def test_variant_target_rejects_inventory_object(self):
+        """
+            Verify a variant whose target can not script a object of the inventory fails and is named, while the
+            other variants are scripted.
+        """
+        self.failing_options = {u'TargetDatabaseEngineType': u'SqlAzure'}
+        parameters = self.parse_variants(u'sql2014=--target-server-version 2014', u'azure=--target-server-version AzureDB')
+        complete_event = scriptervariants.VariantScripter(vars(parameters), parameters.Variants).run()
+
+        self.assertTrue(complete_event.has_error)
+        self.assertEqual(complete_event.error_message, u'Variants failed: azure')
+        self.assertEqual(complete_event.error_details, u'azure: Customers can not be scripted with these options')
+        with io.open(os.path.join(self.temp_dir, u'script.sql2014.sql'), u'rb') as script_file:
+            self.assertEqual(script_file.read(), b'Customers\nOrders\n')
+
+
+if __name__ == u'__main__':
+    unittest.main()
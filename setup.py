@@ -11,6 +11,7 @@ import platform as _platform
 import sys
 
 from setuptools import setup
+from setuptools.command.build_py import build_py
 
 MSSQLSCRIPTER_VERSION = '1.0.0a23'
 
@@ -36,6 +37,26 @@ DEPENDENCIES = [
 if sys.version_info < (3, 4):
     DEPENDENCIES.append('enum34>=1.1.6')
 
+# The asyncio client uses async and await, which do not parse before Python 3.5.
+ASYNC_MODULES = [
+    ('mssqlscripter', 'asyncsqltoolsclient'),
+    ('mssqlscripter.jsonrpc', 'asyncjsonrpcclient'),
+    ('mssqlscripter.jsonrpc.contracts', 'asyncscriptingservice'),
+]
+
+
+class BuildPy(build_py):
+    """
+        Leave the asyncio client out of packages built with Python 2.7 and 3.4.
+    """
+
+    def find_package_modules(self, package, package_dir):
+        modules = build_py.find_package_modules(self, package, package_dir)
+        if sys.version_info < (3, 5):
+            modules = [module for module in modules if (module[0], module[1]) not in ASYNC_MODULES]
+        return modules
+
+
 setup(
     install_requires=DEPENDENCIES,
     name='mssql-scripter',
@@ -49,9 +70,12 @@ setup(
     long_description=open('README.rst').read(),
     classifiers=CLASSIFIERS,
     include_package_data=True,
+    cmdclass={'build_py': BuildPy},
     scripts=[
         'mssql-scripter',
-        'mssql-scripter.bat'
+        'mssql-scripter.bat',
+        'mssql-scripter-batch',
+        'mssql-scripter-batch.bat'
     ],
     packages=[
         'mssqlscripter',